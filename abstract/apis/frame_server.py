@@ -1,14 +1,47 @@
-from abstract.bases.importer import abc, requests, dispatch, base64
+import tornado.httpclient
+import tornado.ioloop
+import tornado.websocket
+from abstract.bases.importer import abc, requests, dispatch, base64, urllib3, time, json, threading, itertools
+from abstract.bases.importer import asyncio, concurrent, functools, hmac
+from typing import Optional, Callable
 
 from abstract.bases.exceptions import *
 from abstract.bases.config import CONFIG
 from abstract.bases.log import LOG
+from abstract.bases.aio import AsyncAdapter
+from abstract.bases.metrics import LatencyStats, METRICS
 
 
 class FrameServer(abc.ABC):
     def __init__(self, host: str, token: str):
         self.host = host.removesuffix('/')
         self.token = token
+        self.event_handler: Optional[Callable[[dict], None]] = None
+
+    def __str__(self):
+        return self.host
+
+    @functools.cached_property
+    def aio(self) -> 'AsyncFrameServer':
+        """
+        本接口的协程版本, 供异步命令使用
+        """
+        return AsyncFrameServer(self)
+
+    def set_event_handler(self, handler: Callable[[dict], None]) -> None:
+        """
+        设置事件处理函数, 用于通过同一连接推送事件的实现
+
+        :param handler: 接收OneBot事件字典的函数, 不应阻塞
+        :type handler: Callable[[dict], None]
+        """
+        self.event_handler = handler
+
+    def emit_event(self, data: dict) -> None:
+        if self.event_handler is None:
+            LOG.DEB(f'No event handler set, event dropped: {data}')
+            return
+        self.event_handler(data)
 
     @abc.abstractmethod
     def get_msg(self, message_id: int) -> dict: ...
@@ -170,63 +203,114 @@ class FrameServer(abc.ABC):
     """
 
 
-class OneBotHttpServer(FrameServer):
+class AsyncFrameServer(AsyncAdapter):
     """
-    OneBot HTTP 服务器接口实现。
-    该类提供了与 OneBot HTTP 服务器交互的基本方法，包括获取登录信息、发送消息、获取用户和群组信息等。
+    FrameServer 的协程接口, 方法与被包装的 FrameServer 相同, 调用时需 await
+    """
+    def __init__(self, frame_server: FrameServer):
+        super().__init__(frame_server)
+
+
+class OneBotServer(FrameServer):
+    """
+    OneBot 协议接口的公共实现。
+    各接口的参数组织与返回值解析在此完成, 子类只需实现 _request, 负责把一次调用送达 OneBot 实现并取回响应.
     详情查看 https://docs.go-cqhttp.org/api
 
-    :param host: 主机地址，格式为 "http://<ip>:<port>" 或 "https://<ip>:<port>"
-    :type host: str
+    :param timeout: 默认请求超时(秒)
+    :type timeout: float
+    :param timeouts: 按接口覆盖的请求超时(秒), 键为接口名, 如 "send_group_msg"
+    :type timeouts: dict[str, float]
 
     :raises SendFailure: 发送消息失败时抛出
     """
+    TIMEOUTS = {
+        'send_group_msg': 60,
+        'send_private_msg': 60,
+        'get_record': 30,
+        'get_forward_msg': 30,
+    }
+
+    def __init__(self, host: str, token: str, timeout: float = 10, timeouts: Optional[dict[str, float]] = None):
+        super().__init__(host, token)
+        self.timeout = timeout
+        self.timeouts = self.TIMEOUTS | (timeouts or {})
+        self.stats: dict[str, LatencyStats] = {}
+
+    @abc.abstractmethod
+    def _request(self, action: str, params: dict, method: str, timeout: float) -> dict: ...
+    """
+    发送一次接口调用并返回响应
+
+    :param action: 接口名
+    :param params: 接口参数
+    :param method: HTTP方法, 仅对HTTP实现有意义
+    :param timeout: 超时(秒)
+
+    :return: OneBot响应, 包含 status, retcode, data 等字段
+    :rtype: dict
+    """
+
+    def _call(self, action: str, params: Optional[dict] = None, method: str = 'GET') -> dict:
+        stats = self.stats.get(action) or self.stats.setdefault(action, LatencyStats())
+        start = time.perf_counter()
+        try:
+            response = self._request(action, params or {}, method, self.timeouts.get(action, self.timeout))
+        except Exception:
+            stats.record(time.perf_counter() - start, error=True)
+            raise
+        stats.record(time.perf_counter() - start)
+        return response
+
+    def get_stats(self) -> dict[str, dict]:
+        """
+        获取各接口的调用次数与耗时统计
+
+        :return: 键为接口名, 值为统计数据
+        :rtype: dict[str, dict]
+        """
+        return {action: stats.snapshot() for action, stats in list(self.stats.items())}
 
     def delete_message(self, message_id: int) -> None:
-        requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/delete_msg',
-            params={
+        self._call(
+            'delete_msg',
+            {
                 'message_id': message_id
             }
         )
 
     def get_login_info(self) -> dict:
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_login_info'
-        ).json()['data']
+        return self._call('get_login_info')['data']
 
     def get_record(self, file_id: str) -> bytes:
         return base64.urlsafe_b64decode(
-            requests.post(
-                headers={"Authorization": self.token},
-                url=self.host + '/get_record',
-                json={
+            self._call(
+                'get_record',
+                {
                     'file_id': file_id,
                     'out_format': 'wav'
-                }
-            ).json()['data']['base64']
+                },
+                'POST'
+            )['data']['base64']
         )
 
     def get_msg(self, message_id: int) -> dict:
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_msg',
-            params={
+        return self._call(
+            'get_msg',
+            {
                 'message_id': message_id
             }
-        ).json()['data']
+        )['data']
 
     def send_group_msg(self, message) -> int:
-        data = requests.post(
-            headers={"Authorization": self.token},
-            url=self.host + '/send_group_msg',
-            json={
+        data = self._call(
+            'send_group_msg',
+            {
                 'group_id': message.target.id,
                 'message': message.get_json()
-            }
-        ).json()
+            },
+            'POST'
+        )
         if data['status'] == 'failed':
             error_message = data['message']
             if "\"result\": 110" in error_message:
@@ -235,74 +319,63 @@ class OneBotHttpServer(FrameServer):
         return data['data']['message_id']
 
     def send_private_msg(self, message) -> int:
-        data = requests.post(
-            headers={"Authorization": self.token},
-            url=self.host + '/send_private_msg',
-            json={
+        data = self._call(
+            'send_private_msg',
+            {
                 'user_id': message.target.id,
                 'message': message.get_json()
-            }
-        ).json()
+            },
+            'POST'
+        )
         if not data['data']:
             raise SendFailure(data['message'], message)
         return data['data']['message_id']
 
     def get_stranger_info(self, id: int):
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_stranger_info',
-            params={
+        return self._call(
+            'get_stranger_info',
+            {
                 'user_id':  id
             }
-        ).json()['data']
+        )['data']
 
     def get_group_info(self, id: int):
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_group_info',
-            params={
+        return self._call(
+            'get_group_info',
+            {
                 'group_id':  id
             }
-        ).json()['data']
+        )['data']
 
     def set_friend_add_request(self, flag: str, approve: bool = True):
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/set_friend_add_request',
-            params={
+        return self._call(
+            'set_friend_add_request',
+            {
                 'flag': flag,
                 'approve': approve
             }
-        ).json()['data']
+        )['data']
 
     def set_group_add_request(self, flag: str, approve: bool = True):
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/set_group_add_request',
-            params={
+        return self._call(
+            'set_group_add_request',
+            {
                 'flag': flag,
                 'approve': approve
             }
-        ).json()['data']
+        )['data']
 
     def get_friend_list(self) -> list:
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_friend_list'
-        ).json()['data']
+        return self._call('get_friend_list')['data']
 
     def get_group_list(self) -> list:
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_group_list'
-        ).json()['data']
+        return self._call('get_group_list')['data']
 
     @dispatch
     def poke(self, user_id: int, group_id: int) -> None:
-        requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/send_poke',
-            params={
+        self._call(
+            'send_poke',
+            {
                 'group_id': group_id,
                 'user_id': user_id,
             }
@@ -310,24 +383,258 @@ class OneBotHttpServer(FrameServer):
 
     @dispatch
     def poke(self, user_id: int) -> None:
-        requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/send_poke',
-            params={
+        self._call(
+            'send_poke',
+            {
                 'user_id': user_id,
             }
         )
 
     def get_forward_msg(self, message_id: str) -> list[dict]:
-        return requests.get(
-            headers={"Authorization": self.token},
-            url=self.host + '/get_forward_msg',
-            params={
+        return self._call(
+            'get_forward_msg',
+            {
                 'message_id': message_id
             }
-        ).json()['data'].get('messages', [])
+        )['data'].get('messages', [])
+
+
+class OneBotHttpServer(OneBotServer):
+    """
+    OneBot HTTP 服务器接口实现。
+    所有请求复用同一个保持连接的会话, 连接失败时按退避策略有限重试.
+
+    :param host: 主机地址，格式为 "http://<ip>:<port>" 或 "https://<ip>:<port>"
+    :type host: str
+    :param pool_size: 连接池最大保持连接数
+    :type pool_size: int
+    :param retries: 连接错误时的最大重试次数
+    :type retries: int
+    :param backoff_factor: 重试退避系数, 第n次重试前等待 backoff_factor * 2 ** (n - 1) 秒
+    :type backoff_factor: float
+    """
+
+    def __init__(
+            self,
+            host: str,
+            token: str,
+            pool_size: int = 10,
+            timeout: float = 10,
+            timeouts: Optional[dict[str, float]] = None,
+            retries: int = 3,
+            backoff_factor: float = 0.5
+    ):
+        super().__init__(host, token, timeout, timeouts)
+
+        # 只重试连接阶段的错误, 请求已发出后不重试, 避免重复发送消息
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=urllib3.Retry(
+                total=retries,
+                connect=retries,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=backoff_factor,
+                raise_on_status=False
+            )
+        )
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = self.token
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _request(self, action: str, params: dict, method: str, timeout: float) -> dict:
+        if method == 'GET':
+            kwargs = {'params': params}
+        else:
+            kwargs = {'json': params}
+        return self.session.request(method, f'{self.host}/{action}', timeout=timeout, **kwargs).json()
+
+
+class OneBotWebSocketServer(OneBotServer):
+    """
+    OneBot WebSocket 接口实现。
+    接口调用与事件推送共用一条持久连接, 并发调用按 echo 区分, 响应到达时完成对应的 Future.
+
+    :param url: 正向连接时 OneBot 实现的 WebSocket 地址, 格式为 "ws://<ip>:<port>"
+    :type url: str
+    :param mode: "forward" 由机器人连接 OneBot 实现; "reverse" 由 OneBot 实现连接机器人的 /onebot 路径
+    :type mode: str
+    :param reconnect_interval: 正向连接断开后的重连间隔(秒)
+    :type reconnect_interval: float
+    :param fallback: WebSocket 未连接时改用的接口实现
+    :type fallback: Optional[OneBotServer]
+    """
+    MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+    def __init__(
+            self,
+            url: str,
+            token: str,
+            mode: str = 'forward',
+            timeout: float = 10,
+            timeouts: Optional[dict[str, float]] = None,
+            reconnect_interval: float = 3,
+            fallback: Optional[OneBotServer] = None
+    ):
+        assert mode in ('forward', 'reverse'), f'Unknown websocket mode {mode}.'
+        super().__init__(url, token, timeout, timeouts)
+        self.mode = mode
+        self.reconnect_interval = reconnect_interval
+        self.fallback = fallback
+        self._echo = itertools.count()
+        self._pending: dict[str, concurrent.futures.Future] = {}
+        self._connection = None
+        self._loop: Optional[tornado.ioloop.IOLoop] = None
+        self._connected = threading.Event()
+        if mode == 'forward':
+            threading.Thread(target=asyncio.run, args=(self._run_forward(), ), daemon=True).start()
+
+    def __str__(self):
+        return f'{self.host} ({self.mode})'
+
+    async def _run_forward(self):
+        request = tornado.httpclient.HTTPRequest(self.host, headers={'Authorization': self.token})
+        while True:
+            try:
+                connection = await tornado.websocket.websocket_connect(
+                    request, max_message_size=self.MAX_MESSAGE_SIZE
+                )
+            except (OSError, tornado.httpclient.HTTPClientError, tornado.websocket.WebSocketError) as error:
+                LOG.WAR(f'Frame server websocket connect failed: {error}')
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+
+            self.attach(connection, tornado.ioloop.IOLoop.current())
+            try:
+                while (text := await connection.read_message()) is not None:
+                    try:
+                        self.feed(text)
+                    except Exception as error:
+                        # 单帧出错只丢弃该帧, 不中断接收
+                        LOG.WAR(f'Frame server websocket frame dropped: {error!r}')
+            finally:
+                self.detach(connection)
+            await asyncio.sleep(self.reconnect_interval)
+
+    def authorize(self, authorization: Optional[str]) -> bool:
+        """
+        校验反向连接携带的 Authorization 头
+        """
+        if not self.token:
+            return True
+        # 比较耗时与内容无关, 避免按响应时间逐字节猜出令牌
+        return hmac.compare_digest(
+            (authorization or '').removeprefix('Bearer ').encode(), self.token.removeprefix('Bearer ').encode()
+        )
+
+    def attach(self, connection, loop: tornado.ioloop.IOLoop) -> None:
+        """
+        绑定已建立的连接
+
+        :param connection: 具有 write_message 方法的 WebSocket 连接
+        :param loop: 该连接所属的 IOLoop, 写入都会调度到此循环
+        """
+        if self._connection is not None:
+            LOG.WAR('Frame server websocket replaced by a new connection.')
+        self._connection = connection
+        self._loop = loop
+        self._connected.set()
+        LOG.INF(f'Frame server websocket connected: {self}')
+
+    def detach(self, connection) -> None:
+        if connection is not self._connection:
+            return
+        self._connected.clear()
+        self._connection = None
+        self._loop = None
+        for echo in list(self._pending):
+            future = self._pending.pop(echo, None)
+            if future and not future.done():
+                future.set_exception(ConnectionError('Frame server websocket disconnected.'))
+        LOG.WAR(f'Frame server websocket disconnected: {self}')
+
+    def feed(self, text: str | bytes) -> None:
+        """
+        处理连接上收到的一帧数据, 响应交给对应的 Future, 事件交给事件处理函数
+        """
+        data = json.loads(text)
+        if 'post_type' in data:
+            self.emit_event(data)
+            return
+        future = self._pending.pop(str(data.get('echo')), None)
+        if future is None:
+            LOG.DEB(f'Frame server response without waiter: {data}')
+            return
+        if not future.done():
+            future.set_result(data)
+
+    @staticmethod
+    def _write(connection, payload: str) -> None:
+        try:
+            connection.write_message(payload)
+        except tornado.websocket.WebSocketClosedError:
+            ...
+
+    def _submit(self, action: str, params: dict) -> tuple[str, concurrent.futures.Future]:
+        """
+        发出一次接口调用, 不等待响应
+
+        :return: 本次调用的 echo, 以及响应到达时完成的 Future
+        """
+        connection, loop = self._connection, self._loop
+        if connection is None:
+            raise ConnectionError('Frame server websocket not connected.')
+        echo = str(next(self._echo))
+        future = concurrent.futures.Future()
+        self._pending[echo] = future
+        loop.add_callback(self._write, connection, json.dumps({'action': action, 'params': params, 'echo': echo}))
+        return echo, future
+
+    def _request(self, action: str, params: dict, method: str, timeout: float) -> dict:
+        if not self._connected.is_set():
+            if self.fallback is not None:
+                return self.fallback._request(action, params, method, timeout)
+            if not self._connected.wait(timeout):
+                raise ConnectionError('Frame server websocket not connected.')
+        echo, future = self._submit(action, params)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f'Frame server action {action} timed out.')
+        finally:
+            self._pending.pop(echo, None)
+
+
+def create_frame_server(type: str = 'http', websocket: Optional[dict] = None, **config) -> OneBotServer:
+    """
+    按配置创建 FrameServer, 未知类型时使用 HTTP 实现
+
+    :param type: "http" 或 "websocket"
+    :param websocket: WebSocket 实现的参数, 见 OneBotWebSocketServer
+    :param config: HTTP 实现的参数, 见 OneBotHttpServer
+
+    :return: FrameServer 实例
+    """
+    match type:
+        case 'websocket':
+            return OneBotWebSocketServer(
+                token=config['token'],
+                timeout=config.get('timeout', 10),
+                timeouts=config.get('timeouts'),
+                fallback=OneBotHttpServer(**config) if config.get('host') else None,
+                **(websocket or {})
+            )
+        case 'http':
+            ...
+        case final:
+            LOG.WAR(f'Unknown frame server type {final}, falling back to http.')
+    return OneBotHttpServer(**config)
 
 
 LOG.INF('Loading Frame Server API...')
-FRAME_SERVER = OneBotHttpServer(**CONFIG['frame_server_config'])
-LOG.INF(f'Frame Server API loaded: {FRAME_SERVER.host}')
+FRAME_SERVER = create_frame_server(**CONFIG['frame_server_config'])
+METRICS.register('frame_server', FRAME_SERVER.get_stats)
+LOG.INF(f'Frame Server API loaded: {FRAME_SERVER}')
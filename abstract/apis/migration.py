@@ -0,0 +1,76 @@
+from abstract.bases.importer import datetime, pathlib, re, typing
+
+from abstract.bases.log import LOG
+
+
+class Migration(typing.NamedTuple):
+    version: int
+    name: str
+    path: pathlib.Path
+
+
+class Migrator:
+    """
+    数据库结构的版本迁移. init.sql/init_sqlite.sql 为初始版本, 之后的结构变化以
+    migrations/<后端>/<版本号>_<说明>.sql 发布, 启动时按版本号顺序执行尚未执行的迁移,
+    已执行的版本记录在schema_migrations表中.
+
+    :param pool: 数据库连接池
+    :type pool: ConnectionPool
+    :param directory: 迁移文件目录, 其下按后端分为子目录
+    :type directory: str
+    """
+    TABLE = 'schema_migrations'
+
+    def __init__(self, pool, directory: str = 'migrations'):
+        self.pool = pool
+        self.directory = pathlib.Path(directory) / pool.backend.dialect
+
+    def get_migrations(self) -> list[Migration]:
+        migrations = []
+        for path in sorted(self.directory.glob('*.sql')):
+            version, _, name = path.stem.partition('_')
+            assert version.isdigit(), f'Invalid migration file name {path.name}.'
+            migrations.append(Migration(int(version), name, path))
+        assert len({migration.version for migration in migrations}) == len(migrations), \
+            f'Duplicate migration versions in {self.directory}.'
+        return migrations
+
+    def get_applied(self) -> set[int]:
+        with self.pool.transaction():
+            self.pool.cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+                'version int NOT NULL PRIMARY KEY, '
+                'name varchar(255) NOT NULL, '
+                'applied_time datetime NOT NULL)'
+            )
+            self.pool.cursor.execute(f'SELECT version FROM {self.TABLE}')
+            return {int(row[0]) for row in self.pool.cursor.fetchall()}
+
+    @staticmethod
+    def split(script: str) -> list[str]:
+        """
+        将迁移文件拆分为单条语句, 语句以行尾的分号结束
+        """
+        script = '\n'.join(line for line in script.splitlines() if not line.lstrip().startswith('--'))
+        return [statement.strip() for statement in re.split(r';[ \t]*(?:\n|$)', script) if statement.strip()]
+
+    def migrate(self) -> list[Migration]:
+        """
+        执行所有尚未执行的迁移, 每个迁移及其版本记录在同一事务中完成.
+        MySQL的DDL语句会隐式提交, 失败的迁移需要人工检查后重新启动.
+
+        :return: 本次执行的迁移
+        """
+        applied = self.get_applied()
+        pending = [migration for migration in self.get_migrations() if migration.version not in applied]
+        for migration in pending:
+            LOG.INF(f'Applying database migration {migration.version:04d}_{migration.name}...')
+            with self.pool.transaction():
+                for statement in self.split(migration.path.read_text(encoding='utf-8')):
+                    self.pool.cursor.execute(statement)
+                self.pool.cursor.execute(
+                    f'INSERT INTO {self.TABLE} (version, name, applied_time) VALUES (%s, %s, %s)',
+                    (migration.version, migration.name, datetime.datetime.now())
+                )
+        return pending
@@ -0,0 +1,381 @@
+from abstract.bases.importer import abc, datetime, decimal, functools, json, pathlib, pymysql, re, sqlite3
+from collections import deque
+from typing import Any, Optional
+
+from abstract.bases.config import CONFIG
+
+
+class SQLBackend(abc.ABC):
+    """
+    数据库后端. 上层统一使用MySQL方言与 %s 占位符, 游标接口与pymysql的默认游标一致:
+    execute返回影响或查询到的行数, 结果可由fetchone/fetchall取出.
+    """
+    name: str
+    # 方言名, 即迁移文件所在的子目录名
+    dialect: str
+    Error: type[Exception]
+
+    @abc.abstractmethod
+    def connect(self):
+        """
+        建立新连接
+        """
+
+    @abc.abstractmethod
+    def ping(self, connection):
+        """
+        检查空闲连接是否可用, 不可用时重连
+        """
+
+    @abc.abstractmethod
+    def get_cursor(self, connection):
+        """
+        :return: 接口与pymysql游标一致的游标
+        """
+
+    @abc.abstractmethod
+    def describe(self, connection) -> str:
+        """
+        :return: 用于日志的数据库描述
+        """
+
+    @abc.abstractmethod
+    def is_retryable(self, error: Exception) -> bool:
+        """
+        :return: 错误是否为死锁或锁等待超时, 即回滚后重新执行整个事务可能成功
+        """
+
+    @abc.abstractmethod
+    def load_schema(self, cursor) -> list[tuple[str, str, Optional[str], bool]]:
+        """
+        :return: 当前数据库所有列的(表名, 列名, 默认值, 是否为主键), 按表名与列顺序排列
+        """
+
+
+class MySQLBackend(SQLBackend):
+    """
+    MySQL/MariaDB后端
+
+    :param connect_config: pymysql.connect 的参数
+    """
+    name = 'MySQL'
+    dialect = 'mysql'
+    Error = pymysql.Error
+
+    def __init__(self, **connect_config):
+        self.connect_config = connect_config
+
+    def connect(self) -> pymysql.Connection:
+        return pymysql.connect(**self.connect_config)
+
+    def ping(self, connection: pymysql.Connection):
+        connection.ping(reconnect=True)
+
+    def get_cursor(self, connection: pymysql.Connection) -> pymysql.cursors.Cursor:
+        return connection.cursor()
+
+    def describe(self, connection: pymysql.Connection) -> str:
+        return f'{connection.get_server_info()} at {connection.host}:{connection.port}'
+
+    def is_retryable(self, error: Exception) -> bool:
+        # 1213: 死锁, 1205: 锁等待超时
+        return isinstance(error, pymysql.OperationalError) and error.args[0] in (1205, 1213)
+
+    def load_schema(self, cursor: pymysql.cursors.Cursor) -> list[tuple[str, str, Optional[str], bool]]:
+        cursor.execute(
+            'select table_name, column_name, column_default, column_key '
+            'from information_schema.columns '
+            'where table_schema = database() '
+            'order by table_name, ordinal_position'
+        )
+        return [(table, column, default, key == 'PRI') for table, column, default, key in cursor.fetchall()]
+
+
+@functools.lru_cache(maxsize=1024)
+def translate_sql(sql: str, bind: bool) -> tuple[str, bool]:
+    """
+    将MySQL方言的SQL转换为SQLite方言
+
+    :param bind: 是否有参数绑定, 与pymysql一致, 仅在有参数时处理 %s 与 %%
+
+    :return: 转换后的SQL, 是否为 select ... for update
+    """
+    if bind:
+        sql = re.sub(r'%([s%])', lambda match: '?' if match[1] == 's' else '%', sql)
+    sql = re.sub(r'^(\s*)INSERT\s+IGNORE\b', r'\1INSERT OR IGNORE', sql, flags=re.IGNORECASE)
+    sql, locking = re.subn(r'\s+FOR\s+UPDATE\s*$', '', sql, flags=re.IGNORECASE)
+    return sql, bool(locking)
+
+
+class SQLiteCursor:
+    """
+    以pymysql游标的接口包装sqlite3游标. 执行前转换SQL方言, 查询结果在执行时全部取出.
+    SQLite没有行锁, select ... for update 改为在事务开始时获取写锁.
+
+    :param connection: sqlite3连接
+    :type connection: sqlite3.Connection
+    """
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.rows: deque[tuple] = deque()
+
+    def execute(self, sql: str, params: Optional[tuple] = None) -> int:
+        sql, locking = translate_sql(sql, params is not None)
+        if locking and not self.connection.in_transaction:
+            self.cursor.execute('BEGIN IMMEDIATE')
+        self.cursor.execute(sql, params or ())
+        if self.cursor.description is None:
+            self.rows = deque()
+            return self.cursor.rowcount
+        self.rows = deque(self.cursor.fetchall())
+        return len(self.rows)
+
+    def executemany(self, sql: str, params: list[tuple]) -> int:
+        self.cursor.executemany(translate_sql(sql, True)[0], params)
+        self.rows = deque()
+        return self.cursor.rowcount
+
+    def fetchone(self) -> Optional[tuple]:
+        return self.rows.popleft() if self.rows else None
+
+    def fetchall(self) -> tuple[tuple, ...]:
+        rows, self.rows = tuple(self.rows), deque()
+        return rows
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self.cursor.lastrowid
+
+    def close(self):
+        self.cursor.close()
+
+
+def _parse_json_path(path: str) -> list[str | int]:
+    """
+    解析 $.key[0]."quoted key" 形式的JSON路径
+    """
+    assert path.startswith('$'), f'Invalid JSON path {path}.'
+    legs = []
+    for key, quoted, index in re.findall(r'\.(?:(\w+)|"((?:[^"\\]|\\.)*)")|\[(\d+)\]', path[1:]):
+        legs.append(int(index) if index else key or json.loads(f'"{quoted}"'))
+    return legs
+
+
+def _format_json_path(legs: list[str | int]) -> str:
+    return '$' + ''.join(
+        f'[{leg}]' if isinstance(leg, int) else f'.{leg}' if leg.isidentifier() else f'.{json.dumps(leg)}'
+        for leg in legs
+    )
+
+
+def _resolve(doc, legs: list[str | int]):
+    for leg in legs:
+        doc = doc[leg]
+    return doc
+
+
+def _contains(target, candidate) -> bool:
+    # 与MySQL的json_contains规则一致: 数组包含候选数组的每个元素, 对象包含候选对象的每个键值
+    if isinstance(target, dict):
+        return isinstance(candidate, dict) and all(
+            key in target and _contains(target[key], value) for key, value in candidate.items()
+        )
+    if isinstance(target, list):
+        if isinstance(candidate, list):
+            return all(_contains(target, item) for item in candidate)
+        return any(_contains(item, candidate) for item in target)
+    return target == candidate and isinstance(target, bool) == isinstance(candidate, bool)
+
+
+def json_array_append(doc: Optional[str], *pairs) -> Optional[str]:
+    if doc is None:
+        return None
+    data = json.loads(doc)
+    for path, value in zip(pairs[::2], pairs[1::2]):
+        legs = _parse_json_path(path)
+        if not legs:
+            data = data + [value] if isinstance(data, list) else [data, value]
+            continue
+        parent = _resolve(data, legs[:-1])
+        try:
+            current = parent[legs[-1]]
+        except (KeyError, IndexError):
+            continue
+        parent[legs[-1]] = current + [value] if isinstance(current, list) else [current, value]
+    return json.dumps(data, ensure_ascii=False)
+
+
+def json_contains(doc: Optional[str], candidate: Optional[str], path: Optional[str] = None) -> Optional[int]:
+    if doc is None or candidate is None:
+        return None
+    data = json.loads(doc)
+    if path is not None:
+        try:
+            data = _resolve(data, _parse_json_path(path))
+        except (KeyError, IndexError, TypeError):
+            return None
+    return int(_contains(data, json.loads(candidate)))
+
+
+def json_contains_path(doc: Optional[str], one_or_all: str, *paths: str) -> Optional[int]:
+    if doc is None:
+        return None
+    data = json.loads(doc)
+    found = []
+    for path in paths:
+        try:
+            _resolve(data, _parse_json_path(path))
+        except (KeyError, IndexError, TypeError):
+            found.append(False)
+        else:
+            found.append(True)
+    return int(any(found) if one_or_all.lower() == 'one' else all(found))
+
+
+def json_search(doc: Optional[str], one_or_all: str, search: Optional[str]) -> Optional[str]:
+    if doc is None or search is None:
+        return None
+    pattern = re.compile(
+        ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char) for char in search), re.DOTALL
+    )
+    paths = []
+
+    def walk(value, legs):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(item, legs + [key])
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                walk(item, legs + [index])
+        elif isinstance(value, str) and pattern.fullmatch(value):
+            paths.append(_format_json_path(legs))
+
+    walk(json.loads(doc), [])
+    if not paths:
+        return None
+    if one_or_all.lower() == 'one' or len(paths) == 1:
+        return json.dumps(paths[0])
+    return json.dumps(paths)
+
+
+def json_unquote(value: Optional[str]) -> Optional[str]:
+    if isinstance(value, str) and len(value) >= 2 and value[0] == value[-1] == '"':
+        return json.loads(value)
+    return value
+
+
+def curdate() -> str:
+    return datetime.date.today().isoformat()
+
+
+def now() -> str:
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def adapt_datetime(value: datetime.datetime) -> str:
+    # 与MySQL的datetime列一致, 不保存时区与微秒
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def adapt_decimal(value: decimal.Decimal) -> int | float:
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+sqlite3.register_adapter(datetime.datetime, adapt_datetime)
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(decimal.Decimal, adapt_decimal)
+sqlite3.register_converter('datetime', lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('date', lambda value: datetime.date.fromisoformat(value.decode()))
+sqlite3.register_converter('decimal', lambda value: decimal.Decimal(value.decode()))
+
+
+class SQLiteBackend(SQLBackend):
+    """
+    嵌入式SQLite后端, 使用WAL模式. 数据库中没有表时执行初始化脚本建表.
+    MySQL中SQLite不具备的JSON与日期函数以Python函数注册.
+
+    :param path: 数据库文件路径
+    :type path: str
+    :param init_script: 建表脚本路径
+    :type init_script: str
+    :param timeout: 等待其他连接释放写锁的超时(秒)
+    :type timeout: float
+    """
+    name = 'SQLite'
+    dialect = 'sqlite'
+    Error = sqlite3.Error
+    FUNCTIONS: dict[str, tuple[int, Any, bool]] = {
+        'json_array_append': (-1, json_array_append, True),
+        'json_contains': (-1, json_contains, True),
+        'json_contains_path': (-1, json_contains_path, True),
+        'json_search': (3, json_search, True),
+        'json_unquote': (1, json_unquote, True),
+        'curdate': (0, curdate, False),
+        'now': (0, now, False),
+    }
+
+    def __init__(self, path: str = 'qqbot.db', init_script: str = 'init_sqlite.sql', timeout: float = 10):
+        self.path = path
+        self.init_script = init_script
+        self.timeout = timeout
+        connection = self.connect()
+        try:
+            connection.execute('PRAGMA journal_mode = WAL')
+            if not connection.execute("select 1 from sqlite_master where type = 'table'").fetchone():
+                connection.executescript(pathlib.Path(init_script).read_text(encoding='utf-8'))
+        finally:
+            connection.close()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # 隐式事务在第一条写语句前以 BEGIN IMMEDIATE 开始, 直至连接归还时提交
+            isolation_level='IMMEDIATE',
+            check_same_thread=False
+        )
+        connection.execute('PRAGMA synchronous = NORMAL')
+        for name, (num, func, deterministic) in self.FUNCTIONS.items():
+            connection.create_function(name, num, func, deterministic=deterministic)
+        return connection
+
+    def ping(self, connection: sqlite3.Connection):
+        ...
+
+    def get_cursor(self, connection: sqlite3.Connection) -> SQLiteCursor:
+        return SQLiteCursor(connection)
+
+    def describe(self, connection: sqlite3.Connection) -> str:
+        return f'{sqlite3.sqlite_version} at {pathlib.Path(self.path).absolute()}'
+
+    def is_retryable(self, error: Exception) -> bool:
+        # 等待写锁超过timeout
+        return isinstance(error, sqlite3.OperationalError) and 'database is locked' in str(error)
+
+    def load_schema(self, cursor: SQLiteCursor) -> list[tuple[str, str, Optional[str], bool]]:
+        cursor.execute(
+            'select m.name, p.name, p.dflt_value, p.pk '
+            'from sqlite_master as m join pragma_table_xinfo(m.name) as p '
+            "where m.type = 'table' and m.name not like 'sqlite_%' "
+            'order by m.name, p.cid'
+        )
+        return [(table, column, default, bool(primary)) for table, column, default, primary in cursor.fetchall()]
+
+
+def create_backend(name: str) -> SQLBackend:
+    """
+    :param name: 'mysql' | 'sqlite'
+    """
+    match name:
+        case 'mysql':
+            return MySQLBackend(**CONFIG['sql_config'])
+        case 'sqlite':
+            return SQLiteBackend(**CONFIG.get('sqlite_config', {}))
+        case _:
+            raise ValueError(f'Unknown SQL backend {name}!')
@@ -1,24 +1,502 @@
-from abstract.bases.importer import functools, threading, pymysql, dispatch
+from abstract.bases.importer import functools, threading, queue, time, typing, itertools, random
 
+from abstract.apis.migration import Migrator
+from abstract.apis.sql_backend import SQLBackend, create_backend
+from abstract.bases.aio import AsyncAdapter
 from abstract.bases.config import CONFIG
 from abstract.bases.log import LOG
+from abstract.bases.metrics import LatencyStats, METRICS
 
 
-class Table:
-    LOCK = threading.Lock()
+class ConnectionPool:
+    """
+    数据库连接池. 线程在最外层 with 中借出一个连接, 嵌套的 with 复用同一连接,
+    因此嵌套在同一最外层 with 中的所有语句属于同一事务, 最外层正常退出时提交, 因异常退出时回滚.
+
+    :param backend: 数据库后端
+    :type backend: SQLBackend
+    :param size: 最大连接数
+    :type size: int
+    :param timeout: 等待空闲连接的超时(秒)
+    :type timeout: float
+    :param idle_ping: 连接空闲超过该时间(秒)才在借出时检查连接是否可用
+    :type idle_ping: float
+    """
+    def __init__(self, backend: SQLBackend, size: int = 8, timeout: float = 10, idle_ping: float = 30):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.idle_ping = idle_ping
+        self.created = 0
+        self.committed = 0
+        self.rolled_back = 0
+        self.retried = 0
+        self.wait_stats = LatencyStats()
+        self._lock = threading.Lock()
+        # 空闲连接与其归还时间, 后进先出使常用连接保持活跃
+        self._idle: queue.LifoQueue[tuple[typing.Any, float]] = queue.LifoQueue()
+        self._local = threading.local()
+
+    def _acquire(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                connection, released = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    create = self.created < self.size
+                    if create:
+                        self.created += 1
+                if create:
+                    try:
+                        connection = self.backend.connect()
+                    except BaseException:
+                        with self._lock:
+                            self.created -= 1
+                        raise
+                    self.wait_stats.record(time.perf_counter() - start)
+                    return connection
+                try:
+                    connection, released = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self.wait_stats.record(time.perf_counter() - start, error=True)
+                    raise TimeoutError(f'No database connection available in {self.timeout}s.')
+            # 被丢弃的连接留下的空位, 重新尝试创建连接
+            if connection is None:
+                continue
+            if time.monotonic() - released > self.idle_ping:
+                try:
+                    self.backend.ping(connection)
+                except BaseException:
+                    self._discard(connection)
+                    raise
+            self.wait_stats.record(time.perf_counter() - start)
+            return connection
+
+    def _discard(self, connection):
+        """
+        丢弃不可用的连接, 并唤醒一个等待连接的线程重新创建
+        """
+        with self._lock:
+            self.created -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._idle.put((None, 0.0))
+
+    def checkout(self):
+        """
+        当前线程借出连接, 已借出时增加嵌套深度
+        """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            return
+        connection = self._acquire()
+        try:
+            cursor = self.backend.get_cursor(connection)
+        except BaseException:
+            self._discard(connection)
+            raise
+        local.connection, local.cursor = connection, cursor
+        local.callbacks = []
+        local.depth = 1
+
+    def checkin(self, rollback: bool = False):
+        """
+        当前线程减少嵌套深度, 最外层时提交或回滚并归还连接
+
+        :param rollback: 最外层时是否回滚
+        """
+        local = self._local
+        local.depth -= 1
+        if local.depth:
+            return
+        connection, cursor, callbacks = local.connection, local.cursor, local.callbacks
+        local.connection = local.cursor = local.callbacks = None
+        try:
+            cursor.close()
+            if rollback:
+                connection.rollback()
+                self.rolled_back += 1
+            else:
+                connection.commit()
+                self.committed += 1
+        except self.backend.Error:
+            # 连接已不可用, 丢弃并允许重新创建
+            self._discard(connection)
+            raise
+        self._idle.put((connection, time.monotonic()))
+        if rollback:
+            return
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as error:
+                LOG.WAR(f'After commit callback {callback} failed: {error}')
+
+    @property
+    def depth(self) -> int:
+        """
+        当前线程的嵌套深度, 为0时不在事务中
+        """
+        return getattr(self._local, 'depth', 0)
+
+    def after_commit(self, callback: typing.Callable[[], typing.Any]):
+        """
+        当前事务提交后执行callback, 事务回滚时不执行. 用于在数据写入成功后同步内存中的状态.
+        """
+        assert self.depth, 'after_commit used outside of a transaction.'
+        self._local.callbacks.append(callback)
+
+    def transaction(self) -> 'Transaction':
+        """
+        跨多个表与多条语句的事务, 在其中使用的所有表共用同一连接:
+
+            with SQL_POOL.transaction():
+                USER_TABLE.where(id=a).set('points = points - %s', 1).update()
+                USER_TABLE.where(id=b).set('points = points + %s', 1).update()
+        """
+        return Transaction(self)
+
+    def transactional(self, retries: int = 3, backoff: float = 0.05):
+        """
+        以事务执行被装饰的函数, 因死锁或锁等待超时失败时回滚并重新执行整个函数.
+        在已有事务中调用时加入该事务, 由最外层的事务负责重试.
+        被装饰的函数可能执行多次, 其中不应有发送消息等无法回滚的操作.
+
+        :param retries: 最多重试次数
+        :param backoff: 首次重试前等待的时间(秒), 之后每次加倍
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                nested = bool(self.depth)
+                for attempt in itertools.count():
+                    try:
+                        with self.transaction():
+                            return func(*args, **kwargs)
+                    except self.backend.Error as error:
+                        if nested or attempt >= retries or not self.backend.is_retryable(error):
+                            raise
+                        self.retried += 1
+                        LOG.WAR(f'Transaction {func.__qualname__} failed: {error}, retrying ({attempt + 1}/{retries}).')
+                        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+            return wrapper
+
+        return decorator
+
+    @property
+    def connection(self):
+        """
+        当前线程借出的连接, 只能在 with table 中使用
+        """
+        connection = getattr(self._local, 'connection', None)
+        assert connection is not None, 'Connection used outside of a table context.'
+        return connection
+
+    @property
+    def cursor(self):
+        """
+        当前线程借出连接的游标, 只能在 with table 中使用
+        """
+        cursor = getattr(self._local, 'cursor', None)
+        assert cursor is not None, 'Cursor used outside of a table context.'
+        return cursor
+
+    def get_stats(self) -> dict:
+        return {
+            'connections': f'{self.created}/{self.size}',
+            'idle': sum(connection is not None for connection, _ in list(self._idle.queue)),
+            'committed': self.committed,
+            'rolled_back': self.rolled_back,
+            'retried': self.retried,
+            'wait': self.wait_stats.snapshot(),
+        }
+
+
+class Transaction:
+    """
+    连接池上的事务, 见 ConnectionPool.transaction
+
+    :param pool: 数据库连接池
+    :type pool: ConnectionPool
+    """
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def __enter__(self) -> 'Transaction':
+        self.pool.checkout()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.pool.checkin(rollback=exc_type is not None)
+
+
+class Column(typing.NamedTuple):
+    name: str
+    default: typing.Optional[str]
+    primary: bool
+
+
+class SchemaCache(dict[str, list[Column]]):
+    """
+    当前数据库各表的列信息, 启动时以一次查询加载, 表结构变化后调用refresh重新加载
+
+    :param pool: 数据库连接池
+    :type pool: ConnectionPool
+    """
+    def __init__(self, pool: ConnectionPool):
+        super().__init__()
+        self.pool = pool
+
+    def refresh(self) -> 'SchemaCache':
+        self.pool.checkout()
+        try:
+            rows = self.pool.backend.load_schema(self.pool.cursor)
+        finally:
+            self.pool.checkin()
+        self.clear()
+        for table_name, column_name, default, primary in rows:
+            self.setdefault(table_name, []).append(Column(column_name, default, primary))
+        return self
+
+    def get_columns(self, table_name: str) -> list[Column]:
+        assert table_name in self, f'Table {table_name} not found in schema.'
+        return self[table_name]
+
+    def get_primary_key(self, table_name: str) -> list[str]:
+        return [column.name for column in self.get_columns(table_name) if column.primary]
+
+
+class Query:
+    """
+    Table上的查询构造器. 值一律以参数绑定传入, 条件与列名为固定文本,
+    因此相同结构的查询总是得到同一条SQL, 编译结果按结构缓存.
+
+        USER_TABLE.select('points').where(id=user_id).scalar()
+        STOCK_TABLE.where(id=user_id).update(trade_num=0)
+
+    :param table: 查询的表
+    :type table: Table
+    """
+    SQL_CACHE: dict[tuple, str] = {}
+    SQL_CACHE_SIZE = 1024
+    hits = 0
+    misses = 0
+
+    def __init__(self, table: 'Table'):
+        self.table = table
+        self.columns: tuple[str, ...] = ('*', )
+        self.conditions: list[str] = []
+        self.condition_params: list = []
+        self.assignments: list[str] = []
+        self.assignment_params: list = []
+        self.orders: tuple[str, ...] = ()
+        self.limit_num: typing.Optional[int] = None
+        self.locking = False
+
+    def select(self, *columns: str) -> 'Query':
+        """
+        指定查询的列或表达式
+        """
+        self.columns = columns or ('*', )
+        return self
+
+    def where(self, condition: str = '', *params, **equals) -> 'Query':
+        """
+        添加条件, 多次调用之间以 and 连接
+
+        :param condition: 以 %s 作占位符的条件
+        :param params: condition中占位符对应的值
+        :param equals: 列名=值 形式的相等条件
+        """
+        if condition:
+            self.conditions.append(f'({condition})')
+            self.condition_params.extend(params)
+        for column, value in equals.items():
+            self.conditions.append(f'`{column}` = %s')
+            self.condition_params.append(value)
+        return self
+
+    def set(self, assignment: str = '', *params, **values) -> 'Query':
+        """
+        添加update的赋值
+
+        :param assignment: 以 %s 作占位符的赋值表达式, 如 'points = points + %s'
+        :param params: assignment中占位符对应的值
+        :param values: 列名=值 形式的赋值
+        """
+        if assignment:
+            self.assignments.append(assignment)
+            self.assignment_params.extend(params)
+        for column, value in values.items():
+            self.assignments.append(f'`{column}` = %s')
+            self.assignment_params.append(value)
+        return self
+
+    def order_by(self, *orders: str) -> 'Query':
+        self.orders = orders
+        return self
+
+    def limit(self, num: int) -> 'Query':
+        self.limit_num = num
+        return self
+
+    def for_update(self) -> 'Query':
+        """
+        select时对查询到的行加锁直至事务结束
+        """
+        self.locking = True
+        return self
+
+    def compile(self, kind: str) -> str:
+        """
+        生成SQL, 相同结构的查询复用已生成的SQL
 
-    def __init__(self, db: pymysql.Connection, name: str):
-        self.db = db
-        self.cursor = db.cursor()
+        :param kind: 'select' | 'update' | 'delete'
+        """
+        key = (
+            kind, self.table.name, self.columns, tuple(self.conditions), tuple(self.assignments),
+            self.orders, self.limit_num is not None, self.locking
+        )
+        if (sql := self.SQL_CACHE.get(key)) is not None:
+            Query.hits += 1
+            return sql
+        Query.misses += 1
+
+        match kind:
+            case 'select':
+                sql = f'SELECT {", ".join(self.columns)} FROM {self.table.name}'
+            case 'update':
+                assert self.assignments, 'Nothing to update.'
+                sql = f'UPDATE {self.table.name} SET {", ".join(self.assignments)}'
+            case 'delete':
+                sql = f'DELETE FROM {self.table.name}'
+            case _:
+                raise ValueError(f'Unknown query kind {kind}!')
+        if self.conditions:
+            sql += f' WHERE {" AND ".join(self.conditions)}'
+        if self.orders:
+            sql += f' ORDER BY {", ".join(self.orders)}'
+        if self.limit_num is not None:
+            sql += ' LIMIT %s'
+        if self.locking and kind == 'select':
+            sql += ' FOR UPDATE'
+
+        if len(self.SQL_CACHE) >= self.SQL_CACHE_SIZE:
+            self.SQL_CACHE.clear()
+        self.SQL_CACHE[key] = sql
+        return sql
+
+    def _params(self, kind: str) -> tuple:
+        params = self.condition_params
+        if kind == 'update':
+            params = self.assignment_params + params
+        if self.limit_num is not None:
+            params = params + [self.limit_num]
+        return tuple(params)
+
+    def execute(self, kind: str) -> int:
+        """
+        在当前线程的连接上执行, 需在 with table 中调用
+
+        :return: 影响或查询到的行数
+        """
+        return self.table.cursor.execute(self.compile(kind), self._params(kind))
+
+    def all(self) -> tuple[tuple, ...]:
+        with self.table:
+            self.execute('select')
+            return self.table.cursor.fetchall()
+
+    def first(self) -> typing.Optional[tuple]:
+        with self.table:
+            self.execute('select')
+            return self.table.cursor.fetchone()
+
+    def scalar(self, default=None):
+        """
+        :return: 第一行第一列的值, 没有结果时返回default
+        """
+        row = self.first()
+        return default if row is None else row[0]
+
+    def exists(self) -> bool:
+        with self.table:
+            return bool(self.limit(1).execute('select'))
+
+    def update(self, **values) -> int:
+        """
+        :return: 更新的行数
+        """
+        self.set(**values)
+        with self.table:
+            return self.execute('update')
+
+    def delete(self) -> int:
+        """
+        :return: 删除的行数
+        """
+        with self.table:
+            return self.execute('delete')
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        return {
+            'shapes': len(cls.SQL_CACHE),
+            'hits': cls.hits,
+            'misses': cls.misses,
+        }
+
+
+class Table:
+    def __init__(self, pool: ConnectionPool, name: str):
+        self.pool = pool
         self.name = name
 
+    @property
+    def cursor(self):
+        return self.pool.cursor
+
     def __enter__(self):
-        self.LOCK.acquire()
-        self.db.ping()
+        self.pool.checkout()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.db.commit()
-        self.LOCK.release()
+        self.pool.checkin(rollback=exc_type is not None)
+
+    @functools.cached_property
+    def aio(self) -> 'AsyncTable':
+        """
+        本表的协程版本, 供异步命令使用
+        """
+        return AsyncTable(self)
+
+    def select(self, *columns: str) -> Query:
+        return Query(self).select(*columns)
+
+    def where(self, condition: str = '', *params, **equals) -> Query:
+        return Query(self).where(condition, *params, **equals)
+
+    def insert(self, **values) -> int:
+        """
+        以列名=值插入一行, 未给出的列取默认值
+
+        :return: 插入行的自增id
+        """
+        columns = tuple(values)
+        key = ('insert', self.name, columns)
+        if (sql := Query.SQL_CACHE.get(key)) is None:
+            sql = Query.SQL_CACHE[key] = (
+                f'INSERT INTO {self.name} ({", ".join(f"`{column}`" for column in columns)}) '
+                f'VALUES ({", ".join(["%s"] * len(columns))})'
+            )
+        with self:
+            self.cursor.execute(sql, tuple(values.values()))
+            return self.cursor.lastrowid
 
     @staticmethod
     def _with_lock(func):
@@ -32,70 +510,220 @@ class Table:
     @_with_lock
     def create(self, column, type, *args):
         self.cursor.execute(f'CREATE TABLE {self.name}({column} {type} {" ".join(args)})')
+        SCHEMA.refresh()
         return self
 
     @_with_lock
     def add_key(self, key, type: str, *args):
         self.cursor.execute(f"ALTER TABLE {self.name} ADD {key} {type} {' '.join(args)}")
+        SCHEMA.refresh()
         return self
 
     @_with_lock
     def delete_key(self, key):
         self.cursor.execute(f"ALTER TABLE {self.name} DROP COLUMN {key}")
+        SCHEMA.refresh()
         return self
 
     @_with_lock
-    def get_len(self):
-        assert self.cursor.execute(
-            f'select column_name from information_schema.columns where table_name = "{self.name}"'
-        ), 'No data. Can not get len.'
-        return len(self.cursor.fetchall())
+    def ensure_rows(self, rows: list[tuple]):
+        """
+        批量插入不存在的行, 以一条 INSERT IGNORE 完成
 
-    @_with_lock
-    def exists(self):
-        return bool(self.cursor.execute(f"select * from information_schema.tables where table_name = '{self.name}'"))
+        :param rows: 各行主键列的值
+        """
+        primary_key = SCHEMA.get_primary_key(self.name)
+        assert all(len(primary_key) == len(row) for row in rows), f'Table {self.name} has primary key {primary_key}.'
+        self.cursor.executemany(
+            f'INSERT IGNORE INTO {self.name} ({", ".join(primary_key)}) VALUES ({", ".join(["%s"] * len(primary_key))})',
+            rows
+        )
+        return self
 
-    @_with_lock
-    def get(self, *args, attr: str = '*'):
-        self.cursor.execute(f"SELECT {attr} FROM {self.name} " + ' '.join(args))
-        result = self.cursor.fetchone()
-        return result
 
-    @_with_lock
-    def get_all(self, *args, attr: str = '*'):
-        self.cursor.execute(f"SELECT {attr} FROM {self.name} " + ' '.join(args))
-        return self.cursor.fetchall()
+class RowProvisioner:
+    """
+    保证以id为主键的若干表中存在某id的行. 已确认存在的id记录在内存中, 之后不再查询数据库.
 
-    @_with_lock
-    def set(self, key, value, attr, target):
-        self.cursor.execute(f"UPDATE {self.name} SET `{attr}` = %s WHERE {key} = %s", (target, value))
-        return self
+    :param tables: 以id为主键的表
+    :type tables: Table
+    """
+    def __init__(self, *tables: Table):
+        self.tables = tables
+        self.known: set[int] = set()
+        self.provisioned = 0
+        self.listeners: list[typing.Callable[[list[int]], typing.Any]] = []
+        self._lock = threading.Lock()
 
-    @dispatch
-    @_with_lock
-    def add(self, *args):
-        self.cursor.execute(f"INSERT INTO {self.name} VALUES {args}")
+    def warm(self) -> 'RowProvisioner':
+        """
+        从数据库加载所有表中均已存在的id
+        """
+        known = None
+        for table in self.tables:
+            ids = {int(row[0]) for row in table.select('id').all()}
+            known = ids if known is None else known & ids
+        with self._lock:
+            self.known = known or set()
         return self
 
-    @dispatch
-    @_with_lock
-    def add(self, args: tuple):
-        self.cursor.execute(f"INSERT INTO {self.name} VALUES {args}")
-        return self
+    def on_provision(self, callback: typing.Callable[[list[int]], typing.Any]):
+        """
+        订阅插入默认行, 回调在插入的事务提交后执行, 参数为插入的id
+        """
+        self.listeners.append(callback)
+        return callback
 
-    @dispatch
-    @_with_lock
-    def add(self, arg: str):
-        self.cursor.execute(f"INSERT INTO {self.name} VALUES ({arg})")
+    def ensure(self, *ids: int):
+        """
+        为未知的id在所有表中插入默认行, 在同一事务中完成
+        """
+        missing = [int(id) for id in ids if int(id) not in self.known]
+        if not missing:
+            return
+        with self.tables[0]:
+            for table in self.tables:
+                table.ensure_rows([(id, ) for id in missing])
+            for callback in self.listeners:
+                self.tables[0].pool.after_commit(functools.partial(callback, missing))
+        with self._lock:
+            self.known.update(missing)
+            self.provisioned += len(missing)
 
-    @_with_lock
-    def delete(self, key, value):
-        self.cursor.execute(f"DELETE FROM {self.name} WHERE {key} = %s", (value, ))
+    def get_stats(self) -> dict:
+        return {
+            'known': len(self.known),
+            'provisioned': self.provisioned,
+        }
+
+
+class RowCache:
+    """
+    以id为主键的表的进程内缓存. 写入经由set写入数据库并刷新对应行, 数据库中的其他修改由reload定期同步.
+    行数据变化时通知订阅者, 新出现的行视为所有列均有变化. 不存在的行也会缓存, 直到reload或invalidate.
+
+    :param table: 以id为主键的表
+    :type table: Table
+    """
+    def __init__(self, table: Table):
+        self.table = table
+        self.rows: dict[int, dict[str, typing.Any]] = {}
+        # 数据库中不存在的id, 避免每次get都查询数据库
+        self.missing: set[int] = set()
+        self.subscribers: list[typing.Callable[[int, str, typing.Any], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: typing.Callable[[int, str, typing.Any], None]):
+        """
+        订阅行数据变化
+
+        :param callback: 回调函数, 参数为id, 列名, 新值
+        """
+        self.subscribers.append(callback)
+        return callback
+
+    def _notify(self, id: int, old: dict, new: dict):
+        for column, value in new.items():
+            if old.get(column) == value:
+                continue
+            for callback in self.subscribers:
+                try:
+                    callback(id, column, value)
+                except Exception as error:
+                    LOG.WAR(f'Row cache subscriber {callback} failed: {error}')
+
+    def _fetch(self, *args, params: tuple = ()) -> dict[int, dict[str, typing.Any]]:
+        columns = [column.name for column in SCHEMA.get_columns(self.table.name)]
+        with self.table:
+            self.table.cursor.execute(
+                f'SELECT {", ".join(f"`{column}`" for column in columns)} FROM {self.table.name} ' + ' '.join(args),
+                params
+            )
+            rows = self.table.cursor.fetchall()
+        return {int(row[0]): dict(zip(columns, row)) for row in rows}
+
+    def reload(self) -> 'RowCache':
+        """
+        从数据库重新加载整张表, 同步其他途径的修改
+        """
+        rows = self._fetch()
+        with self._lock:
+            old_rows, self.rows = self.rows, rows
+            self.missing.clear()
+        for id, row in rows.items():
+            self._notify(id, old_rows.get(id, {}), row)
         return self
 
-    @_with_lock
-    def find_exists(self, key, value):
-        return bool(self.cursor.execute(f"SELECT * FROM {self.name} WHERE {key} = {value}"))
+    def refresh(self, id: int) -> typing.Optional[dict[str, typing.Any]]:
+        """
+        从数据库重新加载一行
+
+        :return: 该行数据, 不存在时返回None
+        """
+        id = int(id)
+        row = self._fetch('WHERE id = %s', params=(id, )).get(id)
+        with self._lock:
+            old = self.rows.pop(id, None)
+            if row is None:
+                self.missing.add(id)
+            else:
+                self.missing.discard(id)
+                self.rows[id] = row
+        if row is not None:
+            self._notify(id, old or {}, row)
+        return row
+
+    def invalidate(self, ids: typing.Iterable[int]):
+        """
+        忘记缓存的不存在的id, 这些id的行已插入数据库时调用, 下次get时重新加载
+        """
+        with self._lock:
+            self.missing.difference_update(int(id) for id in ids)
+
+    def get(self, id: int, column: str, default=None):
+        """
+        获取一行中某列的值
+
+        :return: 列值, 行不存在时返回default
+        :raises KeyError: 列不存在
+        """
+        id = int(id)
+        if (row := self.rows.get(id)) is None:
+            if id in self.missing or (row := self.refresh(id)) is None:
+                return default
+        return row[column]
+
+    def set(self, id: int, column: str, value):
+        """
+        写入数据库并刷新缓存中的该行, 数据库拒绝写入时抛出原异常
+
+        :raises KeyError: 列不存在, 列名不会拼接进SQL文本
+        """
+        if column not in {column.name for column in SCHEMA.get_columns(self.table.name)}:
+            raise KeyError(column)
+        self.table.where(id=id).update(**{column: value})
+        self.refresh(id)
+
+    def select(self, predicate: typing.Callable[[dict[str, typing.Any]], bool]) -> list[dict[str, typing.Any]]:
+        """
+        获取满足条件的行
+        """
+        return [row for row in list(self.rows.values()) if predicate(row)]
+
+    def get_stats(self) -> dict:
+        return {
+            'rows': len(self.rows),
+            'missing': len(self.missing),
+            'subscribers': len(self.subscribers),
+        }
+
+
+class AsyncTable(AsyncAdapter):
+    """
+    Table 的协程接口, 方法与被包装的 Table 相同, 调用时需 await
+    """
+    def __init__(self, table: Table):
+        super().__init__(table)
 
 
 class Default:
@@ -111,17 +739,38 @@ class Null:
 DEFAULT = Default()
 NULL = Null()
 
-LOG.INF('Connecting to MySQL database...')
-sql_db = pymysql.connect(**CONFIG['sql_config'])
-LOG.INF(f'Connected to MySQL database: {sql_db.get_server_info()} at {sql_db.host}:{sql_db.port}')
+SQL_BACKEND = create_backend(CONFIG.get('sql_backend', 'mysql'))
+LOG.INF(f'Connecting to {SQL_BACKEND.name} database...')
+SQL_POOL = ConnectionPool(SQL_BACKEND, **CONFIG.get('sql_pool_config', {}))
+SQL_POOL.checkout()
+try:
+    LOG.INF(f'Connected to {SQL_BACKEND.name} database: {SQL_BACKEND.describe(SQL_POOL.connection)}')
+finally:
+    SQL_POOL.checkin()
+METRICS.register('sql_pool', SQL_POOL.get_stats)
+METRICS.register('sql_queries', Query.get_stats)
+LOG.INF('Migrating database schema...')
+MIGRATOR = Migrator(SQL_POOL, **CONFIG.get('migration_config', {}))
+LOG.INF(f'Applied {len(MIGRATOR.migrate())} database migrations.')
+LOG.INF('Loading database schema...')
+SCHEMA = SchemaCache(SQL_POOL).refresh()
 LOG.INF('Loading database tables...')
-USER_TABLE = Table(sql_db, 'qq_users')
-STOCK_TABLE = Table(sql_db, 'stocks')
-GROUP_OPTION_TABLE = Table(sql_db, 'group_options')
-NOTICE_SCHEDULE_TABLE = Table(sql_db, 'notice_schedule')
-AI_MESSAGES_TABLE = Table(sql_db, 'ai_messages')
-GAME_DATA_TABLE = Table(sql_db, 'game_data')
-ARCADES_TABLE = Table(sql_db, 'arcades')
+USER_TABLE = Table(SQL_POOL, 'qq_users')
+STOCK_TABLE = Table(SQL_POOL, 'stocks')
+GROUP_OPTION_TABLE = Table(SQL_POOL, 'group_options')
+NOTICE_SCHEDULE_TABLE = Table(SQL_POOL, 'notice_schedule')
+AI_MESSAGES_TABLE = Table(SQL_POOL, 'ai_messages')
+GAME_DATA_TABLE = Table(SQL_POOL, 'game_data')
+ARCADES_TABLE = Table(SQL_POOL, 'arcades')
+ARCADE_NAMES_TABLE = Table(SQL_POOL, 'arcade_names')
+TRADES_TABLE = Table(SQL_POOL, 'trades')
+USER_PROVISIONER = RowProvisioner(USER_TABLE, STOCK_TABLE, GAME_DATA_TABLE).warm()
+GROUP_PROVISIONER = RowProvisioner(GROUP_OPTION_TABLE).warm()
+METRICS.register('user_rows', USER_PROVISIONER.get_stats)
+METRICS.register('group_rows', GROUP_PROVISIONER.get_stats)
+GROUP_OPTIONS = RowCache(GROUP_OPTION_TABLE).reload()
+GROUP_PROVISIONER.on_provision(GROUP_OPTIONS.invalidate)
+METRICS.register('group_options', GROUP_OPTIONS.get_stats)
 LOG.INF(
     'Loaded database tables:\n' +
     ',\n'.join(
@@ -0,0 +1,55 @@
+from abstract.bases.importer import asyncio, concurrent, functools
+from typing import Any, Callable
+
+from abstract.bases.config import CONFIG
+
+ASYNC_CONFIG = CONFIG.get('async_config', {})
+# 阻塞的网络/数据库调用在此线程池中执行, 不占用事件循环
+IO_EXECUTOR = concurrent.futures.ThreadPoolExecutor(ASYNC_CONFIG.get('io_workers', 16), thread_name_prefix='io')
+# 异步模式下同步命令在此线程池中执行
+COMMAND_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    ASYNC_CONFIG.get('command_workers', 32), thread_name_prefix='command'
+)
+
+
+async def run_sync(
+        func: Callable,
+        *args,
+        executor: concurrent.futures.Executor = IO_EXECUTOR,
+        **kwargs
+) -> Any:
+    """
+    在线程池中执行阻塞函数并等待结果
+
+    :param func: 阻塞函数
+    :param executor: 执行用的线程池, 默认为IO_EXECUTOR
+
+    :return: 函数返回值
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+class AsyncAdapter:
+    """
+    将对象的阻塞方法包装为协程方法, 属性访问原样转发
+
+    :param target: 被包装的对象
+    :param executor: 执行阻塞方法的线程池
+    """
+    def __init__(self, target, executor: concurrent.futures.Executor = IO_EXECUTOR):
+        self._target = target
+        self._executor = executor
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await run_sync(attr, *args, executor=self._executor, **kwargs)
+
+        return method
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self._target!r}>'
@@ -2,6 +2,7 @@ from abstract.bases.importer import threading, sys, dispatch, itertools
 from typing import Optional, Any, Callable, Literal, Iterable
 
 from abstract.bases.exceptions import CommandCancel
+from abstract.bases.log import LOG
 
 
 class CustomThread(threading.Thread):
@@ -77,6 +78,90 @@ class CustomThread(threading.Thread):
                     pass
 
 
+class CancellableCall:
+    """
+    在调用run的线程中执行函数, 可由其他线程以与CustomThread相同的方式取消.
+    用于已在线程池中执行的任务, 不再为取消另开线程.
+    """
+    def __init__(self, target: Callable, args: tuple = (), kwargs: Optional[dict] = None):
+        self.status: Literal['IDLE', 'RUNNING', 'COMPLETED', 'CANCELLING', 'CANCELLED', 'ERROR'] = 'IDLE'
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[['CancellableCall'], Any]] = []
+
+    def _trace(self, frame: Any, event: str, arg: Any) -> Optional[Callable]:
+        if self.status == 'CANCELLING':
+            raise CommandCancel('用户取消.')
+        return self._trace
+
+    def is_alive(self) -> bool:
+        return self.status in ('RUNNING', 'CANCELLING')
+
+    def stop(self, timeout: Optional[int | float] = 0) -> bool:
+        """
+        请求取消, 函数在下一次跟踪事件时抛出CommandCancel. 阻塞在网络等调用中时要等调用返回才能取消.
+
+        :param timeout: 等待函数结束的最长时间(秒), None为一直等待
+
+        :return: 是否由本次调用发出了取消请求, 已结束或已在取消中时返回False
+        """
+        with self._lock:
+            requested = self.status == 'RUNNING'
+            if requested:
+                self.status = 'CANCELLING'
+        if threading.current_thread() is not self._thread:
+            self._done.wait(timeout)
+        return requested
+
+    def add_done_callback(self, function: Callable[['CancellableCall'], Any]) -> None:
+        """
+        注册结束时调用的函数, 参数为本对象. 已结束时立即调用
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(function)
+                return
+        function(self)
+
+    def run(self) -> Any:
+        """
+        执行函数并返回其结果, 被取消时抛出CommandCancel
+        """
+        assert self.status == 'IDLE', 'The call has already been run.'
+        self._thread = threading.current_thread()
+        self.status = 'RUNNING'
+        original_trace = sys.gettrace()
+        sys.settrace(self._trace)  # 只对当前线程设置跟踪
+        try:
+            result = self._target(*self._args, **self._kwargs)
+            self._finish('COMPLETED')
+            return result
+        except CommandCancel:
+            self._finish('CANCELLED')
+            raise
+        except Exception:
+            self._finish('ERROR')
+            raise
+        finally:
+            sys.settrace(original_trace)
+            self._done.set()
+            with self._lock:
+                callbacks, self._callbacks = self._callbacks, []
+            for function in callbacks:
+                try:
+                    function(self)
+                except Exception as error:
+                    LOG.WAR(f'Cancellable call callback failed: {error!r}')
+
+    def _finish(self, status: str) -> None:
+        with self._lock:
+            self.status = status
+
+
 class CustomThreadGroup:
     @dispatch
     def __init__(self, threads: Iterable[CustomThread]):
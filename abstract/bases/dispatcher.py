@@ -0,0 +1,145 @@
+from abstract.bases.importer import threading, queue, time, concurrent, heapq, itertools
+from collections import deque
+from typing import Callable, Hashable, Optional
+
+from abstract.bases.config import CONFIG
+from abstract.bases.exceptions import RetryLater
+from abstract.bases.metrics import LatencyStats, METRICS
+
+
+class KeyedDispatcher:
+    """
+    固定大小的线程池, 入队任务总数有上限.
+    同一键的任务按提交顺序依次执行, 不同键的任务由不同线程并行执行.
+    任务抛出RetryLater时留在其键的队首, 延迟到期后由定时线程重新调度, 等待期间不占用工作线程.
+
+    :param name: 线程池名称, 用于线程命名
+    :type name: str
+    :param workers: 工作线程数
+    :type workers: int
+    :param queue_size: 最多排队的任务数, 超出时拒绝提交
+    :type queue_size: int
+    """
+    def __init__(self, name: str, workers: int = 8, queue_size: int = 1024):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.depth = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.retried = 0
+        self.wait_stats = LatencyStats()
+        self.run_stats = LatencyStats()
+        self._lock = threading.Lock()
+        # 键在字典中即表示该键已被调度或正在执行, 值为其尚未执行的任务
+        self._pending: dict[Hashable, deque] = {}
+        self._ready: queue.SimpleQueue[Hashable] = queue.SimpleQueue()
+        # 延迟重试的键, 堆条目为(到期时间, 序号, 键), 定时线程在首次延迟时启动
+        self._delayed: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._timer: Optional[threading.Thread] = None
+        for index in range(workers):
+            threading.Thread(target=self._work, name=f'{name}-{index}', daemon=True).start()
+
+    def submit(self, key: Hashable, func: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        提交任务
+
+        :param key: 顺序键, 相同键的任务串行执行
+        :param func: 任务函数
+
+        :return: 任务完成时完成的 Future
+        :raises queue.Full: 排队任务数已达上限
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self.depth >= self.queue_size:
+                self.rejected += 1
+                raise queue.Full(f'Dispatcher {self.name} is full.')
+            self.depth += 1
+            self.submitted += 1
+            task = (time.perf_counter(), future, func, args, kwargs)
+            if key in self._pending:
+                self._pending[key].append(task)
+            else:
+                self._pending[key] = deque((task, ))
+                self._ready.put(key)
+        return future
+
+    def _work(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                task = self._pending[key].popleft()
+                self.depth -= 1
+            enqueued, future, func, args, kwargs = task
+            start = time.perf_counter()
+            # 重试的任务已处于运行状态, 排队时间只在首次执行时记录
+            if not (retrying := future.running()):
+                self.wait_stats.record(start - enqueued)
+            if retrying or future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except RetryLater as retry:
+                    with self._lock:
+                        self._pending[key].appendleft(task)
+                        self.depth += 1
+                        self.retried += 1
+                    self._delay(key, retry.delay)
+                    continue
+                except BaseException as error:
+                    future.set_exception(error)
+                    self.run_stats.record(time.perf_counter() - start, error=True)
+                else:
+                    future.set_result(result)
+                    self.run_stats.record(time.perf_counter() - start)
+            with self._lock:
+                if self._pending[key]:
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
+
+    def _delay(self, key: Hashable, delay: float):
+        with self._condition:
+            entry = (time.monotonic() + delay, next(self._seq), key)
+            heapq.heappush(self._delayed, entry)
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name=f'{self.name}-timer', daemon=True)
+                self._timer.start()
+            # 新条目排在最前时唤醒定时线程按新的到期时间等待
+            if self._delayed[0] is entry:
+                self._condition.notify()
+
+    def _run_timer(self):
+        with self._condition:
+            while True:
+                if not self._delayed:
+                    self._condition.wait()
+                    continue
+                due, _, key = self._delayed[0]
+                if (wait := due - time.monotonic()) > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._delayed)
+                self._ready.put(key)
+
+    def get_stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'depth': f'{self.depth}/{self.queue_size}',
+            'active_keys': len(self._pending),
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'retried': self.retried,
+            'delayed': len(self._delayed),
+            'wait': self.wait_stats.snapshot(),
+            'run': self.run_stats.snapshot(),
+        }
+
+
+EVENT_DISPATCHER = KeyedDispatcher('event', **CONFIG.get('dispatcher_config', {}))
+METRICS.register('event_dispatcher', EVENT_DISPATCHER.get_stats)
+# 命令与触发器可能等待用户输入, 与事件分开执行, 避免输入事件排在等待它的命令之后
+COMMAND_DISPATCHER = KeyedDispatcher('command', **CONFIG.get('command_dispatcher_config', {}))
+METRICS.register('command_dispatcher', COMMAND_DISPATCHER.get_stats)
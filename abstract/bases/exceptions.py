@@ -66,3 +66,20 @@ class CityNotFound(Exception):
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.city}> at {hex(id(self))}'
+
+
+class RetryLater(Exception):
+    """
+    Raised by a dispatcher task to be run again after a delay, keeping its place in its key's queue.
+    """
+    def __init__(self, delay: float):
+        """
+        :type delay: float
+        """
+        self.delay = delay
+
+    def __str__(self):
+        return f'稍后重试: {self.delay:.3f}s'
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.delay}> at {hex(id(self))}'
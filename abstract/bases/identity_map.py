@@ -0,0 +1,76 @@
+from abstract.bases.importer import threading, time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class IdentityMap:
+    """
+    线程安全的实例缓存, 条目超过存活时间后失效, 超过容量时淘汰最久未使用的条目
+
+    :param name: 缓存名称
+    :type name: str
+    :param ttl: 条目存活时间(秒)
+    :type ttl: float
+    :param max_size: 最多缓存的条目数
+    :type max_size: int
+    """
+    def __init__(self, name: str, ttl: float = 600, max_size: int = 4096):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 值为(过期时间, 实例), 按最近使用顺序排列
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        获取缓存的实例
+
+        :return: 缓存的实例, 不存在或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """
+        缓存实例, 已存在时覆盖
+
+        :return: 缓存的实例
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': f'{len(self._entries)}/{self.max_size}',
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': f'{self.hits / total * 100:.2f}%' if total else '0.00%',
+                'evictions': self.evictions,
+            }
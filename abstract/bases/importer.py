@@ -5,6 +5,7 @@ import traceback
 import functools
 import threading
 import pymysql
+import sqlite3
 from plum import dispatch
 import abc
 import requests
@@ -20,8 +21,10 @@ import filetype
 import numpy
 import psutil
 import itertools
+import heapq
 import operator
 import json
+import re
 import sys
 import inspect
 import git
@@ -45,6 +48,10 @@ import socket
 import platform
 import decimal
 import typing
+import asyncio
+import concurrent.futures
+import contextlib
+import hmac
 LAST_COMMIT = git.Repo(pathlib.Path(__file__).parents[2]).head.commit
 def local_time() -> datetime.datetime:
     return datetime.datetime.now().astimezone()
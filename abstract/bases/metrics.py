@@ -0,0 +1,52 @@
+from abstract.bases.importer import threading
+from typing import Callable
+
+
+class LatencyStats:
+    """
+    线程安全的调用计数与耗时统计
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        """
+        记录一次调用
+
+        :param seconds: 本次调用耗时(秒)
+        :param error: 本次调用是否失败
+        """
+        with self._lock:
+            self.count += 1
+            self.errors += error
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'count': self.count,
+                'errors': self.errors,
+                'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0,
+                'max_ms': round(self.max * 1000, 2),
+            }
+
+
+class MetricsRegistry(dict[str, Callable[[], dict]]):
+    """
+    运行指标注册表, 键为指标组名, 值为返回该组当前指标的函数
+    """
+    def register(self, name: str, provider: Callable[[], dict]) -> Callable[[], dict]:
+        self[name] = provider
+        return provider
+
+    def snapshot(self) -> dict[str, dict]:
+        return {name: provider() for name, provider in self.items()}
+
+
+METRICS = MetricsRegistry()
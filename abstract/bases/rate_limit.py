@@ -0,0 +1,43 @@
+from abstract.bases.importer import threading, time
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶, 令牌以固定速率补充, 最多积累capacity个
+
+    :param rate: 每秒补充的令牌数
+    :type rate: float
+    :param capacity: 令牌上限, 即允许的突发数量
+    :type capacity: float
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """
+        令牌充足时取走一个令牌, 否则不取走也不等待
+
+        :return: 0表示已取走令牌, 否则为距离补充出一个令牌还需的时间(秒)
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        """
+        归还一个取走但未使用的令牌
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
@@ -1,4 +1,6 @@
-from abstract.bases.importer import operator, LAST_COMMIT, psutil, platform, json, pathlib
+from abstract.bases.importer import operator, LAST_COMMIT, psutil, platform, json, pathlib, threading, queue
+from abstract.bases.importer import traceback, asyncio
+from typing import Optional
 from typing import Callable
 
 import abstract
@@ -9,8 +11,11 @@ from abstract.service import Service
 from abstract.session import SESSION_MANAGER, Session
 from abstract.target import User, Group
 from abstract.apis.frame_server import FRAME_SERVER
-from abstract.apis.table import GROUP_OPTION_TABLE
+from abstract.apis.table import GROUP_OPTIONS
+from abstract.bases.aio import run_sync, COMMAND_EXECUTOR
+from abstract.bases.dispatcher import COMMAND_DISPATCHER, EVENT_DISPATCHER, KeyedDispatcher
 from abstract.bases.log import LOG
+from abstract.bases.metrics import METRICS
 from abstract.bases.text2img import text2img
 
 # 加载帮助配置
@@ -36,17 +41,57 @@ class Bot:
             frame_server: abstract.apis.frame_server.FrameServer,
             session_manager: abstract.session.SessionManager,
             command_group: abstract.command.CommandGroup,
+            dispatcher: KeyedDispatcher,
+            command_dispatcher: KeyedDispatcher,
             id: int,
             must_at=True,
-            command_prefixes=('', )
+            command_prefixes=('', ),
+            async_mode=False,
+            friend_sync_interval=600
     ):
         self.frame_server = frame_server
         self.session_manager = session_manager
         self.command_group = command_group.set_prefixes(command_prefixes)
+        self.dispatcher = dispatcher
+        self.command_dispatcher = command_dispatcher
         self.id = id
         self.must_at = must_at
+        self.async_mode = async_mode
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.friend_sync_interval = friend_sync_interval
+        # 好友QQ号集合, 启动时加载, 好友添加时增量更新, 并由friend_list_syncer服务定期全量同步
+        self.friend_ids: set[int] = set()
+        self.friends_loaded = threading.Event()
         self.services: dict[str, Service] = {}
         self.triggers: list[tuple[Callable[[MESSAGE], bool], Callable]] = []
+        # 触发器的原始事件预筛选函数, 有触发器未提供时所有未匹配命令前缀的消息都需完整处理
+        self.trigger_prefilters: list[Callable[[dict], bool]] = []
+        self.all_triggers_prefiltered = True
+        self.filter_lock = threading.Lock()
+        self.messages_received = 0
+        self.messages_dropped = 0
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """
+        设置异步命令与异步模式使用的事件循环
+        """
+        self.loop = loop
+
+    def sync_friends(self):
+        """
+        从框架服务器全量同步好友列表
+        """
+        self.friend_ids = set(map(operator.itemgetter('user_id'), self.frame_server.get_friend_list()))
+        self.friends_loaded.set()
+        LOG.DEB(f'Friend list synced: {len(self.friend_ids)} friends.')
+
+    def is_friend(self, user_id: int) -> bool:
+        """
+        判断用户是否为好友, 好友列表尚未加载时先同步一次
+        """
+        if not self.friends_loaded.is_set():
+            self.sync_friends()
+        return user_id in self.friend_ids
 
     def register_service(self, service_name: str, auto_restart=False):
         """
@@ -66,20 +111,109 @@ class Bot:
 
         return decorator
 
-    def register_trigger(self, condition: Callable[[MESSAGE], bool]):
+    def register_trigger(
+            self,
+            condition: Callable[[MESSAGE], bool],
+            prefilter: Optional[Callable[[dict], bool]] = None
+    ):
         """
         注册条件触发器
         
         :param condition: 条件函数，接收MESSAGE对象，返回bool值
         :type condition: Callable[[MESSAGE], bool]
+        :param prefilter: 预筛选函数，接收原始OneBot事件，返回False时该事件不可能满足condition，
+            用于在构造MESSAGE对象前丢弃无关消息；不提供时所有消息都会被完整解析
+        :type prefilter: Callable[[dict], bool]
         
         :return: 装饰器
         """
         def decorator(func):
             self.triggers.append((condition, func))
+            if prefilter is None:
+                self.all_triggers_prefiltered = False
+            else:
+                self.trigger_prefilters.append(prefilter)
             return func
         return decorator
 
+    @staticmethod
+    def get_raw_text(data: dict) -> str:
+        """
+        获取原始消息事件中第一个文本段的内容, 与message.get_parts_by_type(TextMessage)[0].text一致
+
+        :return: 文本内容, 没有文本段时返回空字符串
+        """
+        for segment in data['message']:
+            if segment['type'] == 'text':
+                return segment['data']['text']
+        return ''
+
+    def is_relevant(self, data: dict) -> bool:
+        """
+        仅根据原始消息事件判断消息是否可能需要处理, 不构造任何对象, 不进行网络与数据库请求.
+        判断顺序与message_handler一致.
+
+        :param data: OneBot消息事件
+        :type data: dict
+
+        :return: 消息是否需要完整处理
+        :rtype: bool
+        """
+        session = self.session_manager.get(data['user_id'])
+        if session and session.getting:
+            return True
+
+        match data['message_type']:
+            case 'group':
+                if self.must_at and not any(
+                        segment['type'] == 'at' and str(segment['data']['qq']) == str(self.id)
+                        for segment in data['message']
+                ):
+                    return False
+            case 'private':
+                # 私聊消息无需命令前缀, 好友的消息都需要处理
+                return self.is_friend(data['user_id'])
+
+        command_name = next(filter(None, self.get_raw_text(data).split(' ')), '')
+        if any(command_name.startswith(prefix) for prefix in self.command_group.command_prefixes):
+            return True
+
+        if not self.all_triggers_prefiltered:
+            return True
+        return any(prefilter(data) for prefilter in self.trigger_prefilters)
+
+    def get_filter_stats(self) -> dict:
+        with self.filter_lock:
+            return {
+                'received': self.messages_received,
+                'dropped': self.messages_dropped,
+                'drop_rate': f'{self.messages_dropped / self.messages_received * 100:.2f}%'
+                if self.messages_received else '0.00%',
+            }
+
+    def dispatch(self, data: dict) -> bool:
+        """
+        将事件交给事件线程池处理, 同一用户的事件按到达顺序处理
+
+        :param data: OneBot事件
+        :type data: dict
+
+        :return: 事件是否被接受, 队列已满时返回False
+        :rtype: bool
+        """
+        try:
+            future = self.dispatcher.submit(data.get('user_id'), self.router, data)
+        except queue.Full:
+            LOG.WAR(f'Event dispatcher is full, event dropped: {data.get("post_type")}')
+            return False
+        future.add_done_callback(self._log_event_error)
+        return True
+
+    @staticmethod
+    def _log_event_error(future):
+        if error := future.exception():
+            LOG.WAR(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+
     def router(self, data: dict):
         LOG.DEB(str(data))
         match data['post_type']:
@@ -91,6 +225,13 @@ class Bot:
                 self.request_handler(data)
 
     def message_handler(self, data: dict):
+        relevant = self.is_relevant(data)
+        with self.filter_lock:
+            self.messages_received += 1
+            self.messages_dropped += not relevant
+        if not relevant:
+            return
+
         message = Message(data)
         LOG.INF(f'{message.sender} said to {message.target}: {message.data["raw_message"]}')
 
@@ -112,15 +253,12 @@ class Bot:
 
         if isinstance(message, GroupMessage):
             if self.must_at and self.id not in map(
-                    operator.attrgetter('target', 'id'),
+                    operator.attrgetter('target_id'),
                     message.get_parts_by_type(AtMessage)
             ):
                 return
         elif isinstance(message, PrivateMessage):
-            if message.sender.id not in map(
-                    operator.itemgetter('user_id'),
-                    self.frame_server.get_friend_list()
-            ):
+            if not self.is_friend(message.sender.id):
                 return
 
         if session.lock.locked():
@@ -130,11 +268,7 @@ class Bot:
         if command is None:
             for condition, func in self.triggers:
                 if condition(message):
-                    try:
-                        func(message, session)
-                    except Exception as e:
-                        LOG.ERR(e)
-                        raise e
+                    self.submit_command(session, func, message, session)
             return
 
         if not command:
@@ -145,35 +279,117 @@ class Bot:
             message.reply_text(f'{command}不是一个可识别的指令, 检查输入.')
             return
 
-        with session:
+        # 会话锁在事件线程中获取, 保证同一会话随后的事件能看到命令正在进行
+        if not session.acquire(blocking=False):
+            session.handle(message, command)
+            return
+        if self.async_mode and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(
+                self.run_command_async(message, session, command, command_name, args),
+                self.loop
+            )
+            return
+        if not self.submit_command(session, self.run_command, message, session, command, command_name, args):
+            session.release()
+
+    def submit_command(self, session: Session, func: Callable, message: MESSAGE, *args) -> bool:
+        """
+        将命令或触发器交给命令线程池, 同一会话的任务按提交顺序执行.
+        线程池已满时回复用户.
+
+        :param func: 任务函数, 参数为message与args
+
+        :return: 任务是否被接受
+        """
+        try:
+            future = self.command_dispatcher.submit(session, func, message, *args)
+        except queue.Full:
+            LOG.WAR(f'Command dispatcher is full, message from {message.sender} dropped.')
+            message.reply_text('机器人正忙, 请稍后再试.')
+            return False
+        future.add_done_callback(self._log_event_error)
+        return True
+
+    def get_command_args(
+            self,
+            message: MESSAGE,
+            session: Session,
+            command: abstract.command.Command,
+            args: list[str]
+    ) -> Optional[list]:
+        """
+        按命令类型整理命令参数, 可能等待用户输入
+
+        :return: message和session之后的命令参数, 匹配失败时回复并返回None
+        """
+        match command.type:
+            case 0:
+                return []
+
+            case 1:
+                return [args]
+
+            case 2:
+                match message.messages:
+                    case [abstract.message.AtMessage(), abstract.message.TextMessage(), *part_args] if self.must_at: ...
+                    case [abstract.message.TextMessage(), *part_args]: ...
+                    case final:
+                        message.reply_text(f'匹配{final}失败, 检查输入.')
+                        return None
+                return [part_args]
+
+            case {'needed_type': needed_type}:
+                return [session.pipe_get_by_type(message, needed_type, command.type.get('needed_num', 1))]
+
+    def run_command(
+            self,
+            message: MESSAGE,
+            session: Session,
+            command: abstract.command.Command,
+            command_name: str,
+            args: list[str]
+    ):
+        """
+        在命令线程池中执行命令, 命令可能等待用户输入, 不能占用事件线程. 结束后释放会话锁.
+        """
+        try:
             LOG.INF(f'{message.sender} used {command_name}')
             session.command = command
 
-            match command.type:
-                case 0:
-                    command(message, session)
-
-                case 1:
-                    command(message, session, args)
+            command_args = self.get_command_args(message, session, command, args)
+            if command_args is not None:
+                command(message, session, *command_args)
+        finally:
+            session.release()
 
-                case 2:
-                    match message.messages:
-                        case [abstract.message.AtMessage(), abstract.message.TextMessage(), *part_args] if self.must_at: ...
-                        case [abstract.message.TextMessage(), *part_args]: ...
-                        case final:
-                            message.reply_text(f'匹配{final}失败, 检查输入.')
-                            return
-                    command(message, session, part_args)
+    async def run_command_async(
+            self,
+            message: MESSAGE,
+            session: Session,
+            command: abstract.command.Command,
+            command_name: str,
+            args: list[str]
+    ):
+        """
+        异步模式下在事件循环中执行命令, 同步命令交给命令线程池. 结束后释放会话锁.
+        """
+        try:
+            LOG.INF(f'{message.sender} used {command_name}')
+            session.command = command
 
-                case {'needed_type': needed_type}:
-                    command(
-                        message, session,
-                        session.pipe_get_by_type(message, needed_type, command.type.get('needed_num', 1))
-                    )
+            command_args = await run_sync(
+                self.get_command_args, message, session, command, args, executor=COMMAND_EXECUTOR
+            )
+            if command_args is not None:
+                await command.call_async(message, session, *command_args)
+        except Exception as error:
+            LOG.WAR(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+        finally:
+            session.release()
 
     def notice_handler(self, data: dict):
         match data['notice_type']:
-            case 'group_recall' if GROUP_OPTION_TABLE.get(f'where id = {data["group_id"]}', attr='recall_catch')[0]:
+            case 'group_recall' if GROUP_OPTIONS.get(data['group_id'], 'recall_catch'):
                 GroupMessage(
                     [
                         AtMessage(data['operator_id']),
@@ -192,6 +408,8 @@ class Bot:
                     ],
                     Group(data['group_id'])
                 ).send()
+            case 'friend_add':
+                self.friend_ids.add(data['user_id'])
             case 'group_increase':
                 GroupMessage(
                     [
@@ -214,6 +432,7 @@ class Bot:
         match data['request_type']:
             case 'friend':
                 self.frame_server.set_friend_add_request(data['flag'], True)
+                self.friend_ids.add(data['user_id'])
                 PrivateMessage('输入 help 查看帮助.', User(data['user_id'])).send()
             case 'group' if data['sub_type'] == 'invite':
                 self.frame_server.set_group_add_request(data['flag'], True)
@@ -221,7 +440,8 @@ class Bot:
 
 
 LOG.INF('Initializing bot...')
-BOT = Bot(FRAME_SERVER, SESSION_MANAGER, COMMAND_GROUP, **CONFIG['bot_config'])
+BOT = Bot(FRAME_SERVER, SESSION_MANAGER, COMMAND_GROUP, EVENT_DISPATCHER, COMMAND_DISPATCHER, **CONFIG['bot_config'])
+METRICS.register('message_filter', BOT.get_filter_stats)
 LOG.INF('Bot initialized successfully.')
 
 
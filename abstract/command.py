@@ -1,9 +1,10 @@
 from typing import Optional
 
-from abstract.bases.importer import Iterable, inspect
+from abstract.bases.importer import Iterable, inspect, asyncio
 
 import abstract
-from abstract.bases.custom_thread import CustomThread
+from abstract.bases.aio import run_sync, COMMAND_EXECUTOR
+from abstract.bases.custom_thread import CancellableCall
 from abstract.bases.exceptions import *
 from abstract.bases.log import LOG
 from abstract.message import MESSAGE_PART
@@ -21,12 +22,12 @@ class Command:
             session: abstract.session.Session = args[list(inspect.signature(func).parameters).index('session')]
             message: abstract.message.MESSAGE = args[list(inspect.signature(func).parameters).index('message')]
 
-            thread = CustomThread(target=func, args=args, kwargs=kwargs)
+            # 命令已在线程池中执行, 直接在当前线程中运行, 取消时由跟踪函数抛出CommandCancel
+            call = CancellableCall(func, args, kwargs)
             session.running_command = self
-            session.running_thread = thread
+            session.running_thread = call
             try:
-                thread.start()
-                thread.get_result()
+                call.run()
             except SendFailure as error:
                 LOG.WAR(error)
                 message.reply_text(error.__str__())
@@ -38,7 +39,33 @@ class Command:
                 LOG.ERR(error)
                 message.reply_text(f'错误: {error}. 哥我错啦——')
                 raise error
-        self.func = decorated
+        async def decorated_async(*args, **kwargs):
+            session: abstract.session.Session = args[list(inspect.signature(func).parameters).index('session')]
+            message: abstract.message.MESSAGE = args[list(inspect.signature(func).parameters).index('message')]
+
+            session.running_command = self
+            session.running_thread = None
+            session.running_task = asyncio.current_task()
+            try:
+                await func(*args, **kwargs)
+            except SendFailure as error:
+                LOG.WAR(error)
+                await message.reply_text_async(error.__str__())
+            except CommandCancel as error:
+                await message.reply_text_async(error.__str__())
+            except asyncio.CancelledError:
+                await message.reply_text_async(CommandCancel('用户取消.').__str__())
+            except AssertionError as error:
+                await message.reply_text_async(f'检查不通过: {error.__str__()}.')
+            except Exception as error:
+                await run_sync(LOG.ERR, error)
+                await message.reply_text_async(f'错误: {error}. 哥我错啦——')
+                raise error
+            finally:
+                session.running_task = None
+
+        self.is_async = inspect.iscoroutinefunction(func)
+        self.func = decorated_async if self.is_async else decorated
         self.command_names = command_names
         self.type = type
         self.info = info
@@ -51,20 +78,101 @@ class Command:
         return False
 
     def __call__(self, *args, **kwargs):
+        if self.is_async:
+            # 在线程中执行异步命令时使用独立的事件循环
+            asyncio.run(self.func(*args, **kwargs))
+            return
         self.func(*args, **kwargs)
 
+    async def call_async(self, *args, **kwargs):
+        """
+        在事件循环中执行命令, 同步命令交给命令线程池执行
+        """
+        if self.is_async:
+            await self.func(*args, **kwargs)
+            return
+        await run_sync(self.func, *args, executor=COMMAND_EXECUTOR, **kwargs)
+
 
 class CommandGroup(set):
     command_prefixes = ()
+    # 命令名到命令的索引与命令前缀字典树, 在命令或前缀变化时失效, 下次匹配时重建
+    _aliases: Optional[dict[str, Command]] = None
+    _prefix_trie: Optional[dict] = None
 
     def set_prefixes(self, prefixes: tuple[str]):
         self.command_prefixes = prefixes
+        self._prefix_trie = None
         return self
 
     def add(self, command: Command):
         if not isinstance(command, Command):
             raise TypeError('CommandGroup only supports adding Command')
         super().add(command)
+        self._aliases = None
+
+    def remove(self, command: Command):
+        super().remove(command)
+        self._aliases = None
+
+    def discard(self, command: Command):
+        super().discard(command)
+        self._aliases = None
+
+    def pop(self) -> Command:
+        command = super().pop()
+        self._aliases = None
+        return command
+
+    def clear(self):
+        super().clear()
+        self._aliases = None
+
+    def get_aliases(self) -> dict[str, Command]:
+        """
+        获取命令名到命令的索引, 不存在时重建
+        """
+        if (aliases := self._aliases) is None:
+            aliases = {}
+            for command in self:
+                for command_name in command.command_names:
+                    if command_name in aliases:
+                        LOG.WAR(f'Command name {command_name} is registered by more than one command.')
+                        continue
+                    aliases[command_name] = command
+            self._aliases = aliases
+        return aliases
+
+    def get_prefix_trie(self) -> dict:
+        """
+        获取命令前缀字典树, 不存在时重建. 节点为字典, 键None对应以该节点结尾的前缀在command_prefixes中的序号
+        """
+        if (trie := self._prefix_trie) is None:
+            trie = {}
+            for index, command_prefix in enumerate(self.command_prefixes):
+                node = trie
+                for letter in command_prefix:
+                    node = node.setdefault(letter, {})
+                node.setdefault(None, index)
+            self._prefix_trie = trie
+        return trie
+
+    def match_prefix(self, command_name: str) -> Optional[str]:
+        """
+        匹配命令前缀, 多个前缀匹配时取command_prefixes中靠前的
+
+        :return: 匹配到的前缀, 无匹配时返回None
+        """
+        node = self.get_prefix_trie()
+        matched = node.get(None)
+        for letter in command_name:
+            if (node := node.get(letter)) is None:
+                break
+            if None in node and (matched is None or node[None] < matched):
+                matched = node[None]
+        if matched is None:
+            return None
+        return self.command_prefixes[matched]
 
     def match(self: set[Command], command_name, need_prefix=True) -> Optional[Command | str]:
         """
@@ -76,18 +184,12 @@ class CommandGroup(set):
         :return: 匹配到的Command对象，或匹配失败时返回处理后的命令名字符串，
                 当need_prefix为True且无匹配前缀时返回None
         """
-        for command_prefix in self.command_prefixes:
-            if command_name.startswith(command_prefix):
-                command_name = command_name.removeprefix(command_prefix)
-                break
-        else:
-            if need_prefix:
-                return None
-
-        for command in self:
-            if command.match(command_name):
-                return command
-        return command_name
+        if (command_prefix := self.match_prefix(command_name)) is not None:
+            command_name = command_name.removeprefix(command_prefix)
+        elif need_prefix:
+            return None
+
+        return self.get_aliases().get(command_name, command_name)
 
     def register_command(self, command_name: str | Iterable, type: int | dict[str, MESSAGE_PART | int] = 0, info=''):
         """
@@ -1,4 +1,4 @@
-from abstract.bases.importer import abc, itertools, threading
+from abstract.bases.importer import abc, itertools
 from typing import Optional, Literal
 
 from abstract.bases.exceptions import CommandCancel
@@ -115,8 +115,9 @@ class BaseGame(abc.ABC):
             session.pipe_put(message_got)
             return
 
+        # 游戏结束后收到的消息重新交给事件线程池, 与其他事件一样按用户排序并计入队列上限
         from abstract.bot import BOT
-        threading.Thread(target=BOT.router, args=(message_got.data,), daemon=True).start()
+        BOT.dispatch(message_got.data)
 
     def start(self, message: GroupMessage):
         self.status = 'RUNNING'
@@ -0,0 +1,134 @@
+from abstract.bases.importer import datetime, io, matplotlib, threading, typing
+from collections import deque
+
+from abstract.apis.table import STOCK_TABLE, TRADES_TABLE
+from abstract.bases.config import CONFIG
+from abstract.bases.metrics import METRICS
+
+
+class Bar(typing.NamedTuple):
+    start: datetime.datetime
+    open: int
+    high: int
+    low: int
+    close: int
+    volume: int
+
+
+class MarketData:
+    """
+    股市行情的内存聚合: 最新成交价与最近的K线(开高低收与成交量).
+    启动时从trades表加载, 之后在每笔成交提交后增量更新.
+
+    :param interval: 每根K线的时长(秒), 从当地零点起对齐, 应能整除一天
+    :type interval: int
+    :param max_bars: 保留的K线数
+    :type max_bars: int
+    """
+    def __init__(self, interval: int = 3600, max_bars: int = 48):
+        self.interval = interval
+        self.bars: deque[Bar] = deque(maxlen=max_bars)
+        self.last_price: typing.Optional[int] = None
+        self.recorded = 0
+        self.rendered = 0
+        # (最后一根已结束K线的开始时间, 图片)
+        self.chart: typing.Optional[tuple[datetime.datetime, bytes]] = None
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    def get_bar_start(self, time: datetime.datetime) -> datetime.datetime:
+        midnight = time.replace(hour=0, minute=0, second=0, microsecond=0)
+        seconds = (time - midnight).total_seconds()
+        return midnight + datetime.timedelta(seconds=seconds - seconds % self.interval)
+
+    def load(self) -> 'MarketData':
+        since = self.get_bar_start(datetime.datetime.now()) - datetime.timedelta(
+            seconds=self.interval * (self.bars.maxlen - 1)
+        )
+        rows = TRADES_TABLE.select('price', 'num', 'time').where('time >= %s', since).order_by('id').all()
+        with self._lock:
+            self.bars.clear()
+            self.chart = None
+        for row in rows:
+            self.record(*row)
+        if self.last_price is None:
+            self.last_price = TRADES_TABLE.select('price').order_by('id desc').limit(1).scalar()
+        if self.last_price is None:
+            # trades表建立之前的成交只记录在各用户的最后一次交易中
+            self.last_price = STOCK_TABLE.select('trade_price').order_by('trade_time desc').limit(1).scalar()
+        return self
+
+    def record(self, price, num, time: datetime.datetime):
+        """
+        记录一笔成交
+        """
+        price, num = int(price), int(num)
+        start = self.get_bar_start(time)
+        with self._lock:
+            self.last_price = price
+            self.recorded += 1
+            if self.bars and self.bars[-1].start == start:
+                bar = self.bars[-1]
+                self.bars[-1] = bar._replace(
+                    high=max(bar.high, price), low=min(bar.low, price), close=price, volume=bar.volume + num
+                )
+            elif not self.bars or start > self.bars[-1].start:
+                self.bars.append(Bar(start, price, price, price, price, num))
+
+    def get_closed_bars(self) -> list[Bar]:
+        current = self.get_bar_start(datetime.datetime.now())
+        with self._lock:
+            return [bar for bar in self.bars if bar.start < current]
+
+    def get_chart(self) -> typing.Optional[bytes]:
+        """
+        已结束K线的K线图, 有新的K线结束时才重新绘制
+
+        :return: PNG图片, 没有已结束的K线时返回None
+        """
+        bars = self.get_closed_bars()
+        if not bars:
+            return None
+        with self._render_lock:
+            if self.chart is None or self.chart[0] != bars[-1].start:
+                self.chart = (bars[-1].start, self.render(bars))
+                self.rendered += 1
+            return self.chart[1]
+
+    def render(self, bars: list[Bar]) -> bytes:
+        # 不使用pyplot的全局状态, 可在多个线程中绘制
+        figure = matplotlib.figure.Figure(figsize=(10, 6))
+        price_ax, volume_ax = figure.subplots(
+            2, 1, sharex=True, gridspec_kw={'height_ratios': (3, 1)}
+        )
+        width = self.interval / 86400 * 0.6
+        for bar in bars:
+            x = matplotlib.dates.date2num(bar.start + datetime.timedelta(seconds=self.interval / 2))
+            color = 'tab:red' if bar.close >= bar.open else 'tab:green'
+            price_ax.vlines(x, bar.low, bar.high, color=color, linewidth=1)
+            price_ax.bar(
+                x, max(abs(bar.close - bar.open), 0.1), width, bottom=min(bar.open, bar.close), color=color
+            )
+            volume_ax.bar(x, bar.volume, width, color=color)
+        price_ax.set_title('股市K线')
+        price_ax.set_ylabel('价格')
+        price_ax.grid(alpha=0.3)
+        volume_ax.set_ylabel('成交量')
+        volume_ax.grid(alpha=0.3)
+        volume_ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%m-%d %H:%M'))
+        figure.autofmt_xdate()
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        return buffer.getvalue()
+
+    def get_stats(self) -> dict:
+        return {
+            'bars': len(self.bars),
+            'last_price': self.last_price,
+            'recorded': self.recorded,
+            'charts_rendered': self.rendered,
+        }
+
+
+MARKET = MarketData(**CONFIG.get('market_config', {})).load()
+METRICS.register('market', MARKET.get_stats)
@@ -1,9 +1,12 @@
-from abstract.bases.importer import abc, base64, pathlib, requests, dispatch, Iterable, typing
+from abstract.bases.importer import abc, base64, pathlib, requests, dispatch, Iterable, typing, concurrent
 
+from abstract.bases.aio import run_sync
 from abstract.bases.config import CONFIG
 from abstract.target import User, Group
 from abstract.apis.frame_server import FRAME_SERVER
+from abstract.outbox import OUTBOX
 from abstract.bases.log import LOG
+from abstract.bases.exceptions import SendFailure
 
 
 class BaseMessagePart(abc.ABC):
@@ -16,11 +19,29 @@ class RecordMessage(BaseMessagePart):
     NAME = '语音消息'
     @dispatch
     def __init__(self, file: pathlib.Path):
-        self.record = file.read_bytes()
+        self.data = file.read_bytes()
+        self.file_id = None
 
     @dispatch
     def __init__(self, record: bytes):
-        self.record = record
+        self.data = record
+        self.file_id = None
+
+    @classmethod
+    def from_file_id(cls, file_id: str) -> 'RecordMessage':
+        """
+        由收到的语音文件ID构造, 语音内容在首次访问record时才获取
+        """
+        record_message = cls.__new__(cls)
+        record_message.data = None
+        record_message.file_id = file_id
+        return record_message
+
+    @property
+    def record(self) -> bytes:
+        if self.data is None:
+            self.data = FRAME_SERVER.get_record(self.file_id)
+        return self.data
 
     def get_json(self):
         return {
@@ -54,20 +75,33 @@ class ReplyMessage(BaseMessagePart):
 
 class AtMessage(BaseMessagePart):
     NAME = '@消息'
-    def __init__(self, target: User):
-        assert type(target) is User
-        self.target = target
+    def __init__(self, target: User | int):
+        """
+        :param target: 被@的用户或其QQ号, 传入QQ号时用户在首次访问target时才构造
+        """
+        if isinstance(target, User):
+            self.target_id = target.id
+            self._target = target
+        else:
+            self.target_id = int(target)
+            self._target = None
+
+    @property
+    def target(self) -> User:
+        if self._target is None:
+            self._target = User(self.target_id)
+        return self._target
 
     def get_json(self):
         return {
             'type': 'at',
             'data': {
-                'qq': str(self.target.id)
+                'qq': str(self.target_id)
             }
         }
 
     def __repr__(self):
-        return f'<{self.__class__.__name__} @{self.target}>'
+        return f'<{self.__class__.__name__} @{self._target or self.target_id}>'
 
 
 class TextMessage(BaseMessagePart):
@@ -142,6 +176,41 @@ class FaceMessage(BaseMessagePart):
         }
 
 
+class ForwardMessage(BaseMessagePart):
+    NAME = '合并转发消息'
+    def __init__(self, id: str):
+        """
+        :param id: 合并转发ID, 转发内容在首次访问nodes时才获取
+        """
+        self.id = id
+        self._nodes: list[NodeMessage] | None = None
+
+    @property
+    def nodes(self) -> list['NodeMessage']:
+        if self._nodes is None:
+            self._nodes = list(
+                map(
+                    lambda a: Message(a).get_node(),
+                    FRAME_SERVER.get_forward_msg(self.id)
+                )
+            )
+        return self._nodes
+
+    def get_json(self) -> list[dict]:
+        """
+        :return: 展开后各节点的消息段, 由parts_to_json展开到所在的消息中
+        """
+        return list(
+            map(
+                lambda a: a.get_json(),
+                self.nodes
+            )
+        )
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.id}>'
+
+
 class NodeMessage(BaseMessagePart):
     NAME = '节点消息'
     def __init__(self, sender: User, content: list['MESSAGE_PART']):
@@ -154,17 +223,25 @@ class NodeMessage(BaseMessagePart):
             'data': {
                 'user_id': self.sender.id,
                 'nickname': self.sender.name,
-                'content': list(
-                    map(
-                        lambda a: a.get_json(),
-                        self.content
-                    )
-                )
+                'content': parts_to_json(self.content)
             }
         }
 
 
-MESSAGE_PART = RecordMessage | ReplyMessage | AtMessage | TextMessage | ImageMessage | NodeMessage
+MESSAGE_PART = RecordMessage | ReplyMessage | AtMessage | TextMessage | ImageMessage | NodeMessage | ForwardMessage
+
+
+def parts_to_json(parts: Iterable[BaseMessagePart]) -> list[dict]:
+    """
+    将消息段转为OneBot格式, 合并转发展开为其节点
+    """
+    output = []
+    for part in parts:
+        if isinstance(part, ForwardMessage):
+            output.extend(part.get_json())
+        else:
+            output.append(part.get_json())
+    return output
 
 
 class BaseMessage(abc.ABC):
@@ -184,7 +261,7 @@ class BaseMessage(abc.ABC):
                     message_part = [ReplyMessage(message_part['data']['id'])]
                 case 'at':
                     message_part = [AtMessage(
-                        target=User(int(message_part['data']['qq']))
+                        target=int(message_part['data']['qq'])
                     )]
                 case 'text':
                     message_part = [TextMessage(message_part['data']['text'])]
@@ -193,18 +270,11 @@ class BaseMessage(abc.ABC):
 
                     message_part = [ImageMessage(url=url)]
                 case 'record':
-                    message_part = [RecordMessage(
-                        FRAME_SERVER.get_record(message_part['data']['file'])
-                    )]
+                    message_part = [RecordMessage.from_file_id(message_part['data']['file'])]
                 case 'face':
                     message_part = [FaceMessage(message_part['data']['id'])]
                 case 'forward':
-                    message_part = map(
-                        lambda a: Message(a).get_node(),
-                        FRAME_SERVER.get_forward_msg(
-                            message_part['data']['id']
-                        )
-                    )
+                    message_part = [ForwardMessage(message_part['data']['id'])]
                 case 'json':
                     ...
                 case final:
@@ -215,18 +285,32 @@ class BaseMessage(abc.ABC):
         return f'<{self.__class__.__name__} {self.sender} -> {self.target}: {self.get_json()}> at {hex(id(self))}'
 
     def get_json(self):
-        return list(
-            map(
-                lambda a: a.get_json(),
-                self.messages
-            )
-        )
+        return parts_to_json(self.messages)
 
     def get_node(self):
         return NodeMessage(self.sender, self.messages)
 
+    def submit(self) -> concurrent.futures.Future:
+        """
+        提交到发送队列, 不等待发送完成
+
+        :return: 发送完成时得到消息ID的 Future
+        """
+        return OUTBOX.submit(self)
+
     def send(self):
-        message = get_message(self.send_api(message=self))
+        """
+        提交到发送队列并等待发送完成, 最多等待OUTBOX.send_timeout秒
+
+        :raises SendFailure: 发送队列已满或等待超时, 超时时仍在排队的消息不再发送, 已因限速延迟的消息仍会发送
+        """
+        future = self.submit()
+        try:
+            message_id = future.result(OUTBOX.send_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise SendFailure('发送超时', self)
+        message = get_message(message_id)
         LOG.INF(f'Sent to {message.target}:  {message.data["raw_message"]}')
         return message
 
@@ -240,6 +324,15 @@ class BaseMessage(abc.ABC):
             )
         )
 
+    async def send_async(self) -> MESSAGE:
+        return await run_sync(self.send)
+
+    async def reply_async(self, *args) -> MESSAGE | None:
+        return await run_sync(self.reply, *args)
+
+    async def reply_text_async(self, text: str) -> MESSAGE:
+        return await run_sync(self.reply_text, text)
+
     def get_parts_by_type(self, part_type: type[MESSAGE_PART]) -> list[MESSAGE_PART]:
         return list(
             filter(
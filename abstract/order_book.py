@@ -0,0 +1,153 @@
+from abstract.bases.importer import datetime, heapq, threading, typing
+
+from abstract.apis.table import STOCK_TABLE
+from abstract.bases.metrics import METRICS
+
+
+class Order(typing.NamedTuple):
+    user_id: int
+    type: str
+    price: int
+    num: int
+    time: datetime.datetime
+    # 订单簿内的序号, 同一用户的委托变化后序号改变, 堆中序号不一致的条目即已失效
+    seq: int
+
+
+def crosses(type: str, price, resting_price) -> bool:
+    """
+    新委托能否与价格为resting_price的反向委托成交
+
+    :param type: 新委托的类型, 'buy' | 'sell'
+    """
+    return resting_price <= price if type == 'buy' else resting_price > price
+
+
+class OrderBook:
+    """
+    内存中的交易委托簿, 买卖双方各一个按价格优先, 时间优先排列的堆.
+    启动时从stocks表加载, 之后由StockSnapshot在事务提交后同步, 数据库中的委托始终为准.
+
+    撮合时持有lock, 同一时刻只有一笔新委托在撮合. 成交记录在trades表中.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.orders: dict[int, Order] = {}
+        # 堆条目为(价格优先键, 委托时间, 序号, 用户id), 失效条目在弹出或重建时清除
+        self.heaps: dict[str, list[tuple]] = {'buy': [], 'sell': []}
+        self.seq = 0
+        self.matched = 0
+
+    def load(self) -> 'OrderBook':
+        rows = STOCK_TABLE.select(
+            'id', 'commission_type', 'commission_price', 'commission_num', 'commission_time'
+        ).where("commission_type in ('buy', 'sell')").all()
+        with self.lock:
+            self.orders.clear()
+            self.heaps = {'buy': [], 'sell': []}
+            for row in rows:
+                self.update(*row)
+        return self
+
+    def refresh(self, user_id: int):
+        """
+        从数据库重新加载一个用户的委托
+        """
+        row = STOCK_TABLE.select(
+            'commission_type', 'commission_price', 'commission_num', 'commission_time'
+        ).where(id=user_id).first()
+        if row is not None:
+            self.update(user_id, *row)
+
+    def update(self, user_id: int, type: str, price, num, time: datetime.datetime):
+        """
+        设置一个用户当前的委托, type为'none'或数量为0时移除
+        """
+        user_id = int(user_id)
+        with self.lock:
+            self.orders.pop(user_id, None)
+            if type in self.heaps and num > 0:
+                self.seq += 1
+                order = self.orders[user_id] = Order(user_id, type, int(price), int(num), time, self.seq)
+                heapq.heappush(self.heaps[type], (self._priority(order), order.time, order.seq, user_id))
+            # 部分成交的委托也会留下失效条目, 每次变化后都检查是否需要重建
+            self._compact()
+
+    def _is_valid(self, entry: tuple) -> bool:
+        order = self.orders.get(entry[3])
+        return order is not None and order.seq == entry[2]
+
+    @staticmethod
+    def _priority(order: Order) -> int:
+        # 买方价高者优先, 卖方价低者优先
+        return -order.price if order.type == 'buy' else order.price
+
+    def _compact(self):
+        # 失效条目超过有效条目时重建堆
+        if sum(map(len, self.heaps.values())) <= 2 * len(self.orders) + 64:
+            return
+        self.heaps = {'buy': [], 'sell': []}
+        for order in self.orders.values():
+            self.heaps[order.type].append((self._priority(order), order.time, order.seq, order.user_id))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def match(self, type: str, price, num) -> list[Order]:
+        """
+        按价格优先, 时间优先找出可与新委托成交的当日反向委托, 只清除失效条目, 不修改委托.
+        需在持有lock时调用, 并在成交写入数据库后由StockSnapshot同步.
+
+        :param type: 新委托的类型, 'buy' | 'sell'
+        :param price: 新委托的价格
+        :param num: 新委托的数量
+
+        :return: 依次成交的委托, 数量合计不少于num或已无可成交的委托
+        """
+        heap = self.heaps['sell' if type == 'buy' else 'buy']
+        # 堆顶的失效条目每次撮合都会被遍历, 先将其弹出
+        while heap and not self._is_valid(heap[0]):
+            heapq.heappop(heap)
+        today = datetime.date.today()
+        result = []
+        # 以辅助堆按顺序遍历堆中的条目, 不弹出原堆
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and num > 0:
+            (priority, time, seq, user_id), index = heapq.heappop(frontier)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+            order = self.orders.get(user_id)
+            if order is None or order.seq != seq or order.time.date() < today:
+                continue
+            if not crosses(type, price, order.price):
+                break
+            result.append(order)
+            num -= order.num
+        self.matched += len(result)
+        return result
+
+    def get_best(self, type: str) -> typing.Optional[Order]:
+        """
+        :return: 某一方当前最优先的委托
+        """
+        with self.lock:
+            heap = self.heaps[type]
+            while heap:
+                if self._is_valid(heap[0]):
+                    return self.orders[heap[0][3]]
+                heapq.heappop(heap)
+            return None
+
+    def get_stats(self) -> dict:
+        best_buy, best_sell = self.get_best('buy'), self.get_best('sell')
+        return {
+            'orders': len(self.orders),
+            'heap_entries': sum(map(len, self.heaps.values())),
+            'best_buy': best_buy.price if best_buy else None,
+            'best_sell': best_sell.price if best_sell else None,
+            'matched': self.matched,
+        }
+
+
+ORDER_BOOK = OrderBook().load()
+METRICS.register('order_book', ORDER_BOOK.get_stats)
@@ -0,0 +1,93 @@
+from abstract.bases.importer import threading, queue, concurrent
+
+from abstract.bases.config import CONFIG
+from abstract.bases.dispatcher import KeyedDispatcher
+from abstract.bases.exceptions import SendFailure, RetryLater
+from abstract.bases.metrics import LatencyStats, METRICS
+from abstract.bases.rate_limit import TokenBucket
+from abstract.target import Group
+
+
+class Outbox:
+    """
+    发送队列, 同一目标的消息按提交顺序发送, 发送速率受全局与每群令牌桶限制.
+    令牌不足的目标延迟到令牌补充后重新调度, 发送线程不等待令牌, 其他目标的消息照常发送.
+
+    :param workers: 发送线程数
+    :type workers: int
+    :param queue_size: 最多排队的消息数, 超出时拒绝发送
+    :type queue_size: int
+    :param global_rate: 全局每秒发送的消息数
+    :type global_rate: float
+    :param global_burst: 全局允许突发发送的消息数
+    :type global_burst: int
+    :param group_rate: 每个群每秒发送的消息数
+    :type group_rate: float
+    :param group_burst: 每个群允许突发发送的消息数
+    :type group_burst: int
+    :param send_timeout: 同步发送时等待发送完成的最长时间(秒)
+    :type send_timeout: float
+    """
+    def __init__(
+            self,
+            workers: int = 4,
+            queue_size: int = 1024,
+            global_rate: float = 5,
+            global_burst: int = 10,
+            group_rate: float = 1,
+            group_burst: int = 3,
+            send_timeout: float = 60
+    ):
+        self.dispatcher = KeyedDispatcher('send', workers, queue_size)
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.group_buckets: dict[int, TokenBucket] = {}
+        self.send_timeout = send_timeout
+        self.throttle_stats = LatencyStats()
+        self._lock = threading.Lock()
+
+    def get_group_bucket(self, group_id: int) -> TokenBucket:
+        with self._lock:
+            if (bucket := self.group_buckets.get(group_id)) is None:
+                bucket = self.group_buckets[group_id] = TokenBucket(self.group_rate, self.group_burst)
+            return bucket
+
+    def submit(self, message) -> concurrent.futures.Future:
+        """
+        提交待发送的消息
+
+        :param message: 待发送的消息
+        :type message: MESSAGE
+
+        :return: 发送完成时得到消息ID的 Future
+        :raises SendFailure: 发送队列已满
+        """
+        try:
+            return self.dispatcher.submit(
+                (type(message.target).__name__, message.target.id), self._send, message
+            )
+        except queue.Full:
+            raise SendFailure('发送队列已满', message)
+
+    def _send(self, message) -> int:
+        # 先取群令牌, 全局令牌不足时归还, 避免单个群占用全局令牌
+        group_bucket = self.get_group_bucket(message.target.id) if isinstance(message.target, Group) else None
+        if group_bucket and (wait := group_bucket.try_acquire()):
+            self.throttle_stats.record(wait)
+            raise RetryLater(wait)
+        if wait := self.global_bucket.try_acquire():
+            if group_bucket:
+                group_bucket.refund()
+            self.throttle_stats.record(wait)
+            raise RetryLater(wait)
+        return message.send_api(message=message)
+
+    def get_stats(self) -> dict:
+        return self.dispatcher.get_stats() | {
+            'throttle': self.throttle_stats.snapshot(),
+        }
+
+
+OUTBOX = Outbox(**CONFIG.get('outbox_config', {}))
+METRICS.register('outbox', OUTBOX.get_stats)
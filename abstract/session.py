@@ -1,14 +1,47 @@
 import abstract
-from abstract.bases.importer import queue, threading, time, inspect, local_time, datetime
-from typing import Optional
-from types import FrameType
+from abstract.bases.importer import queue, threading, time, asyncio, heapq, itertools
+from typing import Hashable, Optional
 
+from abstract.bases.aio import run_sync
+from abstract.bases.config import CONFIG
 from abstract.bases.exceptions import *
 from abstract.bases.log import LOG
+from abstract.bases.metrics import METRICS
 from abstract.target import User
 from abstract.message import MESSAGE, TextMessage, MESSAGE_PART, ReplyMessage
 
 
+class Deadline:
+    """
+    等待输入的期限. 同一个Deadline可在多次等待, 重试与嵌套调用之间传递, 共享同一段等待时间
+
+    :param timeout: 等待时间(秒), None为不限时
+    :type timeout: int | float | None
+    """
+    def __init__(self, timeout: Optional[int | float] = 30):
+        self.timeout = timeout
+        self.expires = None if timeout is None else time.monotonic() + timeout
+
+    @classmethod
+    def of(cls, timeout: 'Optional[int | float | Deadline]') -> 'Deadline':
+        """
+        :return: timeout本身为Deadline时原样返回, 否则以其为等待时间新建
+        """
+        return timeout if isinstance(timeout, Deadline) else cls(timeout)
+
+    def remaining(self) -> Optional[float]:
+        """
+        :return: 剩余的等待时间(秒), 不限时返回None
+        """
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0)
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+
 class Session:
     def __init__(self, manager):
         """
@@ -21,55 +54,154 @@ class Session:
         self.lock = threading.Lock()
         self.is_locked = False  # 添加这个属性来跟踪锁的状态
         self.pipe = queue.Queue()
+        # 协程等待输入时的(事件循环, Future), 此时pipe_put直接交给该Future
+        self._waiter: Optional[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = None
+        self._pipe_lock = threading.Lock()
         self.getting = False
         self.running_command: Optional[abstract.command.Command] = None
-        self.running_thread: Optional[abstract.bases.custom_thread.CustomThread] = None
-        threading.Thread(target=self.auto_free, daemon=True).start()
+        self.running_thread: Optional[abstract.bases.custom_thread.CancellableCall] = None
+        self.running_task: Optional[asyncio.Task] = None
+        self.last_active = time.monotonic()
 
-    def __enter__(self):
-        self.lock.acquire()
+    def touch(self):
+        """
+        记录会话活动, 推迟其被回收的时间
+        """
+        self.last_active = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        return self.is_locked or self.getting
+
+    def acquire(self, blocking=True) -> bool:
+        if not self.lock.acquire(blocking):
+            return False
         self.is_locked = True  # 锁被获取时设置为 True
+        self.touch()
+        return True
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def release(self):
+        self.touch()
         self.is_locked = False  # 锁被释放时设置为 False
         self.lock.release()
 
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
     def pipe_put(self, message: MESSAGE):
-        self.pipe.put(message)
+        with self._pipe_lock:
+            if (waiter := self._waiter) is None:
+                self.pipe.put(message)
+                return
+            self._waiter = None
+        loop, future = waiter
+        loop.call_soon_threadsafe(self._resolve, future, message)
 
-    def pipe_get(self, message: MESSAGE, inform=True, timeout: Optional[int | float] = 30):
-        stacks = inspect.stack()
-        top_pipe_get_frame: FrameType = next(filter(lambda a: a.function == self.pipe_get.__name__, stacks[::-1])).frame
+    def _resolve(self, future: asyncio.Future, message: MESSAGE):
+        if future.done():
+            # 等待已超时或被取消, 留给下一次等待
+            self.pipe.put(message)
+            return
+        future.set_result(message)
+
+    @staticmethod
+    def _check_cancel(result: MESSAGE):
         try:
-            get_time = top_pipe_get_frame.f_locals['get_time']
-        except KeyError:
-            get_time = local_time()
-        if get_time + datetime.timedelta(seconds=timeout) < local_time():
+            args = result.get_parts_by_type(TextMessage)
+            if args and args[0].to_args()[0] == 'cancel':
+                raise CommandCancel('用户取消输入.')
+        except IndexError:
+            ...
+
+    def pipe_get(self, message: MESSAGE, inform=True, timeout: Optional[int | float | Deadline] = 30):
+        """
+        等待用户在同一会话中的下一条消息
+
+        :param message: 发起等待的消息
+        :param inform: 是否提示正在等待输入
+        :param timeout: 等待时间(秒)或Deadline, 传入同一个Deadline的多次等待共享其剩余时间, None为不限时
+
+        :return: 用户输入的消息
+        """
+        deadline = Deadline.of(timeout)
+        if deadline.expired:
             raise CommandCancel('未继续输入.')
-        timeout = (local_time() + datetime.timedelta(seconds=timeout) - get_time).total_seconds()
         if inform:
-            notice_message = message.reply_text(f'正在等待输入{timeout}秒...发送"cancel"以取消.')
+            remaining = deadline.remaining()
+            notice_message = message.reply_text(
+                f'正在等待输入{"" if remaining is None else f"{remaining:.0f}秒"}...发送"cancel"以取消.'
+            )
         try:
             self.getting = True
-            result: MESSAGE = self.pipe.get(timeout=timeout)
-            if result.target != message.target:
+            while (result := self.pipe.get(timeout=deadline.remaining())).target != message.target:
                 result.reply_text(f'你现在有进行中的输入请求, 请在对应会话中处理: {message.target}')
-                result = self.pipe_get(message, inform=False, timeout=timeout)
         except queue.Empty:
             raise CommandCancel('未继续输入.')
         finally:
             self.getting = False
             if inform:
                 notice_message.delete()
+        self._check_cancel(result)
+        return result
+
+    async def pipe_get_async(self, message: MESSAGE, inform=True, timeout: Optional[int | float | Deadline] = 30):
+        """
+        pipe_get的协程版本, 参数与返回值相同. 等待期间不占用线程, 可在事件循环中直接调用
+        """
+        deadline = Deadline.of(timeout)
+        if deadline.expired:
+            raise CommandCancel('未继续输入.')
+        if inform:
+            remaining = deadline.remaining()
+            notice_message = await message.reply_text_async(
+                f'正在等待输入{"" if remaining is None else f"{remaining:.0f}秒"}...发送"cancel"以取消.'
+            )
+        loop = asyncio.get_running_loop()
         try:
-            args = result.get_parts_by_type(TextMessage)
-            if args and args[0].to_args()[0] == 'cancel':
-                raise CommandCancel('用户取消输入.')
-        except IndexError:
-            ...
+            self.getting = True
+            while True:
+                with self._pipe_lock:
+                    try:
+                        result = self.pipe.get_nowait()
+                    except queue.Empty:
+                        result = None
+                        future = loop.create_future()
+                        self._waiter = (loop, future)
+                if result is None:
+                    try:
+                        result = await asyncio.wait_for(future, deadline.remaining())
+                    except asyncio.TimeoutError:
+                        raise CommandCancel('未继续输入.')
+                    finally:
+                        with self._pipe_lock:
+                            if self._waiter is not None and self._waiter[1] is future:
+                                self._waiter = None
+                if result.target == message.target:
+                    break
+                await result.reply_text_async(f'你现在有进行中的输入请求, 请在对应会话中处理: {message.target}')
+        finally:
+            self.getting = False
+            if inform:
+                await run_sync(notice_message.delete)
+        self._check_cancel(result)
         return result
 
-    def pipe_get_by_type(self, message: MESSAGE, needed_type: type[MESSAGE_PART], num: int = 1) -> list[MESSAGE_PART]:
+    def pipe_get_by_type(
+            self,
+            message: MESSAGE,
+            needed_type: type[MESSAGE_PART],
+            num: int = 1,
+            timeout: Optional[int | float | Deadline] = 30
+    ) -> list[MESSAGE_PART]:
+        """
+        收集num个指定类型的消息段, 不足时继续等待输入, 所有等待共享同一个期限
+
+        :param timeout: 等待时间(秒)或Deadline, None为不限时
+        """
+        deadline = Deadline.of(timeout)
         output = message.get_parts_by_type(needed_type)
         if isinstance(message.messages[0], ReplyMessage):
             output.extend(message.messages[0].get_reply_message().get_parts_by_type(needed_type))
@@ -83,7 +215,7 @@ class Session:
                     )
                 )
 
-                message_got = self.pipe_get(message)
+                message_got = self.pipe_get(message, timeout=deadline)
                 if message_got and isinstance(message_got.messages[0], ReplyMessage):
                     output.extend(message_got.messages[0].get_reply_message().get_parts_by_type(needed_type))
 
@@ -103,35 +235,99 @@ class Session:
         if command != 'cancel':
             return
 
-        if not self.running_thread.is_alive():
-            message.reply_text('当前没有进行中的命令.')
+        if task := self.running_task:
+            # 异步命令在取消时自行回复
+            task.get_loop().call_soon_threadsafe(task.cancel)
             return
 
+        if not (call := self.running_thread) or not call.is_alive():
+            message.reply_text('当前没有进行中的命令.')
+            return
+        # 不在事件线程中等待命令结束, 阻塞在网络调用中的命令可能很久才响应取消, 结束时再回复结果
+        if not call.stop(timeout=0):
+            message.reply_text('当前命令正在取消或已经结束.')
+            return
         wait_message = message.reply_text('正在取消当前命令...')
-        try:
-            self.running_thread.stop(timeout=None)
-        finally:
+
+        def on_done(call):
             wait_message.delete()
-        if self.running_thread.status != 'CANCELLED':
-            message.reply_text('命令执行完成, 取消失败.')
-
-    def auto_free(self):
-        while True:
-            for i in range(30):
-                time.sleep(1)
-                if self.is_locked:
-                    break
-            else:
-                for key, value in list(self.manager.items()):
-                    if value is self:
-                        self.manager.pop(key)
-                        LOG.DEB(f'Session of {key} auto freed.')
-                        return
+            if call.status != 'CANCELLED':
+                message.reply_text('命令执行完成, 取消失败.')
+
+        call.add_done_callback(on_done)
+
+
+class SessionReaper:
+    """
+    回收空闲会话的单一线程, 线程数与会话数无关.
+    堆中按过期时间排列各会话, 会话活动时只更新其最后活动时间, 到期弹出时发现已被推迟的条目重新入堆,
+    每个会话在堆中只有一个条目, 调度与回收均为O(log n).
+
+    :param manager: 会话管理器
+    :type manager: SessionManager
+    :param idle_timeout: 会话空闲多久后回收(秒)
+    :type idle_timeout: float
+    """
+    def __init__(self, manager: 'SessionManager', idle_timeout: float = 30):
+        self.manager = manager
+        self.idle_timeout = idle_timeout
+        self.freed = 0
+        # 堆条目为(过期时间, 序号, 用户, 会话), 序号保证条目之间不比较会话
+        self.heap: list[tuple[float, int, Hashable, Session]] = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def schedule(self, key: Hashable, session: Session):
+        with self._condition:
+            self._push(key, session)
+            # 新条目排在最前时唤醒线程按新的过期时间等待
+            if self.heap[0][3] is session:
+                self._condition.notify()
+
+    def _push(self, key: Hashable, session: Session):
+        heapq.heappush(self.heap, (session.last_active + self.idle_timeout, next(self._seq), key, session))
+
+    def run(self):
+        with self._condition:
+            while True:
+                if not self.heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, key, session = self.heap[0]
+                if (wait := deadline - time.monotonic()) > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self.heap)
+                if self.manager.get(key) is not session:
+                    continue
+                if session.busy:
+                    session.touch()
+                if session.last_active + self.idle_timeout > time.monotonic():
+                    self._push(key, session)
+                    continue
+                self.manager.pop(key, None)
+                self.freed += 1
+                LOG.DEB(f'Session of {key} auto freed.')
+
+    def get_stats(self) -> dict:
+        return {
+            'sessions': len(self.manager),
+            'scheduled': len(self.heap),
+            'freed': self.freed,
+        }
 
 
 class SessionManager(dict):
-    def __init__(self):
+    """
+    用户到会话的映射, 空闲的会话由SessionReaper回收
+
+    :param idle_timeout: 会话空闲多久后回收(秒)
+    :type idle_timeout: float
+    """
+    def __init__(self, idle_timeout: float = 30):
         super().__init__()
+        self.reaper = SessionReaper(self, idle_timeout)
 
     def _new_session(self, user: int | str | User):
         if isinstance(user, User):
@@ -139,16 +335,19 @@ class SessionManager(dict):
         assert not self.get(user), 'The session has already existed!'
         session = Session(self)
         self[user] = session
+        self.reaper.schedule(user, session)
         return session
 
     def get_session(self, user: int | str | User) -> Session:
         if isinstance(user, User):
             user = user.id
         if session := self.get(user):
+            session.touch()
             return session
         return self._new_session(user)
 
 
 LOG.INF('Initializing session manager...')
-SESSION_MANAGER = SessionManager()
+SESSION_MANAGER = SessionManager(**CONFIG.get('session_config', {}))
+METRICS.register('sessions', SESSION_MANAGER.reaper.get_stats)
 LOG.INF('Session manager initialized successfully.')
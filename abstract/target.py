@@ -3,14 +3,34 @@ import itertools
 from typing import Optional
 
 from abstract.bases.importer import time, dispatch, decimal, json, datetime, operator, LOCAL_TIMEZONE, SENTINEL
-from abstract.bases.importer import today_7am
+from abstract.bases.importer import today_7am, copy, functools, contextlib
 
 from abstract.bases.config import CONFIG
 from abstract.apis.frame_server import FRAME_SERVER
 from abstract.apis.table import STOCK_TABLE, USER_TABLE, GROUP_OPTION_TABLE, GAME_DATA_TABLE, ARCADES_TABLE
+from abstract.apis.table import ARCADE_NAMES_TABLE, TRADES_TABLE
+from abstract.apis.table import USER_PROVISIONER, GROUP_PROVISIONER, SQL_POOL
+from abstract.bases.identity_map import IdentityMap
+from abstract.market import MARKET
+from abstract.order_book import ORDER_BOOK, Order, crosses
+from abstract.bases.metrics import METRICS
 
+TARGET_CACHE_CONFIG = CONFIG.get('target_cache_config', {})
 
-class User:
+
+class CachedTarget(type):
+    """
+    以id缓存实例的元类, 相同id的构造在缓存有效期内直接返回缓存的实例, 不再请求框架服务器与数据库.
+    使用该元类的类需提供IDENTITY_MAP, get_key(arg)与refresh(arg).
+    """
+    def __call__(cls, arg):
+        key = cls.get_key(arg)
+        if (target := cls.IDENTITY_MAP.get(key)) is None:
+            return cls.IDENTITY_MAP.put(key, super().__call__(arg))
+        return target.refresh(arg)
+
+
+class User(metaclass=CachedTarget):
     role: str  # 'member' | 'admin' | 'owner' | 'operator'
     """
     用户角色:
@@ -19,23 +39,45 @@ class User:
     - owner: 群主
     - operator: Bot操作员（最高权限）
     """
-    
+    IDENTITY_MAP = IdentityMap('user', **TARGET_CACHE_CONFIG)
+
     @dispatch
     def __init__(self, data: dict):
         self.id = data['user_id']
         self.name = data['nickname']
-        self.role = data.get('role', 'member')
-        if self.id in CONFIG.get('operators', []):
-            self.role = 'operator'
-        init_tables = {USER_TABLE, STOCK_TABLE, GAME_DATA_TABLE}
-        for table in init_tables:
-            if not table.find_exists('id', self.id):
-                table.add(f'{self.id}' + ', DEFAULT' * (table.get_len() - 1))
+        self.role = self.get_role(data)
+        USER_PROVISIONER.ensure(self.id)
 
     @dispatch
     def __init__(self, id: int | str):
         self.__init__(FRAME_SERVER.get_stranger_info(id))
 
+    @staticmethod
+    def get_key(arg: dict | int | str) -> int:
+        if isinstance(arg, dict):
+            return int(arg['user_id'])
+        return int(arg)
+
+    def get_role(self, data: dict) -> str:
+        if self.id in CONFIG.get('operators', []):
+            return 'operator'
+        return data.get('role', 'member')
+
+    def refresh(self, arg: dict | int | str) -> 'User':
+        """
+        用事件中的发送者信息刷新缓存的用户
+
+        :return: 用户, 群角色与缓存不同时返回带有该角色的副本, 避免不同群的角色互相覆盖
+        """
+        if not isinstance(arg, dict):
+            return self
+        self.name = arg.get('nickname', self.name)
+        if (role := self.get_role(arg)) == self.role:
+            return self
+        user = copy.copy(self)
+        user.role = role
+        return user
+
     def __str__(self):
         return f'{self.name}({self.id})'
 
@@ -46,175 +88,209 @@ class User:
         return isinstance(other, self.__class__) and self.id == other.id
 
     def get_points(self) -> int:  # 韭菜盒子数操作
-        return USER_TABLE.get(f'where id = {self.id}', attr='points')[0]
+        return USER_TABLE.select('points').where(id=self.id).scalar()
 
     def add_points(self, d):
-        USER_TABLE.set(
-            'id',
-            self.id,
-            'points',
-            USER_TABLE.get(f'where id = {self.id}', attr='points')[0] + decimal.Decimal(d)
+        USER_TABLE.where(id=self.id).set('points = points + %s', decimal.Decimal(d)).update()
+
+    def debit_points(self, d) -> bool:
+        """
+        余额不少于d时扣除d个韭菜盒子, 判断与扣除在同一条语句中完成
+
+        :return: 是否扣除成功
+        """
+        return bool(
+            USER_TABLE.where('points >= %s', decimal.Decimal(d), id=self.id)
+            .set('points = points - %s', decimal.Decimal(d))
+            .update()
         )
 
+    @SQL_POOL.transactional()
+    def transfer_points(self, target: 'User', d) -> bool:
+        """
+        余额不少于d时向target转账d个韭菜盒子, 扣除与增加在同一事务中完成
+
+        :return: 是否转账成功
+        """
+        if not self.debit_points(d):
+            return False
+        target.add_points(d)
+        return True
+
     def get_sign_date(self):  # 最后一次签到日期操作
-        return USER_TABLE.get(f'where id = {self.id}', attr='sign_date')[0]
+        return USER_TABLE.select('sign_date').where(id=self.id).scalar()
 
     def update_sign_date(self):
-        USER_TABLE.set('id', self.id, 'sign_date', time.strftime("%Y-%m-%d"))
+        USER_TABLE.where(id=self.id).update(sign_date=time.strftime("%Y-%m-%d"))
+
+    def sign(self, points) -> bool:
+        """
+        今日未签到时增加韭菜盒子并记录签到日期
+
+        :return: 是否签到成功, 今日已签到时返回False
+        """
+        today = time.strftime("%Y-%m-%d")
+        return bool(
+            USER_TABLE.where('sign_date is null or sign_date <> %s', today, id=self.id)
+            .set('points = points + %s', decimal.Decimal(points))
+            .update(sign_date=today)
+        )
+
+    def stock(self) -> 'StockSnapshot':
+        """
+        获取股票数据的快照, 在 with 中加载整行并在退出时一次写回:
+
+            with user.stock() as stock:
+                stock.set_commission('buy', 10, 1)
+        """
+        return StockSnapshot(self.id)
+
+    def get_stock_values(self) -> dict:
+        """
+        不加锁读取股票数据的整行, 只用于展示
+        """
+        return dict(zip(
+            StockSnapshot.COLUMNS, STOCK_TABLE.select(*StockSnapshot.COLUMNS).where(id=self.id).first()
+        ))
 
     def get_stocks(self):  # 股票数操作
-        return STOCK_TABLE.get(f'where id = {self.id}', attr='stocks')[0]
+        return STOCK_TABLE.select('stocks').where(id=self.id).scalar()
 
     def add_stocks(self, d):
-        STOCK_TABLE.set('id', self.id, 'stocks', self.get_stocks() + d)
+        with self.stock() as stock:
+            stock.add('stocks', d)
 
     def get_stocks_bought(self):  # 当日购入股票数操作
-        return STOCK_TABLE.get(f'where id = {self.id}', attr='stocks_bought')[0]
+        return STOCK_TABLE.select('stocks_bought').where(id=self.id).scalar()
 
     def add_stocks_bought(self, d):
         assert d > 0
-        STOCK_TABLE.set('id', self.id, 'stocks_bought', self.get_stocks_bought() + d)
+        with self.stock() as stock:
+            stock.add('stocks_bought', d)
 
     def store_stocks_bought(self):
-        self.add_stocks(self.get_stocks_bought())
-        STOCK_TABLE.set('id', self.id, 'stocks_bought', 0)
+        with self.stock() as stock:
+            stock.store_stocks_bought()
 
     def get_points_sold(self) -> int:  # 当日收益操作
-        return STOCK_TABLE.get(f'where id = {self.id}', attr='points_sold')[0]
+        return STOCK_TABLE.select('points_sold').where(id=self.id).scalar()
 
     def add_points_sold(self, d):
-        STOCK_TABLE.set('id', self.id, 'points_sold', self.get_points_sold() + d)
+        with self.stock() as stock:
+            stock.add('points_sold', d)
 
     def store_points_sold(self):
-        self.add_points(self.get_points_sold())
-        STOCK_TABLE.set('id', self.id, 'points_sold', 0)
+        with self.stock() as stock:
+            stock.store_points_sold()
 
     def get_commission(self) -> dict:  # 交易委托操作
-        result = STOCK_TABLE.get(
-            f'where id = {self.id}',
-            attr='(commission_type, commission_price, commission_num, commission_time)'
-        )
-        return {
-            'type': result[0],
-            'price': result[1],
-            'num': result[2],
-            'time': result[3],
-        }
+        with self.stock() as stock:
+            return stock.get_commission()
 
     def reset_commission(self):
-        STOCK_TABLE.set(
-            'id', self.id, 'commission_type', 'default'
-        ).set(
-            'id', self.id, 'commission_price', 'default'
-        ).set(
-            'id', self.id, 'commission_num', 'default'
-        ).set(
-            'id', self.id, 'commission_time', 'now()'
-        ).set(
-            'id', self.id, 'points_sold_using', 'default'
-        )
+        with self.stock() as stock:
+            stock.reset_commission()
 
     def set_commission(self, type, price, num):
-        assert price >= 0 and num > 0
-        match type:
-            case 'buy':
-                points = price * num
-                points_sold = self.get_points_sold()
-                delta = points - points_sold
-                self.add_points_sold(-points)
-                self.add_points_sold_using(points)
-                if delta > 0:
-                    self.add_points(-delta)
-                    self.add_points_sold(delta)
-            case 'sell':
-                self.add_stocks(-num)
-            case _:
-                return
-
-        STOCK_TABLE.set(
-            'id', self.id, 'commission_type', f"'{type}'"
-        ).set(
-            'id', self.id, 'commission_price', price
-        ).set(
-            'id', self.id, 'commission_num', num
-        ).set(
-            'id', self.id, 'commission_time',
-            f"'{time.strftime('%Y-%m-%d %H:%M:%S')}'"
-        )
+        with self.stock() as stock:
+            stock.set_commission(type, price, num)
 
     def cancel_commission(self):
-        commission = self.get_commission()
-        match commission['type']:
-            case 'buy':
-                self.add_points_sold(self.get_points_sold_using())
-            case 'sell':
-                self.add_stocks(commission['num'])
-            case 'none':
-                return
-        self.reset_commission()
+        with self.stock() as stock:
+            stock.cancel_commission()
 
     def achieve_commission(self, price, num):
-        commission = self.get_commission()
-        result_num = commission['num'] - num
-        match commission['type']:
-            case 'buy':
-                self.add_stocks_bought(num)
-                self.add_points_sold_using(-price * num)
-            case 'sell':
-                self.add_points_sold(num * price)
-            case 'none':
-                return
-        STOCK_TABLE.set('id', self.id, 'commission_num', result_num)
-        self.update_trade(price, num)
-        if result_num <= 0:
-            self.add_points_sold(self.get_points_sold_using())
-            self.reset_commission()
+        with self.stock() as stock:
+            stock.achieve_commission(price, num)
+
+    def place_commission(self, type: str, price: int, num: int) -> list[tuple[int, int]]:
+        """
+        挂出交易委托并依价格优先, 时间优先与订单簿中的反向委托撮合. 挂单与所有成交在同一事务中提交.
+        撮合期间持有订单簿的锁, 订单簿在事务提交后由StockSnapshot同步.
+
+        :param type: 'buy' | 'sell'
+        :param price: 委托价格
+        :param num: 委托数量
+
+        :return: 各笔成交的(价格, 数量)
+        """
+        with ORDER_BOOK.lock:
+            return self._settle_commission(type, price, num, ORDER_BOOK.match(type, price, num))
+
+    @SQL_POOL.transactional()
+    def _settle_commission(self, type: str, price: int, num: int, orders: list[Order]) -> list[tuple[int, int]]:
+        deals = []
+        today = datetime.date.today()
+        with contextlib.ExitStack() as stack:
+            # 委托方与所有对手方的行按用户id顺序加锁, 与其他按同样顺序加锁的事务不会互相等待.
+            # 对手方只以id打开其行而不构造User, 持有行锁与订单簿锁时不请求框架服务器
+            stocks = {
+                user_id: stack.enter_context(StockSnapshot(user_id))
+                for user_id in sorted({int(self.id), *(order.user_id for order in orders)})
+            }
+            stock = stocks[int(self.id)]
+            assert stock['commission_type'] == 'none', '你现在仍有一个交易委托进行中'
+            match type:
+                case 'buy':
+                    assert price * num <= self.get_points() + stock['points_sold'], '流动资金不足'
+                case 'sell':
+                    assert num <= stock['stocks'], '可卖出股票不足'
+            stock.set_commission(type, price, num)
+
+            for order in orders:
+                if not num:
+                    break
+                target_stock = stocks[order.user_id]
+                # 订单簿可能落后于数据库, 以加锁读到的委托为准
+                if (
+                        target_stock is stock
+                        or target_stock['commission_type'] != order.type
+                        or target_stock['commission_time'].date() < today
+                        or not crosses(type, price, target_stock['commission_price'])
+                ):
+                    SQL_POOL.after_commit(functools.partial(ORDER_BOOK.refresh, order.user_id))
+                    continue
+                deal_price = target_stock['commission_price']
+                deal_num = min(num, target_stock['commission_num'])
+                stock.achieve_commission(deal_price, deal_num)
+                target_stock.achieve_commission(deal_price, deal_num)
+                num -= deal_num
+                deals.append((deal_price, deal_num))
+                buyer_id, seller_id = (self.id, order.user_id) if type == 'buy' else (order.user_id, self.id)
+                now = datetime.datetime.now()
+                TRADES_TABLE.insert(time=now, buyer=buyer_id, seller=seller_id, price=deal_price, num=deal_num)
+                SQL_POOL.after_commit(functools.partial(MARKET.record, deal_price, deal_num, now))
+        return deals
 
     def get_points_sold_using(self):  # 用于撤销/完成交易委托时计算
-        return STOCK_TABLE.get(f'where id = {self.id}', attr='points_sold_using')[0]
+        return STOCK_TABLE.select('points_sold_using').where(id=self.id).scalar()
 
     def set_points_sold_using(self, num):
         assert num >= 0
-        STOCK_TABLE.set('id', self.id, 'points_sold_using', num)
+        with self.stock() as stock:
+            stock['points_sold_using'] = num
 
     def add_points_sold_using(self, d):
-        STOCK_TABLE.set('id', self.id, 'points_sold_using', self.get_points_sold_using() + d)
+        with self.stock() as stock:
+            stock.add('points_sold_using', d)
 
     def get_trade(self) -> dict:  # 最后一次交易时间操作
-        result = STOCK_TABLE.get(
-            f'where id = {self.id}',
-            attr='(trade_price, trade_num, trade_time)'
-        )
-        return {
-            'price': result[0],
-            'num': result[1],
-            'time': result[2],
-        }
+        with self.stock() as stock:
+            return stock.get_trade()
 
     def update_trade(self, price, num):
-        STOCK_TABLE.set(
-            'id', self.id, 'trade_price', price
-        ).set(
-            'id', self.id, 'trade_num', num
-        ).set(
-            'id', self.id, 'trade_time',
-            f"'{time.strftime('%Y-%m-%d %H:%M:%S')}'"
-        )
+        with self.stock() as stock:
+            stock.update_trade(price, num)
 
     def game_data_exist(self, game: str) -> bool:
-        return bool(
-            GAME_DATA_TABLE.get(
-                f'where id = {self.id}', attr=f'json_contains(json_keys(game_data), \'"{game}"\')'
-            )[0]
-        )
+        return GAME_DATA_TABLE.where(
+            "json_contains_path(game_data, 'one', %s)", f'$.{game}', id=self.id
+        ).exists()
 
     def game_data_init(self, game: str):
-        with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                f'set game_data = json_set(game_data, "$.{game}", json_object("count", 0, "win", 0, "draw", 0))'
-                f'where id = {self.id}'
-            )
+        GAME_DATA_TABLE.where(id=self.id).set(
+            "game_data = json_set(game_data, %s, json_object('count', 0, 'win', 0, 'draw', 0))", f'$.{game}'
+        ).update()
 
     @staticmethod
     def check_game_data(func):
@@ -227,11 +303,7 @@ class User:
 
     @check_game_data
     def get_game_data(self, game: str) -> dict:
-        return json.loads(
-            GAME_DATA_TABLE.get(
-                f'where id = {self.id}', attr=f'json_extract(game_data, "$.{game}")'
-            )[0]
-        )
+        return json.loads(GAME_DATA_TABLE.select('game_data').where(id=self.id).scalar())[game]
 
     def get_game_info(self, game: str) -> dict:
         data = self.get_game_data(game)
@@ -241,80 +313,269 @@ class User:
             'rate': f"{(data['win'] / data['count'] * 100):.2f}%" if data['count'] > 0 else '0.00%'
         }
 
+    def _count_game(self, game: str, *results: str):
+        """
+        游戏次数与各结果次数加一
+
+        :param results: 需要加一的结果, 如 'win', 'draw'
+        """
+        paths = [f'$.{game}.{key}' for key in ('count', *results)]
+        GAME_DATA_TABLE.where(id=self.id).set(
+            'game_data = json_set(game_data, ' + ', '.join(['%s, json_extract(game_data, %s) + 1'] * len(paths)) + ')',
+            *itertools.chain.from_iterable((path, path) for path in paths)
+        ).update()
+
     @check_game_data
     def win_game(self, game: str):
-        with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                f'set game_data = json_set(game_data, '
-                f'"$.{game}.count", json_extract(game_data, "$.{game}.count") + 1, '
-                f'"$.{game}.win", json_extract(game_data, "$.{game}.win") + 1) '
-                f'where id = {self.id}'
-            )
+        self._count_game(game, 'win')
 
     @check_game_data
     def draw_game(self, game: str):
-        with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                'set game_data = json_set(game_data, '
-                f'"$.{game}.count", json_extract(game_data, "$.{game}.count") + 1, '
-                f'"$.{game}.draw", json_extract(game_data, "$.{game}.draw") + 1) '
-                f'where id = {self.id}'
-            )
+        self._count_game(game, 'draw')
 
     @check_game_data
     def lose_game(self, game: str):
-        with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                'set game_data = json_set(game_data, '
-                f'"$.{game}.count", json_extract(game_data, "$.{game}.count") + 1) '
-                f'where id = {self.id}'
-            )
+        self._count_game(game)
 
     def add_game_blacklist(self, target: User):
         assert target != self, "不能拉黑你自己."
-        with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                f'set black_list = json_array_append(black_list, "$", {target.id}) '
-                f'where id = {self.id}'
-            )
+        GAME_DATA_TABLE.where(id=self.id).set(
+            "black_list = json_array_append(black_list, '$', %s)", target.id
+        ).update()
 
     def remove_game_blacklist(self, target: User):
         assert target.in_game_blacklist(self), "你未将对方拉黑."
         with GAME_DATA_TABLE:
-            GAME_DATA_TABLE.cursor.execute(
-                f'update {GAME_DATA_TABLE.name} '
-                f'set black_list = json_remove(black_list, json_search(black_list, "one", {target.id}))) '
-                f'where id = {self.id}'
-            )
+            black_list = [id for id in self.get_game_blacklist() if id != target.id]
+            GAME_DATA_TABLE.where(id=self.id).update(black_list=json.dumps(black_list))
 
     def get_game_blacklist(self) -> list[User]:
-        return json.loads(
-            GAME_DATA_TABLE.get(
-                f'where id = {self.id}', attr='black_list'
-            )[0]
-        )
+        return json.loads(GAME_DATA_TABLE.select('black_list').where(id=self.id).scalar())
 
     def in_game_blacklist(self, target: User) -> bool:
-        return bool(
-            GAME_DATA_TABLE.get(
-                f'where id = {target.id}', attr=f'json_contains(black_list, {self.id})'
-            )[0]
-        )
+        return GAME_DATA_TABLE.where('json_contains(black_list, %s)', str(self.id), id=target.id).exists()
 
     def in_game_blacklists(self, targets: list[User]) -> bool:
         return any(self.in_game_blacklist(target) for target in targets)
 
 
-class Group:
+class StockSnapshot:
+    """
+    用户在stocks表中的整行数据. 在 with 中加载并锁定该行, 修改只记录在内存中,
+    正常退出时将修改过的字段以一条UPDATE写回, 韭菜盒子变化在同一事务中写入qq_users.
+
+    同时修改多个用户时应按用户id顺序进入, 避免互相等待行锁, 撮合成交即按此顺序锁定委托方与对手方.
+    委托相关的列被修改时, 事务提交后同步到订单簿.
+
+    :param user_id: 数据所属用户的id
+    :type user_id: int
+    """
+    COLUMNS = (
+        'stocks', 'stocks_bought', 'points_sold',
+        'commission_type', 'commission_price', 'commission_num', 'commission_time',
+        'points_sold_using', 'trade_price', 'trade_num', 'trade_time'
+    )
+    # 撤销交易委托时恢复的默认值, 与init.sql中的列默认值一致
+    COMMISSION_DEFAULTS = {
+        'commission_type': 'none',
+        'commission_price': 0,
+        'commission_num': 0,
+        'points_sold_using': 0,
+    }
+    COMMISSION_COLUMNS = frozenset(('commission_type', 'commission_price', 'commission_num', 'commission_time'))
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.values: dict = {}
+        self.dirty: set[str] = set()
+        self.points_delta = 0
+
+    def __enter__(self) -> 'StockSnapshot':
+        STOCK_TABLE.__enter__()
+        try:
+            self.load()
+        except BaseException as error:
+            STOCK_TABLE.__exit__(type(error), error, error.__traceback__)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            try:
+                self.flush()
+            except BaseException as error:
+                STOCK_TABLE.__exit__(type(error), error, error.__traceback__)
+                raise
+        STOCK_TABLE.__exit__(exc_type, exc_val, exc_tb)
+
+    def load(self):
+        self.values = dict(zip(
+            self.COLUMNS, STOCK_TABLE.select(*self.COLUMNS).where(id=self.user_id).for_update().first()
+        ))
+        self.dirty.clear()
+        self.points_delta = 0
+
+    def flush(self):
+        if self.dirty:
+            STOCK_TABLE.where(id=self.user_id).update(
+                **{column: self.values[column] for column in sorted(self.dirty)}
+            )
+            if self.dirty & self.COMMISSION_COLUMNS:
+                SQL_POOL.after_commit(functools.partial(
+                    ORDER_BOOK.update, self.user_id, *(self.values[column] for column in (
+                        'commission_type', 'commission_price', 'commission_num', 'commission_time'
+                    ))
+                ))
+            self.dirty.clear()
+        if self.points_delta:
+            USER_TABLE.where(id=self.user_id).set('points = points + %s', decimal.Decimal(self.points_delta)).update()
+            self.points_delta = 0
+
+    def __getitem__(self, column: str):
+        return self.values[column]
+
+    def __setitem__(self, column: str, value):
+        self.values[column] = value
+        self.dirty.add(column)
+
+    def add(self, column: str, d):
+        self[column] = self[column] + d
+
+    def store_stocks_bought(self):
+        self.add('stocks', self['stocks_bought'])
+        self['stocks_bought'] = 0
+
+    def store_points_sold(self):
+        self.points_delta += self['points_sold']
+        self['points_sold'] = 0
+
+    def get_commission(self) -> dict:
+        return {
+            'type': self['commission_type'],
+            'price': self['commission_price'],
+            'num': self['commission_num'],
+            'time': self['commission_time'],
+        }
+
+    def reset_commission(self):
+        for column, value in self.COMMISSION_DEFAULTS.items():
+            self[column] = value
+        self['commission_time'] = datetime.datetime.now()
+
+    def set_commission(self, type, price, num):
+        assert price >= 0 and num > 0
+        match type:
+            case 'buy':
+                points = price * num
+                delta = points - self['points_sold']
+                self.add('points_sold', -points)
+                self.add('points_sold_using', points)
+                if delta > 0:
+                    self.points_delta -= delta
+                    self.add('points_sold', delta)
+            case 'sell':
+                self.add('stocks', -num)
+            case _:
+                return
+
+        self['commission_type'] = type
+        self['commission_price'] = price
+        self['commission_num'] = num
+        self['commission_time'] = datetime.datetime.now()
+
+    def cancel_commission(self):
+        match self['commission_type']:
+            case 'buy':
+                self.add('points_sold', self['points_sold_using'])
+            case 'sell':
+                self.add('stocks', self['commission_num'])
+            case 'none':
+                return
+        self.reset_commission()
+
+    def achieve_commission(self, price, num):
+        result_num = self['commission_num'] - num
+        match self['commission_type']:
+            case 'buy':
+                self.add('stocks_bought', num)
+                self.add('points_sold_using', -price * num)
+            case 'sell':
+                self.add('points_sold', num * price)
+            case 'none':
+                return
+        self['commission_num'] = result_num
+        self.update_trade(price, num)
+        if result_num <= 0:
+            self.add('points_sold', self['points_sold_using'])
+            self.reset_commission()
+
+    def get_trade(self) -> dict:
+        return {
+            'price': self['trade_price'],
+            'num': self['trade_num'],
+            'time': self['trade_time'],
+        }
+
+    def update_trade(self, price, num):
+        self['trade_price'] = price
+        self['trade_num'] = num
+        self['trade_time'] = datetime.datetime.now()
+
+
+def settle_stocks() -> dict:
+    """
+    日终结算: 撤销所有用户今日之前的交易委托, 将今日之前的收益存入韭菜盒子, 购入的股票转为持有股票,
+    并刷新机器人的委托时间. 每一步都是对整张表的一条UPDATE, 结算过的行不再满足条件, 可重复执行.
+    结算期间持有订单簿的锁, 与撮合互斥, 提交后重新加载订单簿.
+
+    :return: 各步骤影响的行数
+    """
+    with ORDER_BOOK.lock:
+        result = _settle_stocks(datetime.datetime.combine(datetime.date.today(), datetime.time()))
+        ORDER_BOOK.load()
+    return result
+
+
+@SQL_POOL.transactional()
+def _settle_stocks(today: datetime.datetime) -> dict:
+    # CONFIG.get不会回写配置文件
+    if (robot_id := CONFIG.get('bot_config', {}).get('id')) is None:
+        raise KeyError('bot_config.id is not configured, unable to settle stocks.')
+    now = datetime.datetime.now()
+    # MySQL按顺序执行赋值, 归还资金与股票的赋值需在重置委托之前
+    expired = STOCK_TABLE.where(
+        "commission_type <> 'none' and commission_time < %s and id <> %s", today, robot_id
+    ).set(
+        "points_sold = points_sold + case when commission_type = 'buy' then points_sold_using else 0 end"
+    ).set(
+        "stocks = stocks + case when commission_type = 'sell' then commission_num else 0 end"
+    ).update(commission_time=now, **StockSnapshot.COMMISSION_DEFAULTS)
+    stored = USER_TABLE.where(
+        'id in (select id from stocks where points_sold <> 0 and trade_time < %s and id <> %s)', today, robot_id
+    ).set('points = points + (select points_sold from stocks where stocks.id = qq_users.id)').update()
+    settled = STOCK_TABLE.where(
+        '(points_sold <> 0 or stocks_bought <> 0) and trade_time < %s and id <> %s', today, robot_id
+    ).set('stocks = stocks + stocks_bought').update(stocks_bought=0, points_sold=0)
+    STOCK_TABLE.where(id=robot_id).update(commission_time=now)
+    return {'expired': expired, 'stored': stored, 'settled': settled}
+
+
+class Group(metaclass=CachedTarget):
+    IDENTITY_MAP = IdentityMap('group', **TARGET_CACHE_CONFIG)
+    # 以机厅名或别名匹配机厅的条件, 参数为群号与名称
+    ARCADE_BY_NAME = 'name = (select arcade from arcade_names where group_id = %s and name = %s)'
+
     def __init__(self, id):
         self.id = id
         self.name = FRAME_SERVER.get_group_info(id)['group_name']
-        if not GROUP_OPTION_TABLE.find_exists('id', self.id):
-            GROUP_OPTION_TABLE.add(str(self.id) + ',default' * (GROUP_OPTION_TABLE.get_len() - 1))
+        GROUP_PROVISIONER.ensure(self.id)
+
+    @staticmethod
+    def get_key(arg: int | str) -> int:
+        return int(arg)
+
+    def refresh(self, arg: int | str) -> 'Group':
+        return self
 
     def __str__(self):
         return f'{self.name}({self.id})'
@@ -339,7 +600,7 @@ class Group:
             - num: 机厅数量，可能为None（未记录或已过期）
             - update_time: 更新时间，可能为None，已转换为本地时区
         """
-        result = ARCADES_TABLE.get_all(f'where group_id = {self.id}', attr='name, subnames, num, update_time')
+        result = ARCADES_TABLE.select('name', 'subnames', 'num', 'update_time').where(group_id=self.id).all()
         response = {}
         for name, sub_names, num, update_time in result:
             if update_time and (update_time := update_time.replace(tzinfo=datetime.UTC)) < today_7am():
@@ -357,77 +618,55 @@ class Group:
         assert json.dumps(name, ensure_ascii=False) == f'"{name}"', '机厅名不符合要求.'
         assert name not in self.get_arcade_names(), '有重复命名'
         with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'insert into {ARCADES_TABLE.name} (group_id, name)'
-                f'values (%s, %s)',
-                (self.id, name)
-            )
+            ARCADES_TABLE.insert(group_id=self.id, name=name)
+            ARCADE_NAMES_TABLE.insert(group_id=self.id, name=name, arcade=name)
 
     def remove_arcade(self, name: str):
         arcades = self.get_arcades()
         assert name not in itertools.chain(*map(operator.itemgetter('sub_names'), arcades.values())), '安全起见移除不能使用机厅别名.'
         assert name in arcades, f'{name} 未在此群设置.'
         assert not arcades[name]['sub_names'], '安全起见移除机厅需要先移除机厅所有别名.'
-        ARCADES_TABLE.delete('(group_id, name)', (self.id, name))
+        with ARCADES_TABLE:
+            ARCADES_TABLE.where(group_id=self.id, name=name).delete()
+            ARCADE_NAMES_TABLE.where(group_id=self.id, arcade=name).delete()
 
     def add_arcade_subname(self, name: str, subname: str):
         assert json.dumps(subname, ensure_ascii=False) == f'"{subname}"', '别名不符合要求.'
         assert subname not in self.get_arcade_names(), '有重复命名'
         with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'update {ARCADES_TABLE.name} '
-                f'set subnames = json_array_append(subnames, "$", %s) '
-                f'where group_id = %s and name = %s',
-                (subname, self.id, name)
-            )
+            assert ARCADES_TABLE.where(group_id=self.id, name=name).set(
+                "subnames = json_array_append(subnames, '$', %s)", subname
+            ).update(), f'{name} 未在此群设置.'
+            ARCADE_NAMES_TABLE.insert(group_id=self.id, name=subname, arcade=name)
 
     def remove_arcade_subname(self, name: str, subname: str):
         with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'update {ARCADES_TABLE.name} '
-                f'set subnames = json_remove(subnames, json_unquote(json_search(subnames, "one", %s))) '
-                f'where group_id = %s and name = %s',
-                (subname, self.id, name)
-            )
+            ARCADES_TABLE.where(group_id=self.id, name=name).set(
+                "subnames = json_remove(subnames, json_unquote(json_search(subnames, 'one', %s)))", subname
+            ).update()
+            ARCADE_NAMES_TABLE.where(group_id=self.id, name=subname, arcade=name).delete()
 
-    def get_arcade_names(self):
-        return list(
-            itertools.chain(
-                *map(
-                    json.loads,
-                    itertools.chain(
-                        *ARCADES_TABLE.get_all(f'where group_id = {self.id}', attr='names')
-                    )
-                )
-            )
-        )
+    def get_arcade_names(self) -> list[str]:
+        return [row[0] for row in ARCADE_NAMES_TABLE.select('name').where(group_id=self.id).all()]
 
     def update_arcade_num(self, name: str, num: Optional[int], time: Optional[datetime.datetime] = SENTINEL):
         if time is SENTINEL:
             time = datetime.datetime.now()
-        with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'update {ARCADES_TABLE.name} '
-                f'set num = %s, update_time = %s '
-                f'where group_id = %s and json_contains(names, json_quote(%s))',
-                (num, time.astimezone(datetime.UTC), self.id, name)
-            )
+        ARCADES_TABLE.where(self.ARCADE_BY_NAME, self.id, name, group_id=self.id).update(
+            num=num, update_time=time.astimezone(datetime.UTC)
+        )
 
     def reset_arcade_num(self, name: str):
-        with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'update {ARCADES_TABLE.name} '
-                f'set num = NULL, update_time = NULL '
-                f'where group_id = %s and json_contains(names, json_quote(%s))',
-                (self.id, name)
-            )
+        ARCADES_TABLE.where(self.ARCADE_BY_NAME, self.id, name, group_id=self.id).update(
+            num=None, update_time=None
+        )
 
     def get_arcade_num(self, name: str) -> Optional[tuple[Optional[int], Optional[datetime.datetime]]]:
         """
         获取指定机厅的数量和更新时间，自动处理过期数据
         
         功能说明：
-        - 使用参数化查询和JSON_QUOTE处理机厅名称，支持使用机厅别名查询
+        - 通过arcade_names表以主键查找机厅名称，支持使用机厅别名查询
         - 自动处理过期数据：
           - 未找到记录时返回None
           - 更新时间为None时返回(None, None)
@@ -449,14 +688,9 @@ class Group:
             - 未找到: None
         """
 
-        with ARCADES_TABLE:
-            ARCADES_TABLE.cursor.execute(
-                f'select num, update_time '
-                f'from {ARCADES_TABLE.name} '
-                f'where group_id = %s and json_contains(names, JSON_QUOTE(%s))',
-                (self.id, name)
-            )
-            result = ARCADES_TABLE.cursor.fetchone()
+        result = ARCADES_TABLE.select('num', 'update_time').where(
+            self.ARCADE_BY_NAME, self.id, name, group_id=self.id
+        ).first()
 
         if not result:
             return None
@@ -468,3 +702,5 @@ class Group:
         return result[0], update_time.astimezone(LOCAL_TIMEZONE)
 
 
+METRICS.register('user_cache', User.IDENTITY_MAP.get_stats)
+METRICS.register('group_cache', Group.IDENTITY_MAP.get_stats)
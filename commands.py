@@ -1,25 +1,36 @@
 from abstract.bases.importer import datetime, functools, copy
 from abstract.bases.importer import getopt, io, time
-from abstract.bases.importer import filetype, numpy, pymysql
-from abstract.bases.importer import json, PIL
+from abstract.bases.importer import filetype, numpy, pymysql, sqlite3
+from abstract.bases.importer import json, PIL, asyncio, inspect
 
 from PicImageSearch.sync import *
 
 import abstract.message
-from abstract.bases.custom_thread import CustomThreadGroup
+from abstract.bases.aio import run_sync
 from abstract.message import *
 from abstract.bot import BOT
 from abstract.command import COMMAND_GROUP
 from abstract.session import Session
 from extra.chat_ai import LLM, CHAT_AIs
 from abstract.bases.exceptions import *
-from abstract.apis.table import GROUP_OPTION_TABLE, STOCK_TABLE, NOTICE_SCHEDULE_TABLE
-from abstract.apis.table import NULL
+from abstract.apis.table import GROUP_OPTIONS, NOTICE_SCHEDULE_TABLE
+from abstract.market import MARKET
 from extra.vits_speaker import SPEAKER_MANAGER
 from extra.weather_city import WEATHER_CITY_MANAGER
 
 
 def ask_for_wait(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def decorated_async(*args, **kwargs):
+            wait_message: BaseMessage = await args[0].reply_text_async('别急')
+            try:
+                await func(*args, **kwargs)
+            finally:
+                await run_sync(wait_message.delete)
+
+        return decorated_async
+
     @functools.wraps(func)
     def decorated(*args, **kwargs):
         wait_message: BaseMessage = args[0].reply_text('别急')
@@ -32,21 +43,47 @@ def ask_for_wait(func):
 
 
 def cost(cost: int):
+    def get_lack_text() -> str:
+        return (
+            '\n韭菜盒子不足!\n'
+            f'我早上本来应该吃 {cost} 个韭菜盒子, 饱饱的.\n'
+            '那我缺的这个这个营养这一块的, 谁给我补啊?\n'
+        )
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def decorated_async(*args, **kwargs):
+                message = args[0]
+                if not await run_sync(message.sender.debit_points, cost):
+                    await message.reply_text_async(get_lack_text())
+                    return
+
+                # 先扣除再执行, 执行失败或被取消时退还
+                try:
+                    await func(*args, **kwargs)
+                except BaseException:
+                    await run_sync(message.sender.add_points, cost)
+                    raise
+
+                await message.reply_text_async(f'本次请求消耗 {cost} 个韭菜盒子, 贼jb好吃.')
+
+            return decorated_async
+
         @functools.wraps(func)
         def decorated(*args, **kwargs):
             message = args[0]
-            if message.sender.get_points() < cost:
-                message.reply_text(
-                    '\n韭菜盒子不足!\n'
-                    f'我早上本来应该吃 {cost} 个韭菜盒子, 饱饱的.\n'
-                    '那我缺的这个这个营养这一块的, 谁给我补啊?\n'
-                )
+            if not message.sender.debit_points(cost):
+                message.reply_text(get_lack_text())
                 return
 
-            func(*args, **kwargs)
+            # 先扣除再执行, 执行失败时退还
+            try:
+                func(*args, **kwargs)
+            except BaseException:
+                message.sender.add_points(cost)
+                raise
 
-            message.sender.add_points(-cost)
             message.reply_text(f'本次请求消耗 {cost} 个韭菜盒子, 贼jb好吃.')
 
         return decorated
@@ -55,6 +92,14 @@ def cost(cost: int):
 
 
 def group_only(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def decorated_async(*args, **kwargs):
+            assert type(args[0]) is GroupMessage, '此指令仅在群聊中可用!'
+            await func(*args, **kwargs)
+
+        return decorated_async
+
     @functools.wraps(func)
     def decorated(*args, **kwargs):
         assert type(args[0]) is GroupMessage, '此指令仅在群聊中可用!'
@@ -66,12 +111,22 @@ def group_only(func):
 def authorize(min_level: str):
     level_list = ['member', 'admin', 'owner', 'operator']
 
+    def check(message: MESSAGE):
+        assert level_list.index(message.sender.role) >= level_list.index(min_level), \
+            f'执行此指令最低需要{min_level}权限.'
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def decorated_async(*args, **kwargs):
+                check(args[0])
+                await func(*args, **kwargs)
+
+            return decorated_async
+
         @functools.wraps(func)
         def decorated(*args, **kwargs):
-            assert level_list.index(args[0].sender.role) >= level_list.index(min_level), \
-                f'执行此指令最低需要{min_level}权限.'
-
+            check(args[0])
             func(*args, **kwargs)
 
         return decorated
@@ -82,7 +137,7 @@ def authorize(min_level: str):
 @COMMAND_GROUP.register_command(('search', '搜图', '以图搜图'), {'needed_type': ImageMessage}, '多API同时搜索')
 @cost(2)
 @ask_for_wait
-def pic_searching(message: MESSAGE, session: Session, image: list[ImageMessage]):
+async def pic_searching(message: MESSAGE, session: Session, image: list[ImageMessage]):
     def pic_search(api, index: int):
         name = api.__class__.__name__
         try:
@@ -138,22 +193,19 @@ def pic_searching(message: MESSAGE, session: Session, image: list[ImageMessage])
         (Iqdb(True), 0)
     ]
 
-    thread_group = CustomThreadGroup(pic_search, apis)
+    # 各搜索API在I/O线程池中同时进行, 命令本身不占用线程
+    tasks = [asyncio.ensure_future(run_sync(pic_search, api, index)) for api, index in apis]
     try:
-        thread_group.start()
-        thread_group.join()
-    except CommandCancel as e:
-        thread_group.stop()
-        completed = thread_group.completed_thread_count
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        completed = sum(task.done() and not task.cancelled() for task in tasks)
         cost = int(completed / len(apis) * 100) / 100 * 2
         if completed and cost < 1:
             cost = 1
         if cost:
-            message.sender.add_points(
-                cost
-            )
-            message.reply_text(f'部分搜索已完成, 消耗了 {cost} 个韭菜盒子.')
-        raise e
+            await run_sync(message.sender.add_points, -cost)
+            await message.reply_text_async(f'部分搜索已完成, 消耗了 {cost} 个韭菜盒子.')
+        raise
 
 @COMMAND_GROUP.register_command(('random', '随机', '随机图', '随机涩图', '涩图', '多来点'), 1, '随机pixiv图')
 @ask_for_wait
@@ -216,7 +268,7 @@ def random_pic(message: MESSAGE, session: Session, args):
             worker()
 
     if isinstance(message, GroupMessage):
-        r18 = GROUP_OPTION_TABLE.get(f'where id = {message.target.id}', attr='r18')[0]
+        r18 = GROUP_OPTIONS.get(message.target.id, 'r18')
     else:
         r18 = 0
     retry_times = 0
@@ -249,13 +301,15 @@ def option(message: MESSAGE, session: Session, args):
         case [key, value]:
             assert key != 'trusted' or message.sender.role == 'operator', '本项仅operator可修改. 你在装你妈呢我就不明白了.'
             try:
-                GROUP_OPTION_TABLE.set('id', message.target.id, key, value)
+                GROUP_OPTIONS.set(message.target.id, key, value)
             except Exception as error:
                 match error:
-                    case pymysql.OperationalError(args=(1054, _)):
+                    case KeyError():
                         raise CommandCancel('错误: 设置项不存在.')
                     case pymysql.OperationalError(args=(3819, _)):
                         raise CommandCancel('错误: 本群不在白名单中或输入不合法.')
+                    case sqlite3.IntegrityError() if str(error).startswith('CHECK constraint failed'):
+                        raise CommandCancel('错误: 本群不在白名单中或输入不合法.')
                     case _:
                         LOG.WAR(f'Group option {key} set failed.')
                         raise CommandCancel(f'错误: {error}.')
@@ -265,11 +319,11 @@ def option(message: MESSAGE, session: Session, args):
             try:
                 message.reply_text(
                     '查询结果:\n'
-                    f"  {key} - {GROUP_OPTION_TABLE.get(f'where id = {message.target.id}', attr=key)[0]}"
+                    f"  {key} - {GROUP_OPTIONS.get(message.target.id, key)}"
                 )
             except Exception as error:
                 match error:
-                    case pymysql.OperationalError(args=(1054, _)):
+                    case KeyError():
                         raise CommandCancel('错误: 查询项不存在.')
                     case _:
                         LOG.WAR(f'Group option {key} query failed.')
@@ -295,21 +349,20 @@ def transfer(message: MESSAGE, session: Session, args):
                 num = int(num)
             except ValueError:
                 raise CommandCancel('输入的额度无法转换为数字!')
+            if num <= 0:
+                raise CommandCancel('转账额度必须为正数!')
             match args:
                 case [AtMessage(target=recipients), TextMessage(), AtMessage(target=target)]:
                     if message.sender.role != 'operator':
                         raise CommandCancel('只有操作员可以从其他用户账户转账!')
-                    if recipients.get_points() < num:
+                    if not recipients.transfer_points(target, num):
                         raise CommandCancel('转账人余额不足!')
-                    recipients.add_points(-num)
-                    target.add_points(num)
 
                 case [AtMessage(target=target)]:
-                    if message.sender.role != 'operator':
-                        if message.sender.get_points() < num:
-                            raise CommandCancel('您的余额不足!')
-                        message.sender.add_points(-num)
-                    target.add_points(num)
+                    if message.sender.role == 'operator':
+                        target.add_points(num)
+                    elif not message.sender.transfer_points(target, num):
+                        raise CommandCancel('您的余额不足!')
 
                 case final:
                     message.reply_text(f'匹配 {final} 失败, 检查输入.')
@@ -329,20 +382,21 @@ def transfer(message: MESSAGE, session: Session, args):
 @COMMAND_GROUP.register_command(('sign', '签到'), info='签到获取韭菜盒子')
 def sign(message: MESSAGE, session: Session):
     from abstract.bases.importer import random
-    if message.sender.get_sign_date().strftime('%Y%m%d') == time.strftime('%Y%m%d'):
-        message.reply_text('今日已签到过了!')
-        return
     points = random.randint(5, 9)
+    prize = None
     match random.randint(1, 100):
         case score if score <= 1:
-            message.reply_text('大奖. +10')
+            prize = '大奖. +10'
             points += 10
         case score if score <= 10:
-            message.reply_text('小奖. +3')
+            prize = '小奖. +3'
             points += 3
 
-    message.sender.add_points(points)
-    message.sender.update_sign_date()
+    if not message.sender.sign(points):
+        message.reply_text('今日已签到过了!')
+        return
+    if prize:
+        message.reply_text(prize)
     message.reply_text(f'今日签到获得韭菜盒子: {points}个.')
 
 
@@ -384,24 +438,16 @@ def lottery(message: MESSAGE, session: Session):
 
 @COMMAND_GROUP.register_command(('stock', '股票'), 1, '股票系统')
 def stock(message: MESSAGE, session: Session, args):
-    date = time.strftime('%Y-%m-%d')
-    commission = message.sender.get_commission()
-    trade = message.sender.get_trade()
-    STOCK_TABLE.set(
-        'id', CONFIG["robot_id"], 'commission_time', f"'{time.strftime('%Y-%m-%d %H:%M:%S')}'"
-    )
-    if str(commission['time']).split(' ')[0] < date and commission['type'] != 'none':
-        message.sender.cancel_commission()
-        message.reply_text('过期交易委托已取消!')
-    if str(trade['time']).split(' ')[0] < date:
-        message.reply_text(
-            '\n昨日收益:\n'
-            f'  韭菜盒子收入: {message.sender.get_points_sold()}'
-            f'  股票收入: {message.sender.get_stocks_bought()}'
-        )
-        message.sender.store_points_sold()
-        message.sender.store_stocks_bought()
-        message.sender.update_trade(0, 0)
+    # 过期委托与昨日收益由stock_settler服务在零点统一结算, 这里只读取当前状态
+    values = message.sender.get_stock_values()
+    commission = {
+        'type': values['commission_type'],
+        'price': values['commission_price'],
+        'num': values['commission_num'],
+        'time': values['commission_time'],
+    }
+    trade = {'price': values['trade_price'], 'num': values['trade_num'], 'time': values['trade_time']}
+    status = (values['stocks'], values['stocks_bought'], values['points_sold'])
 
     match args:
         case []:
@@ -411,21 +457,20 @@ def stock(message: MESSAGE, session: Session, args):
                 case []:
                     message.reply_text(
                         '\n当前状态:\n'
-                        f'  持有股票: {message.sender.get_stocks()}\n'
-                        f'  今日股票购入: {message.sender.get_stocks_bought()}\n'
-                        f'  今日收益: {message.sender.get_points_sold()}\n'
+                        f'  持有股票: {status[0]}\n'
+                        f'  今日股票购入: {status[1]}\n'
+                        f'  今日收益: {status[2]}\n'
                         f'  最后一次交易时间: {trade["time"]}\n'
                         f'  最后一次交易价格: {trade["price"]}\n'
                         f'  最后一次交易数量: {trade["num"]}'
                     )
                 case ['stock']:
-                    trade = User(STOCK_TABLE.get('ORDER BY trade_time desc', attr='id')[0]).get_trade()
+                    price = MARKET.last_price
                     message.reply_text(
                         '\n当前股市状态:\n'
-                        f'  最后一次交易价格: {trade["price"]}\n'
+                        f'  最后一次交易价格: {price}\n'
                     )
                 case ['commission']:
-                    commission = message.sender.get_commission()
                     if commission['type'] == 'none':
                         message.reply_text('当前没有交易委托中')
                         return
@@ -453,6 +498,13 @@ def stock(message: MESSAGE, session: Session, args):
                 message.reply_text('输入的参数无法转换为数字!')
                 return
 
+        case ['chart']:
+            if (chart := MARKET.get_chart()) is None:
+                message.reply_text('暂无已结束的K线.')
+                return
+            message.reply(ImageMessage(data=chart))
+            return
+
         case ['cancel']:
             message.sender.cancel_commission()
             message.reply_text('已有的交易委托已撤销.')
@@ -461,37 +513,11 @@ def stock(message: MESSAGE, session: Session, args):
             message.reply_text(f'匹配 {final} 失败, 检查输入.')
             return
 
-    match action:
-        case 'buy':
-            if price * num > message.sender.get_points() + message.sender.get_points_sold():
-                message.reply_text('流动资金不足!')
-                return
-        case 'sell':
-            if num > message.sender.get_stocks():
-                message.reply_text('可卖出股票不足!')
-                return
-
-    message.sender.set_commission(action, price, num)
-    while target_id := STOCK_TABLE.get(
-            f"where (commission_type, date(commission_time)) = ('{'sell' if action == 'buy' else 'buy'}', curdate())"
-            f"and commission_price {'<=' if action == 'buy' else '>'} {price}",
-            f"order by commission_price {'asc' if action == 'buy' else 'desc'}, commission_time asc",
-            attr='id'
-    )[0]:
-        target = User(target_id)
-        target_commission = target.get_commission()
-        if num < target_commission['num']:
-            deal_num = num
-        else:
-            deal_num = target_commission['num']
-
+    # 挂单与撮合在内存订单簿中完成并在同一事务中写回, 回复在提交后发送
+    for deal_price, deal_num in message.sender.place_commission(action, price, num):
         num -= deal_num
-        message.sender.achieve_commission(target_commission['price'], deal_num)
-        message.reply_text(f' 你以 {target_commission["price"]}韭菜盒子/股 的价格 {action} 了 {deal_num}股.')
-        target.achieve_commission(target_commission['price'], deal_num)
-        if not num:
-            break
-    else:
+        message.reply_text(f' 你以 {deal_price}韭菜盒子/股 的价格 {action} 了 {deal_num}股.')
+    if num:
         message.reply_text(f'交易还剩 {num}股 未完成, 交易委托中...')
 
 
@@ -536,12 +562,12 @@ def notice(message: MESSAGE, session: Session, args):
                 notice_time = time.strftime('%Y-%m-%d %H:%M:%S')
             else:
                 notice_time = ' '.join(notice_time.split(','))
-            NOTICE_SCHEDULE_TABLE.add(
-                id,
-                notice_type,
-                notice_time,
-                args.get('--text', NULL),
-                args.get('--every', NULL)
+            NOTICE_SCHEDULE_TABLE.insert(
+                id=id,
+                type=notice_type,
+                time=notice_time,
+                text=args.get('--text'),
+                every=args.get('--every')
             )
 
         case ['status']:
@@ -550,21 +576,18 @@ def notice(message: MESSAGE, session: Session, args):
                 '\n'.join(
                     map(
                         lambda a: f'时间: {a[0]}, 每: {a[1]}, 内容: {a[2]}',
-                        NOTICE_SCHEDULE_TABLE.get_all(
-                            f'where (id, type) = ({id}, "{notice_type}")',
-                            attr='time, every, text'
-                        )
+                        NOTICE_SCHEDULE_TABLE.select('time', 'every', 'text').where(id=id, type=notice_type).all()
                     )
                 )
             )
             return
 
         case ['remove', 'all']:
-            NOTICE_SCHEDULE_TABLE.delete('(id, type)', (id, notice_type))
+            NOTICE_SCHEDULE_TABLE.where(id=id, type=notice_type).delete()
 
         case ['remove', *args]:
             notice_time = ' '.join(args)
-            NOTICE_SCHEDULE_TABLE.delete('(id, type, time)', (id, notice_type, notice_time))
+            NOTICE_SCHEDULE_TABLE.where(id=id, type=notice_type, time=notice_time).delete()
 
         case final:
             message.reply_text(f'匹配 {final} 失败, 检查输入.')
@@ -591,7 +614,7 @@ def say(message: MESSAGE, session: Session):
 @group_only
 @cost(3)
 @ask_for_wait
-def chat(message: GroupMessage, session: Session):
+async def chat(message: GroupMessage, session: Session):
     def format(message: GroupMessage) -> list[dict]:
         output = []
         for part in message.split_when(lambda a: isinstance(a, ImageMessage | ReplyMessage)):
@@ -601,7 +624,7 @@ def chat(message: GroupMessage, session: Session):
                     for message_part in part:
                         match type(message_part):
                             case abstract.message.AtMessage:
-                                if message_part.target.id == CONFIG["robot_id"]:
+                                if message_part.target.id == CONFIG['bot_config']['id']:
                                     continue
                                 text += message_part.target.__str__()
                             case abstract.message.TextMessage:
@@ -654,12 +677,14 @@ def chat(message: GroupMessage, session: Session):
         return output
 
     character: LLM = CHAT_AIs[message.get_parts_by_type(TextMessage)[0].to_args()[1]]
-    assert not character.r18 or GROUP_OPTION_TABLE.get(f'where id = {message.target.id}', attr='r18')[0] > 0, \
+    assert not character.r18 or GROUP_OPTIONS.get(message.target.id, 'r18') > 0, \
         '你所在的群聊的r18设置为0'
-    message.reply_text(
-        character.chat(session, format(message))
+    # 获取引用消息与请求模型都是阻塞的网络调用, 在I/O线程池中执行
+    content = await run_sync(format, message)
+    await message.reply_text_async(
+        await run_sync(character.chat, session, content)
     )
-    message.reply_text(f'本次请求消耗bot主约{character.cost: .2f}元')
+    await message.reply_text_async(f'本次请求消耗bot主约{character.cost: .2f}元')
 
 
 @COMMAND_GROUP.register_command(('phantom', '幻影坦克'), {'needed_type': ImageMessage, 'needed_num': 2}, '幻影坦克图片生成')
@@ -860,7 +885,7 @@ def forge_chat(message: MESSAGE, session: Session):
 @cost(2)
 @group_only
 @ask_for_wait
-def weather(message: MESSAGE, session: Session, args):
+async def weather(message: MESSAGE, session: Session, args):
     match args:
         case []:
             city_name = ''
@@ -871,17 +896,17 @@ def weather(message: MESSAGE, session: Session, args):
             else:
                 city_name = ''
         case _:
-            message.reply_text(f'匹配 {args} 失败, 检查输入.')
+            await message.reply_text_async(f'匹配 {args} 失败, 检查输入.')
             return
 
     if not city_name:
-        city_name = GROUP_OPTION_TABLE.get(f'where id = {message.target.id}', attr='city')[0]
+        city_name = GROUP_OPTIONS.get(message.target.id, 'city')
         if not city_name:
             raise CommandCancel('未设置默认城市, 在命令后添加城市名, 或让管理员设置默认城市.')
-        message.reply_text(f'未指定城市, 将使用群默认城市 {city_name}.')
+        await message.reply_text_async(f'未指定城市, 将使用群默认城市 {city_name}.')
 
     try:
-        weather_city = WEATHER_CITY_MANAGER[city_name]
+        weather_city = await run_sync(WEATHER_CITY_MANAGER.__getitem__, city_name)
     except CityNotFound:
         raise CommandCancel(f'未能找到城市 {city_name}. 如为默认城市则让管理员更正, 或手动输入.')
 
@@ -889,32 +914,32 @@ def weather(message: MESSAGE, session: Session, args):
 
     match method:
         case 'now':
-            message.reply_text(
+            await message.reply_text_async(
                 '\n' +
-                weather_city.get_weather_now_text()
+                await run_sync(weather_city.get_weather_now_text)
             )
         case 'hourly':
-            message.reply(ImageMessage(weather_city.get_weather_hourly()))
+            await message.reply_async(ImageMessage(await run_sync(weather_city.get_weather_hourly)))
         case 'daily':
-            message.reply(ImageMessage(weather_city.get_weather_daily()))
+            await message.reply_async(ImageMessage(await run_sync(weather_city.get_weather_daily)))
         case 'today':
-            message.reply_text(
+            await message.reply_text_async(
                 '\n' +
-                weather_city.get_weather_day_text()
+                await run_sync(weather_city.get_weather_day_text)
             )
         case 'tomorrow':
-            message.reply_text(
+            await message.reply_text_async(
                 '\n' +
-                weather_city.get_weather_tomorow_text()
+                await run_sync(weather_city.get_weather_tomorow_text)
             )
         case 'minutely':
-            rain_change = weather_city.get_minutely_rain_change()
+            rain_change = await run_sync(weather_city.get_minutely_rain_change)
             if rain_change:
-                message.reply_text('\n' + rain_change)
+                await message.reply_text_async('\n' + rain_change)
             else:
-                message.reply_text('\n未来30分钟内降水情况无变化或暂无数据.')
+                await message.reply_text_async('\n未来30分钟内降水情况无变化或暂无数据.')
         case _:
-            message.reply_text(f'匹配 {args} 失败, 检查输入.')
+            await message.reply_text_async(f'匹配 {args} 失败, 检查输入.')
 
 @COMMAND_GROUP.register_command(('arcade', '机厅管理'), 1, '管理机厅')
 @group_only
@@ -2,7 +2,6 @@ from abstract.bases.importer import fractions, threading, openai, requests
 from abstract.bases.importer import dispatch, itertools, operator
 
 import abstract.apis.table
-from abstract.apis.table import NULL
 from abstract.bases.config import CONFIG
 from abstract.bases.log import LOG
 from abstract.session import Session
@@ -45,15 +44,12 @@ class LLM:
         self.name = name
         self.vision = vision
         self.r18 = r18
-        if not self.messages_table.get(f'where target = "{self.name}" and role = "system"'):
+        if not self.messages_table.where(target=self.name, role='system').exists():
             for message in prompts:
-                self.messages_table.add(NULL, self.name, message['role'], message['content'], 'text')
+                self.messages_table.insert(target=self.name, role=message['role'], text=message['content'], type='text')
 
         self.messages = []
-        messages_data = self.messages_table.get_all(
-            f'where target = "{self.name}"',
-            attr='role, type, text'
-        )
+        messages_data = self.messages_table.select('role', 'type', 'text').where(target=self.name).order_by('id').all()
 
         for role, group in itertools.groupby(messages_data, key=operator.itemgetter(0)):
             self.messages.append(
@@ -70,7 +66,7 @@ class LLM:
             'role': role,
             'content': text
         }
-        self.messages_table.add(NULL, self.name, role, text, 'text')
+        self.messages_table.insert(target=self.name, role=role, text=text, type='text')
         self.messages.append(
             data
         )
@@ -84,7 +80,7 @@ class LLM:
                     part = part['image_url']['url']
                 case 'text':
                     part = part['text']
-            self.messages_table.add(NULL, self.name, role, part, type)
+            self.messages_table.insert(target=self.name, role=role, text=part, type=type)
 
         data = {
             'role': role,
@@ -658,22 +658,33 @@ class WeatherCityManager(MutableMapping[str, 'WeatherCity']):
 
 LOG.INF('Loading weather modules...')
 
-_groups = set(itertools.chain(*GROUP_OPTION_TABLE.get_all('where city is not NULL', attr='city')))
+_groups = {row['city'] for row in GROUP_OPTIONS.select(lambda a: a['city'] is not None)}
 WEATHER_CITY_MANAGER = WeatherCityManager()
 for city in _groups:
     try:
         WEATHER_CITY_MANAGER[city] = WeatherCity(city)
     except CityNotFound:
-        for id, city in GROUP_OPTION_TABLE.get_all('where city is not NULL', attr='id, city'):
-            id = int(id)
+        for row in GROUP_OPTIONS.select(lambda a: a['city'] == city):
+            id = int(row['id'])
             GroupMessage(
                 f'未能找到此群默认城市 {city}, 已重置天气选项.',
                 Group(id)
             ).send()
-        GROUP_OPTION_TABLE.set('city', city, 'weather_notice', 0)
-        GROUP_OPTION_TABLE.set('city', city, 'city', None)
+            GROUP_OPTIONS.set(id, 'weather_notice', 0)
+            GROUP_OPTIONS.set(id, 'city', None)
         LOG.WAR(f'City {city} not found, reset weather option of groups.')
 
+
+@GROUP_OPTIONS.subscribe
+def _load_group_city(group_id: int, column: str, value):
+    """群默认城市变化时加载新城市, 使天气提醒服务刷新其缓存"""
+    if column != 'city' or not value or value in WEATHER_CITY_MANAGER.keys():
+        return
+    try:
+        WEATHER_CITY_MANAGER[value]
+    except CityNotFound:
+        LOG.WAR(f'City {value} of group {group_id} not found.')
+
 LOG.INF(
     'Loaded Weather modules:\n' +
     ',\n'.join(WEATHER_CITY_MANAGER)
@@ -0,0 +1,68 @@
+CREATE TABLE `ai_messages` (
+  `id` integer PRIMARY KEY AUTOINCREMENT,
+  `target` varchar(10) NOT NULL,
+  `role` text NOT NULL CHECK (`role` in ('system','user','assistant')),
+  `text` text DEFAULT NULL,
+  `type` text DEFAULT 'text' CHECK (`type` in ('text','image_url'))
+);
+CREATE INDEX `ai_messages_target_index` ON `ai_messages` (`target`);
+
+CREATE TABLE `arcades` (
+  `group_id` decimal(10,0) NOT NULL,
+  `name` text NOT NULL,
+  `subnames` text NOT NULL DEFAULT '[]' CHECK (json_valid(`subnames`)),
+  `names` text GENERATED ALWAYS AS (json_insert(`subnames`,'$[#]',`name`)) VIRTUAL,
+  `num` tinyint DEFAULT NULL CHECK (`num` between 0 and 255),
+  `update_time` datetime DEFAULT NULL
+);
+CREATE INDEX `arcades_group_id_index` ON `arcades` (`group_id`,`name`);
+
+CREATE TABLE `game_data` (
+  `id` decimal(65,0) NOT NULL,
+  `black_list` text NOT NULL DEFAULT '[]' CHECK (json_valid(`black_list`)),
+  `game_data` text NOT NULL DEFAULT '{}' CHECK (json_valid(`game_data`)),
+  PRIMARY KEY (`id`)
+);
+
+CREATE TABLE `group_options` (
+  `id` decimal(65,0) NOT NULL,
+  `trusted` tinyint(1) DEFAULT 0,
+  `r18` tinyint(1) DEFAULT 0,
+  `recall_catch` tinyint(1) DEFAULT 0,
+  `city` varchar(30) DEFAULT NULL,
+  `weather_notice` tinyint(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id`),
+  CONSTRAINT `check_trusted` CHECK (`trusted` = 1 and 2 >= `r18` >= 0 or `trusted` = 0 and `r18` = 0)
+);
+
+CREATE TABLE `notice_schedule` (
+  `id` decimal(65,0) NOT NULL,
+  `type` text NOT NULL CHECK (`type` in ('group','private')),
+  `time` datetime NOT NULL,
+  `text` text DEFAULT NULL,
+  `every` text DEFAULT NULL CHECK (`every` in ('day','week'))
+);
+CREATE INDEX `notice_schedule_time_index` ON `notice_schedule` (`time`);
+
+CREATE TABLE `qq_users` (
+  `id` decimal(65,0) NOT NULL,
+  `points` decimal(65,0) DEFAULT 0,
+  `sign_date` date DEFAULT '1000-01-01',
+  PRIMARY KEY (`id`)
+);
+
+CREATE TABLE `stocks` (
+  `id` decimal(65,0) NOT NULL,
+  `stocks` decimal(10,0) DEFAULT 0,
+  `stocks_bought` decimal(10,0) DEFAULT 0,
+  `points_sold` decimal(10,0) DEFAULT 0,
+  `commission_type` text DEFAULT 'none' CHECK (`commission_type` in ('buy','sell','none')),
+  `commission_price` decimal(10,0) DEFAULT 0,
+  `commission_num` decimal(10,0) DEFAULT 0,
+  `commission_time` datetime DEFAULT '1000-01-01 00:00:00',
+  `points_sold_using` decimal(10,0) DEFAULT 0,
+  `trade_price` decimal(10,0) DEFAULT 0,
+  `trade_num` decimal(10,0) DEFAULT 0,
+  `trade_time` datetime DEFAULT '1000-01-01 00:00:00',
+  PRIMARY KEY (`id`)
+);
@@ -28,26 +28,33 @@ def main():
         try:
             login_info = FRAME_SERVER.get_login_info()
             assert login_info['user_id'] == BOT.id
-        except (requests.ConnectionError, KeyError):
+        except (requests.ConnectionError, ConnectionError, TimeoutError, KeyError):
             time.sleep(1)
             continue
         break
+    BOT.sync_friends()
+    LOG.INF('Friend list loaded successfully.')
 
     opt = dict(getopt.getopt(sys.argv[1:], 'p', ['post'])[0])
     if '-p' in opt or '--post' in opt:
+        version_image = text2img(BOT.VERSION)
+        futures = []
         for group_id in map(
                 lambda a: a['group_id'],
                 FRAME_SERVER.get_group_list()
         ):
             try:
-                GroupMessage(
-                    ImageMessage(
-                        text2img(
-                            BOT.VERSION
-                        )
-                    ),
-                    Group(group_id)
-                ).send()
+                futures.append(
+                    GroupMessage(
+                        ImageMessage(version_image),
+                        Group(group_id)
+                    ).submit()
+                )
+            except SendFailure as error:
+                LOG.WAR(error)
+        for future in futures:
+            try:
+                future.result()
             except SendFailure as error:
                 LOG.WAR(error)
 
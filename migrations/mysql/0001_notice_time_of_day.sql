@@ -0,0 +1,4 @@
+-- noticer每秒按时刻查询提醒, time(`time`)无法使用索引, 以生成列保存时刻并建立索引
+ALTER TABLE `notice_schedule`
+  ADD COLUMN `time_of_day` time GENERATED ALWAYS AS (cast(`time` as time)) STORED,
+  ADD KEY `notice_schedule_time_of_day_index` (`time_of_day`);
@@ -0,0 +1,3 @@
+-- 撮合按委托类型等值过滤, 按价格范围过滤并排序, 再按委托时间过滤与排序
+ALTER TABLE `stocks`
+  ADD KEY `stocks_order_book_index` (`commission_type`, `commission_price`, `commission_time`);
@@ -0,0 +1,12 @@
+-- 机厅名与别名各占一行, 以主键查找代替在每行names上执行json_contains
+CREATE TABLE `arcade_names` (
+  `group_id` decimal(10,0) NOT NULL,
+  `name` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  `arcade` varchar(255) NOT NULL,
+  PRIMARY KEY (`group_id`, `name`),
+  KEY `arcade_names_arcade_index` (`group_id`, `arcade`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO `arcade_names` (`group_id`, `name`, `arcade`)
+SELECT `arcades`.`group_id`, `alias`.`name`, `arcades`.`name`
+FROM `arcades`, JSON_TABLE(`arcades`.`names`, '$[*]' COLUMNS (`name` varchar(255) PATH '$')) AS `alias`;
@@ -0,0 +1,13 @@
+-- 每笔成交一行, 只追加
+CREATE TABLE `trades` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `time` datetime NOT NULL,
+  `buyer` decimal(65,0) NOT NULL,
+  `seller` decimal(65,0) NOT NULL,
+  `price` decimal(10,0) NOT NULL,
+  `num` decimal(10,0) NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `trades_time_index` (`time`),
+  KEY `trades_buyer_index` (`buyer`),
+  KEY `trades_seller_index` (`seller`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,3 @@
+-- noticer每秒按时刻查询提醒, time(`time`)无法使用索引, 以生成列保存时刻并建立索引
+ALTER TABLE `notice_schedule` ADD COLUMN `time_of_day` text GENERATED ALWAYS AS (time(`time`)) VIRTUAL;
+CREATE INDEX `notice_schedule_time_of_day_index` ON `notice_schedule` (`time_of_day`);
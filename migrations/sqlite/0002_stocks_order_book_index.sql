@@ -0,0 +1,2 @@
+-- 撮合按委托类型等值过滤, 按价格范围过滤并排序, 再按委托时间过滤与排序, 包含id使查询只需读取索引
+CREATE INDEX `stocks_order_book_index` ON `stocks` (`commission_type`, `commission_price`, `commission_time`, `id`);
@@ -0,0 +1,12 @@
+-- 机厅名与别名各占一行, 以主键查找代替在每行names上执行json_contains
+CREATE TABLE `arcade_names` (
+  `group_id` decimal(10,0) NOT NULL,
+  `name` text NOT NULL,
+  `arcade` text NOT NULL,
+  PRIMARY KEY (`group_id`, `name`)
+);
+CREATE INDEX `arcade_names_arcade_index` ON `arcade_names` (`group_id`, `arcade`);
+
+INSERT OR IGNORE INTO `arcade_names` (`group_id`, `name`, `arcade`)
+SELECT `arcades`.`group_id`, `alias`.`value`, `arcades`.`name`
+FROM `arcades`, json_each(`arcades`.`names`) AS `alias`;
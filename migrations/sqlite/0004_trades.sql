@@ -0,0 +1,12 @@
+-- 每笔成交一行, 只追加
+CREATE TABLE `trades` (
+  `id` integer PRIMARY KEY AUTOINCREMENT,
+  `time` datetime NOT NULL,
+  `buyer` decimal(65,0) NOT NULL,
+  `seller` decimal(65,0) NOT NULL,
+  `price` decimal(10,0) NOT NULL,
+  `num` decimal(10,0) NOT NULL
+);
+CREATE INDEX `trades_time_index` ON `trades` (`time`);
+CREATE INDEX `trades_buyer_index` ON `trades` (`buyer`);
+CREATE INDEX `trades_seller_index` ON `trades` (`seller`);
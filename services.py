@@ -6,13 +6,15 @@ from abstract.bases.exceptions import *
 from abstract.message import *
 from abstract.bases.log import LOG
 from abstract.bot import BOT
-from abstract.target import Group, User
+from abstract.target import Group, User, settle_stocks
 from extra.weather_city import WEATHER_CITY_MANAGER, WeatherCity
 
 
 @BOT.register_service('noticer', auto_restart=True)
 def noticer():
-    for notice in NOTICE_SCHEDULE_TABLE.get_all(f'where time(time) = "{time.strftime("%H:%M:%S")}"'):
+    for notice in NOTICE_SCHEDULE_TABLE.select('id', 'type', 'time', 'text', 'every').where(
+            time_of_day=time.strftime('%H:%M:%S')
+    ).all():
         target_id = int(notice[0])
         match notice[4]:
             case 'day':
@@ -24,10 +26,7 @@ def noticer():
             case _:
                 if notice[2].date() != datetime.datetime.now().date():
                     continue
-                NOTICE_SCHEDULE_TABLE.delete(
-                    f'(id, type, time)',
-                    (target_id, notice[1], notice[2].strftime('%Y-%m-%d %H:%M:%S'))
-                )
+                NOTICE_SCHEDULE_TABLE.where(id=target_id, type=notice[1], time=notice[2]).delete()
 
         try:
             match notice[1]:
@@ -42,14 +41,28 @@ def noticer():
                         User(target_id)
                     ).send()
         except TypeError:
-            NOTICE_SCHEDULE_TABLE.delete(
-                f'(id, type, time)',
-                (target_id, notice[1], notice[2].strftime('%Y-%m-%d %H:%M:%S'))
-            )
+            NOTICE_SCHEDULE_TABLE.where(id=target_id, type=notice[1], time=notice[2]).delete()
 
     time.sleep(1)
 
 
+GROUP_OPTIONS_CONFIG = CONFIG.get('group_options_config', {})
+
+
+@BOT.register_service('group_options_reconciler', auto_restart=True)
+def group_options_reconciler():
+    """定期重新加载群设置缓存, 同步直接在数据库中进行的修改"""
+    time.sleep(GROUP_OPTIONS_CONFIG.get('reconcile_interval', 60))
+    GROUP_OPTIONS.reload()
+
+
+@BOT.register_service('friend_list_syncer', auto_restart=True)
+def friend_list_syncer():
+    """定期全量同步好友列表, 修正增量更新遗漏的变化(如被删除好友)"""
+    time.sleep(BOT.friend_sync_interval)
+    BOT.sync_friends()
+
+
 def _get_wait_seconds(target_times: list[datetime.datetime]) -> float:
     """计算距离最近目标时间的等待秒数（通用时间处理逻辑）"""
     now = datetime.datetime.now()
@@ -59,6 +72,17 @@ def _get_wait_seconds(target_times: list[datetime.datetime]) -> float:
     return (nearest_target - now).total_seconds()
 
 
+@BOT.register_service('stock_settler', auto_restart=True)
+def stock_settler():
+    # 启动时先补做错过的结算, 之后每天零点结算一次. 结算失败时不立即重启, 等到下一个零点再试
+    try:
+        LOG.INF(f'Stocks settled: {settle_stocks()}')
+    except Exception as error:
+        LOG.ERR(f'Stock settlement failed, retrying at next midnight: {error!r}')
+    now = datetime.datetime.now()
+    time.sleep(_get_wait_seconds([now.replace(hour=0, minute=0, second=0, microsecond=0)]))
+
+
 def _execute_weather_task(
         weather_getter: Callable,  # 获取天气数据的方法（差异化逻辑）
         message_cls: Type,  # 消息类型（ImageMessage/TextMessage，差异化逻辑）
@@ -67,13 +91,15 @@ def _execute_weather_task(
     """执行天气提醒任务的通用逻辑（处理群组、城市验证、消息发送）"""
     for city in WEATHER_CITY_MANAGER.values():
         city.flush_cache(weather_getter)
-    
-    for id, city in GROUP_OPTION_TABLE.get_all('where weather_notice = 1', attr="id, city"):
-        group_id = int(id)
+
+    # 天气消息提交到发送队列后统一等待结果, 各群的发送由发送队列并行限速
+    futures = []
+    for row in GROUP_OPTIONS.select(lambda a: a['weather_notice'] == 1):
+        group_id, city = int(row['id']), row['city']
         try:
             # 处理未设置城市的情况
             if not city:
-                GROUP_OPTION_TABLE.set('id', group_id, 'weather_notice', 0)
+                GROUP_OPTIONS.set(group_id, 'weather_notice', 0)
                 try:
                     GroupMessage(
                         f'此群未设置默认天气城市, 已关闭天气提醒服务.',
@@ -87,8 +113,8 @@ def _execute_weather_task(
             try:
                 city_obj = WEATHER_CITY_MANAGER[city]
             except CityNotFound:
-                GROUP_OPTION_TABLE.set('id', group_id, 'weather_notice', 0)
-                GROUP_OPTION_TABLE.set('id', group_id, 'city', None)
+                GROUP_OPTIONS.set(group_id, 'weather_notice', 0)
+                GROUP_OPTIONS.set(group_id, 'city', None)
                 LOG.WAR(f'City {city} from group {group_id} not found, reset from group options.')
                 try:
                     GroupMessage(
@@ -103,13 +129,18 @@ def _execute_weather_task(
             result = weather_getter(city_obj, *args, **kwargs)
             if result is None:
                 continue
-            GroupMessage(
-                message_cls(result),
-                Group(group_id)
-            ).send()
+            futures.append(
+                (
+                    group_id,
+                    GroupMessage(
+                        message_cls(result),
+                        Group(group_id)
+                    ).submit()
+                )
+            )
 
         except GroupNotJoined:
-            GROUP_OPTION_TABLE.set('id', group_id, 'weather_notice', 0)
+            GROUP_OPTIONS.set(group_id, 'weather_notice', 0)
             LOG.WAR(f'Group {group_id} not joined, option weather_notice set to 0.')
 
         except SendFailure as e:
@@ -117,6 +148,17 @@ def _execute_weather_task(
         except Exception as e:
             LOG.ERR(e)
 
+    for group_id, future in futures:
+        try:
+            future.result()
+        except GroupNotJoined:
+            GROUP_OPTIONS.set(group_id, 'weather_notice', 0)
+            LOG.WAR(f'Group {group_id} not joined, option weather_notice set to 0.')
+        except SendFailure as e:
+            LOG.WAR(e)
+        except Exception as e:
+            LOG.ERR(e)
+
 
 @BOT.register_service('weather_predictor_hourly', auto_restart=True)
 def weather_predictor_hourly():
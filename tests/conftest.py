@@ -0,0 +1,27 @@
+"""
+测试在临时工作目录中运行: 以config_default.json为基础生成config.json, 数据库改用临时目录中的SQLite,
+避免读写仓库根目录下的config.json与真实数据库. 必须在导入任何abstract模块之前完成.
+"""
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+WORKDIR = pathlib.Path(tempfile.mkdtemp(prefix='qqbot-test-'))
+
+config = json.loads((REPO / 'config_default.json').read_text(encoding='utf-8'))
+config['sql_backend'] = 'sqlite'
+config['sqlite_config'] = {
+    'path': str(WORKDIR / 'qqbot.db'),
+    'init_script': str(REPO / 'init_sqlite.sql'),
+    'timeout': 10,
+}
+config['migration_config'] = {'directory': str(REPO / 'migrations')}
+(WORKDIR / 'config.json').write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding='utf-8')
+shutil.copy(REPO / 'config_default.json', WORKDIR / 'config_default.json')
+
+os.chdir(WORKDIR)
+sys.path.insert(0, str(REPO))
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+from abstract.bases.exceptions import CommandCancel
+from abstract.command import Command
+from abstract.session import Session
+
+
+class FakeMessage:
+    """
+    只记录回复内容的消息, 命令的回复不经过框架服务器
+    """
+    def __init__(self, target='group'):
+        self.target = target
+        self.replies: list[str] = []
+
+    def reply_text(self, text: str):
+        self.replies.append(text)
+        return self
+
+    async def reply_text_async(self, text: str):
+        return self.reply_text(text)
+
+    def get_parts_by_type(self, part_type) -> list:
+        return []
+
+
+def new_session() -> types.SimpleNamespace:
+    return types.SimpleNamespace(running_command=None, running_thread=None, running_task=None)
+
+
+def test_async_command_runs_on_event_loop():
+    threads = []
+
+    async def command(message, session):
+        threads.append(threading.current_thread())
+
+    async def main():
+        await Command(command, ('a', )).call_async(FakeMessage(), new_session())
+        return threading.current_thread()
+
+    assert asyncio.run(main()) is threads[0]
+
+
+def test_sync_command_runs_on_command_executor_thread():
+    threads = []
+
+    def command(message, session):
+        threads.append(threading.current_thread())
+
+    asyncio.run(Command(command, ('s', )).call_async(FakeMessage(), new_session()))
+    # 同步命令直接在命令线程池的线程中执行, 不再另开线程
+    assert threads[0].name.startswith('command')
+
+
+def test_async_commands_run_concurrently():
+    async def command(message, session):
+        await asyncio.sleep(0.2)
+        await message.reply_text_async('done')
+
+    async def main():
+        messages = [FakeMessage() for _ in range(5)]
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            Command(command, ('c', )).call_async(message, new_session()) for message in messages
+        ))
+        return time.perf_counter() - start, messages
+
+    elapsed, messages = asyncio.run(main())
+    assert elapsed < 0.6
+    assert all(message.replies == ['done'] for message in messages)
+
+
+def test_async_command_cancel_replies():
+    async def command(message, session):
+        raise CommandCancel('未继续输入.')
+
+    message = FakeMessage()
+    asyncio.run(Command(command, ('x', )).call_async(message, new_session()))
+    assert message.replies == [str(CommandCancel('未继续输入.'))]
+
+
+def test_async_command_task_cancelled_by_session():
+    async def command(message, session):
+        await asyncio.sleep(10)
+
+    async def main():
+        message, session = FakeMessage(), new_session()
+        task = asyncio.ensure_future(Command(command, ('x', )).call_async(message, session))
+        await asyncio.sleep(0.05)
+        assert session.running_task is not None
+        session.running_task.cancel()
+        await task
+        return message, session
+
+    message, session = asyncio.run(main())
+    assert message.replies == [str(CommandCancel('用户取消.'))]
+    assert session.running_task is None
+
+
+def test_pipe_get_async_receives_put_from_other_thread():
+    session = Session(None)
+    message = FakeMessage()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, lambda: threading.Thread(target=session.pipe_put, args=(FakeMessage(), )).start())
+        return await session.pipe_get_async(message, False, 5)
+
+    result = asyncio.run(main())
+    assert result.target == message.target
+    assert not session.getting
+
+
+def test_pipe_get_async_skips_other_targets_and_times_out():
+    session = Session(None)
+    message = FakeMessage()
+    other = FakeMessage('private')
+    session.pipe_put(other)
+
+    with pytest.raises(CommandCancel):
+        asyncio.run(session.pipe_get_async(message, False, 0.1))
+    assert other.replies
+    # 超时后到达的输入留在管道中, 由下一次等待取走
+    session.pipe_put(FakeMessage())
+    assert asyncio.run(session.pipe_get_async(message, False, 1)).target == message.target
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from abstract.bases.custom_thread import CancellableCall
+from abstract.bases.exceptions import CommandCancel
+from abstract.session import Session
+
+
+class FakeMessage:
+    """
+    只记录回复内容的消息
+    """
+    def __init__(self):
+        self.replies: list[str] = []
+        self.deleted = 0
+
+    def reply_text(self, text: str):
+        self.replies.append(text)
+        return self
+
+    def delete(self):
+        self.deleted += 1
+
+
+def start_call(func) -> tuple[CancellableCall, threading.Thread, list]:
+    call = CancellableCall(func)
+    errors = []
+
+    def run():
+        try:
+            call.run()
+        except CommandCancel as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    while call.status == 'IDLE':
+        time.sleep(0.01)
+    return call, thread, errors
+
+
+def test_stop_does_not_wait_for_blocked_call():
+    release = threading.Event()
+    call, thread, errors = start_call(lambda: release.wait())
+    start = time.perf_counter()
+    assert call.stop(timeout=0)
+    assert time.perf_counter() - start < 0.1
+    # 已在取消中时再次取消不抛出异常
+    assert not call.stop(timeout=0)
+    release.set()
+    thread.join(1)
+    assert errors and call.status == 'CANCELLED'
+
+
+def test_stop_after_completion_is_tolerated():
+    call = CancellableCall(lambda: 1)
+    assert call.run() == 1
+    assert not call.stop(timeout=0)
+    assert call.status == 'COMPLETED'
+    done = []
+    call.add_done_callback(done.append)
+    assert done == [call]
+
+
+def test_session_cancel_replies_when_call_ends():
+    def loop():
+        while True:
+            time.sleep(0.01)
+
+    session = Session(None)
+    call, thread, errors = start_call(loop)
+    session.running_thread = call
+    message = FakeMessage()
+    session.handle(message, 'cancel')
+    thread.join(1)
+    assert errors
+    assert message.replies == ['正在取消当前命令...']
+    assert message.deleted == 1
+
+    session.handle(message, 'cancel')
+    assert message.replies[-1] == '当前没有进行中的命令.'
+
+
+def test_session_second_cancel_is_tolerated():
+    release = threading.Event()
+    session = Session(None)
+    # 阻塞在C函数中的调用不产生跟踪事件, 取消时事件线程不等待其返回
+    call, thread, errors = start_call(lambda: release.wait())
+    session.running_thread = call
+    message = FakeMessage()
+    session.handle(message, 'cancel')
+    session.handle(message, 'cancel')
+    assert message.replies == ['正在取消当前命令...', '当前命令正在取消或已经结束.']
+    release.set()
+    thread.join(1)
+    assert message.deleted == 1
+    assert call.status == 'CANCELLED' and errors
+
@@ -0,0 +1,117 @@
+import timeit
+
+import pytest
+
+from abstract.command import Command, CommandGroup
+
+
+def command_func(message, session):
+    pass
+
+
+def new_group(command_num: int = 0, prefixes: tuple[str, ...] = ('/', )) -> CommandGroup:
+    group = CommandGroup().set_prefixes(prefixes)
+    for index in range(command_num):
+        group.add(Command(command_func, (f'command{index}', f'别名{index}')))
+    return group
+
+
+@pytest.mark.parametrize(
+    ('prefixes', 'expected'),
+    [
+        (('/', '//'), '/'),
+        (('//', '/'), '//'),
+        (('!', '/', '//'), '/'),
+        (('#', '//'), '//'),
+    ]
+)
+def test_first_listed_prefix_wins(prefixes, expected):
+    group = new_group(prefixes=prefixes)
+    assert group.match_prefix('//help') == expected
+    assert group.match('//help') == '//help'.removeprefix(expected)
+
+
+def test_empty_prefix_matches_everything():
+    group = new_group(prefixes=('', '/'))
+    assert group.match_prefix('/help') == ''
+    assert group.match_prefix('help') == ''
+
+
+def test_no_prefix():
+    group = new_group(1)
+    assert group.match('command0') is None
+    assert group.match('command0', need_prefix=False).command_names == ('command0', '别名0')
+    assert group.match('/missing') == 'missing'
+
+
+def test_match_by_any_command_name():
+    group = new_group(3)
+    command = group.match('/command1')
+    assert isinstance(command, Command)
+    assert group.match('/别名1') is command
+    assert group['/command2'] is not command
+
+
+def test_duplicate_command_name():
+    group = new_group()
+    first, second = Command(command_func, ('same', )), Command(command_func, ('same', 'other'))
+    group.add(first)
+    group.match('/same')
+    group.add(second)
+    # 索引以迭代顺序重建, 重复的命令名只保留一个, 另一个命令仍可由其他命令名匹配
+    assert group.match('/same') in (first, second)
+    assert group.match('/other') is second
+
+
+def test_index_invalidated_on_add():
+    group = new_group(1)
+    assert group.match('/new') == 'new'
+    command = Command(command_func, ('new', ))
+    group.add(command)
+    assert group.match('/new') is command
+
+
+def test_index_invalidated_on_remove():
+    group = new_group(1)
+    command = group.match('/command0')
+    group.remove(command)
+    assert group.match('/command0') == 'command0'
+    group.add(command)
+    group.discard(command)
+    assert group.match('/command0') == 'command0'
+    group.add(command)
+    group.clear()
+    assert group.match('/别名0') == '别名0'
+
+
+def test_index_invalidated_on_set_prefixes():
+    group = new_group(1)
+    command = group.match('/command0')
+    assert group.match('#command0') is None
+    group.set_prefixes(('#', ))
+    assert group.match('#command0') is command
+    assert group.match('/command0') is None
+    group.set_prefixes(('#!', '#'))
+    assert group.match_prefix('#!command0') == '#!'
+    assert group.match('#!command0') is command
+
+
+def lookup_seconds(command_num: int, number: int = 20000) -> float:
+    group = new_group(command_num, ('!', '/'))
+    name = f'/command{command_num - 1}'
+    assert isinstance(group.match(name), Command)
+    return min(timeit.repeat(lambda: group.match(name), number=number, repeat=5)) / number
+
+
+def test_lookup_benchmark_does_not_scale_with_command_num():
+    """
+    10个与1000个命令时的单次匹配耗时, 索引查找不应随命令数线性增长
+    """
+    small, large = lookup_seconds(10), lookup_seconds(1000)
+    print(f'\n10 commands: {small * 1e6:.2f}us/lookup, 1000 commands: {large * 1e6:.2f}us/lookup')
+    assert large < small * 5
+
+
+if __name__ == '__main__':
+    for command_num in (10, 100, 1000):
+        print(f'{command_num} commands: {lookup_seconds(command_num) * 1e6:.2f}us/lookup')
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from abstract.apis.table import ConnectionPool
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeConnection:
+    def __init__(self, backend: 'FakeBackend'):
+        self.backend = backend
+        self.closed = False
+
+    def commit(self):
+        if self.backend.fail_commit:
+            raise FakeError('commit failed')
+
+    def rollback(self):
+        ...
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def close(self):
+        ...
+
+
+class FakeBackend:
+    """
+    可以按需让ping, get_cursor与commit失败的后端
+    """
+    Error = FakeError
+
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+        self.fail_ping = self.fail_cursor = self.fail_commit = False
+
+    def connect(self) -> FakeConnection:
+        self.connections.append(connection := FakeConnection(self))
+        return connection
+
+    def ping(self, connection: FakeConnection):
+        if self.fail_ping:
+            raise FakeError('server unreachable')
+
+    def get_cursor(self, connection: FakeConnection) -> FakeCursor:
+        if self.fail_cursor:
+            raise FakeError('cursor failed')
+        return FakeCursor()
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def test_failed_ping_releases_slot(backend):
+    pool = ConnectionPool(backend, size=1, timeout=0.2, idle_ping=0)
+    pool.checkout()
+    pool.checkin()
+    backend.fail_ping = True
+    with pytest.raises(FakeError):
+        pool.checkout()
+    assert pool.created == 0
+    assert backend.connections[0].closed
+    # 空出的名额用于新建连接, 不会因名额耗尽而超时
+    pool.checkout()
+    pool.checkin()
+    assert pool.created == 1
+    assert len(backend.connections) == 2
+
+
+def test_failed_cursor_releases_slot(backend):
+    pool = ConnectionPool(backend, size=1, timeout=0.2)
+    backend.fail_cursor = True
+    for _ in range(3):
+        with pytest.raises(FakeError):
+            pool.checkout()
+    assert pool.created == 0
+    backend.fail_cursor = False
+    pool.checkout()
+    pool.checkin()
+    assert pool.get_stats()['connections'] == '1/1'
+
+
+def test_discarded_connection_wakes_waiter(backend):
+    pool = ConnectionPool(backend, size=1, timeout=5)
+    pool.checkout()
+    waited = []
+
+    def waiter():
+        start = time.perf_counter()
+        pool.checkout()
+        waited.append(time.perf_counter() - start)
+        pool.checkin()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.1)
+    backend.fail_commit = True
+    with pytest.raises(FakeError):
+        pool.checkin()
+    backend.fail_commit = False
+    thread.join(2)
+    # 等待者在连接被丢弃后立即重新创建连接, 不必等到超时
+    assert waited and waited[0] < 1
+    assert len(backend.connections) == 2
+    assert pool.get_stats()['idle'] == 1
@@ -0,0 +1,190 @@
+"""
+迁移前后的查询计划对比. MySQL迁移只在设置了环境变量QQBOT_TEST_MYSQL时测试, 其值为pymysql.connect
+参数的JSON, 测试新建临时数据库导入init.sql后执行迁移, 结束时删除该数据库, 因此账号需要建库权限.
+"""
+import json
+import os
+import pathlib
+
+import pytest
+
+from abstract.apis.migration import Migrator
+from abstract.apis.sql_backend import MySQLBackend, SQLiteBackend
+from abstract.apis.table import ConnectionPool
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(SQLiteBackend(str(tmp_path / 'test.db'), str(REPO / 'init_sqlite.sql')), size=2)
+    with pool.transaction():
+        pool.cursor.execute(
+            'INSERT INTO arcades (group_id, name, subnames) VALUES (%s, %s, %s)', (1, '机厅', '["别名"]')
+        )
+    return pool
+
+
+@pytest.fixture
+def migrated(pool):
+    Migrator(pool, str(REPO / 'migrations')).migrate()
+    return pool
+
+
+def fetchall(pool, sql: str, params: tuple = None) -> tuple:
+    with pool.transaction():
+        pool.cursor.execute(sql, params)
+        return pool.cursor.fetchall()
+
+
+def query_plan(pool, sql: str, params: tuple = None) -> str:
+    return '\n'.join(row[-1] for row in fetchall(pool, f'EXPLAIN QUERY PLAN {sql}', params))
+
+
+def get_schema(pool) -> tuple:
+    return fetchall(pool, "SELECT type, name, sql FROM sqlite_master WHERE name <> 'schema_migrations' ORDER BY name")
+
+
+def test_notice_lookup_before_migration_scans(pool):
+    # 迁移前按time(time)查询, 表达式无法使用time上的索引
+    plan = query_plan(
+        pool,
+        'SELECT id, type, time, text, every FROM notice_schedule WHERE time(time) = %s', ('08:00:00', )
+    )
+    assert 'SCAN notice_schedule' in plan
+    assert 'USING INDEX' not in plan
+
+
+def test_order_book_lookup_before_migration_scans(pool):
+    # 迁移前stocks只有主键, 按委托类型与委托日期的撮合查询扫描全表并排序
+    plan = query_plan(
+        pool,
+        'SELECT id FROM stocks WHERE commission_type = %s AND commission_price <= %s '
+        'AND date(commission_time) = curdate() ORDER BY commission_price',
+        ('sell', 10)
+    )
+    assert 'SCAN stocks' in plan
+    assert 'TEMP B-TREE' in plan
+
+
+def test_arcade_lookup_before_migration_checks_every_row(pool):
+    # 迁移前只能按group_id缩小范围, 群内每个机厅都要执行一次json_contains
+    plan = query_plan(
+        pool,
+        'SELECT num, update_time FROM arcades WHERE json_contains(names, json_quote(%s)) AND group_id = %s',
+        ('别名', 1)
+    )
+    assert 'SEARCH arcades USING INDEX arcades_group_id_index (group_id=?)' in plan
+    assert 'name=?' not in plan
+    plan = query_plan(pool, 'SELECT group_id FROM arcades WHERE json_contains(names, json_quote(%s))', ('别名', ))
+    assert 'SCAN arcades' in plan
+
+
+def test_migrations_apply_in_order(pool):
+    applied = Migrator(pool, str(REPO / 'migrations')).migrate()
+    assert [migration.version for migration in applied] == [1, 2, 3, 4]
+    assert [row[0] for row in fetchall(pool, 'SELECT version FROM schema_migrations ORDER BY version')] == [1, 2, 3, 4]
+
+
+def test_migrations_idempotent(migrated):
+    schema = get_schema(migrated)
+    assert Migrator(migrated, str(REPO / 'migrations')).migrate() == []
+    assert get_schema(migrated) == schema
+    assert len(fetchall(migrated, 'SELECT version FROM schema_migrations')) == 4
+
+
+def test_arcade_names_backfilled(migrated):
+    assert sorted(fetchall(migrated, 'SELECT name, arcade FROM arcade_names WHERE group_id = %s', (1, ))) == [
+        ('别名', '机厅'), ('机厅', '机厅')
+    ]
+
+
+def test_notice_lookup_uses_time_of_day_index(migrated):
+    plan = query_plan(
+        migrated,
+        'SELECT id, type, time, text, every FROM notice_schedule WHERE time_of_day = %s', ('08:00:00', )
+    )
+    assert 'USING INDEX notice_schedule_time_of_day_index (time_of_day=?)' in plan
+
+
+def test_order_book_load_uses_order_book_index(migrated):
+    plan = query_plan(
+        migrated,
+        'SELECT id, commission_type, commission_price, commission_num, commission_time FROM stocks '
+        "WHERE commission_type in ('buy', 'sell')"
+    )
+    assert 'USING INDEX stocks_order_book_index (commission_type=?)' in plan
+
+
+def test_order_book_range_uses_order_book_index(migrated):
+    plan = query_plan(
+        migrated,
+        'SELECT id FROM stocks WHERE commission_type = %s AND commission_price <= %s ORDER BY commission_price',
+        ('sell', 10)
+    )
+    assert 'USING COVERING INDEX stocks_order_book_index (commission_type=? AND commission_price<?)' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_arcade_lookup_uses_alias_primary_key(migrated):
+    plan = query_plan(
+        migrated,
+        'SELECT num, update_time FROM arcades WHERE '
+        'name = (select arcade from arcade_names where group_id = %s and name = %s) AND group_id = %s',
+        (1, '别名', 1)
+    )
+    assert 'SEARCH arcade_names USING PRIMARY KEY (group_id=? AND name=?)' in plan \
+        or 'SEARCH arcade_names USING INDEX sqlite_autoindex_arcade_names_1 (group_id=? AND name=?)' in plan
+    assert 'SEARCH arcades USING INDEX arcades_group_id_index (group_id=? AND name=?)' in plan
+
+
+def test_arcade_removal_uses_arcade_index(migrated):
+    plan = query_plan(migrated, 'DELETE FROM arcade_names WHERE group_id = %s AND arcade = %s', (1, '机厅'))
+    assert 'USING INDEX arcade_names_arcade_index (group_id=? AND arcade=?)' in plan
+
+
+@pytest.fixture
+def mysql_pool():
+    if not (config := os.environ.get('QQBOT_TEST_MYSQL')):
+        pytest.skip('MySQL server not configured, set QQBOT_TEST_MYSQL')
+    config = json.loads(config)
+    config.pop('database', None)
+    database = 'qqbot_migration_test'
+    admin = MySQLBackend(**config).connect()
+    with admin.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS `{database}`')
+        cursor.execute(f'CREATE DATABASE `{database}`')
+    pool = ConnectionPool(MySQLBackend(**config, database=database), size=2)
+    try:
+        with pool.transaction():
+            for statement in Migrator.split((REPO / 'init.sql').read_text(encoding='utf-8')):
+                pool.cursor.execute(statement)
+            pool.cursor.execute(
+                'INSERT INTO arcades (group_id, name, subnames) VALUES (%s, %s, %s)', (1, '机厅', '["别名"]')
+            )
+        yield pool
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS `{database}`')
+        admin.close()
+
+
+def test_mysql_migrations(mysql_pool):
+    migrator = Migrator(mysql_pool, str(REPO / 'migrations'))
+    assert [migration.version for migration in migrator.migrate()] == [1, 2, 3, 4]
+    assert migrator.migrate() == []
+    assert [row[0] for row in fetchall(mysql_pool, 'SELECT version FROM schema_migrations ORDER BY version')] == [
+        1, 2, 3, 4
+    ]
+    # 0003以JSON_TABLE把names展开为arcade_names
+    assert sorted(fetchall(mysql_pool, 'SELECT name, arcade FROM arcade_names WHERE group_id = %s', (1, ))) == [
+        ('别名', '机厅'), ('机厅', '机厅')
+    ]
+    plan = fetchall(
+        mysql_pool, 'EXPLAIN SELECT arcade FROM arcade_names WHERE group_id = %s AND name = %s', (1, '别名')
+    )
+    assert plan[0][5] == 'PRIMARY'
+    plan = fetchall(
+        mysql_pool, 'EXPLAIN SELECT id FROM notice_schedule WHERE time_of_day = %s', ('08:00:00', )
+    )
+    assert plan[0][5] == 'notice_schedule_time_of_day_index'
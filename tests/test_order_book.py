@@ -0,0 +1,113 @@
+import datetime
+import random
+import time
+
+from abstract.order_book import OrderBook, crosses
+
+
+def new_book(orders: list[tuple[int, str, int, int, datetime.datetime]]) -> OrderBook:
+    book = OrderBook()
+    for order in orders:
+        book.update(*order)
+    return book
+
+
+def synthetic_orders(num: int, seed: int = 0) -> list[tuple[int, str, int, int, datetime.datetime]]:
+    randomizer = random.Random(seed)
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    return [
+        (
+            user_id,
+            randomizer.choice(('buy', 'sell')),
+            randomizer.randint(90, 110),
+            randomizer.randint(1, 20),
+            start + datetime.timedelta(seconds=randomizer.randrange(3600 * 12)),
+        )
+        for user_id in range(1, num + 1)
+    ]
+
+
+def brute_force_match(book: OrderBook, type: str, price, num) -> list[int]:
+    # 逐一比较所有当日反向委托, 作为撮合结果的参照
+    today = datetime.date.today()
+    resting = sorted(
+        (
+            order for order in book.orders.values()
+            if order.type != type and order.time.date() == today and crosses(type, price, order.price)
+        ),
+        key=lambda order: (book._priority(order), order.time, order.seq)
+    )
+    result = []
+    for order in resting:
+        if num <= 0:
+            break
+        result.append(order.user_id)
+        num -= order.num
+    return result
+
+
+def test_match_price_time_priority():
+    now = datetime.datetime.now()
+    book = new_book([
+        (1, 'sell', 12, 5, now),
+        (2, 'sell', 10, 5, now + datetime.timedelta(seconds=2)),
+        (3, 'sell', 10, 5, now + datetime.timedelta(seconds=1)),
+        (4, 'buy', 9, 5, now),
+        (5, 'sell', 11, 5, now - datetime.timedelta(days=1)),
+    ])
+    assert [order.user_id for order in book.match('buy', 11, 12)] == [3, 2]
+    assert [order.user_id for order in book.match('buy', 12, 12)] == [3, 2, 1]
+    assert book.match('buy', 9, 1) == []
+    # 卖价需高于买价才成交, 与crosses一致
+    assert [order.user_id for order in book.match('sell', 8, 5)] == [4]
+    assert book.match('sell', 9, 5) == []
+
+
+def test_update_invalidates_old_entries():
+    now = datetime.datetime.now()
+    book = new_book([(1, 'sell', 10, 5, now), (2, 'sell', 11, 5, now)])
+    book.update(1, 'none', 0, 0, now)
+    assert [order.user_id for order in book.match('buy', 11, 5)] == [2]
+    book.update(2, 'sell', 12, 3, now)
+    assert book.match('buy', 11, 5) == []
+    assert book.get_best('sell').price == 12
+
+
+def test_match_agrees_with_brute_force():
+    book = new_book(synthetic_orders(500))
+    randomizer = random.Random(1)
+    for _ in range(200):
+        type, price, num = randomizer.choice(('buy', 'sell')), randomizer.randint(85, 115), randomizer.randint(1, 60)
+        assert [order.user_id for order in book.match(type, price, num)] == brute_force_match(book, type, price, num)
+
+
+def replay(resting: int, incoming: int) -> float:
+    """
+    在有resting个委托的订单簿上依次撮合incoming个新委托, 并按撮合结果更新订单簿
+
+    :return: 每个新委托的平均耗时(秒)
+    """
+    book = new_book(synthetic_orders(resting))
+    now = datetime.datetime.now()
+    orders = synthetic_orders(incoming, seed=1)
+    start = time.perf_counter()
+    for user_id, type, price, num, _ in orders:
+        with book.lock:
+            for order in book.match(type, price, num):
+                deal_num = min(num, order.num)
+                num -= deal_num
+                book.update(order.user_id, order.type, order.price, order.num - deal_num, order.time)
+            if num:
+                book.update(resting + user_id, type, price, num, now)
+    return (time.perf_counter() - start) / incoming
+
+
+def test_replay_benchmark():
+    per_order = replay(5000, 5000)
+    print(f'\n5000 resting + 5000 incoming orders: {per_order * 1e6:.1f}us/order')
+    assert per_order < 1e-3
+
+
+if __name__ == '__main__':
+    for resting, incoming in ((1000, 1000), (5000, 5000), (20000, 20000)):
+        print(f'{resting} resting + {incoming} incoming orders: {replay(resting, incoming) * 1e6:.1f}us/order')
@@ -0,0 +1,54 @@
+import threading
+import time
+import types
+
+from abstract.bases.dispatcher import KeyedDispatcher
+from abstract.bases.exceptions import RetryLater
+from abstract.outbox import Outbox
+from abstract.target import Group
+
+
+def test_retry_keeps_key_order_and_frees_worker():
+    dispatcher = KeyedDispatcher('test-retry', workers=1, queue_size=16)
+    order = []
+    retried = threading.Event()
+
+    def throttled(name):
+        if not retried.is_set():
+            retried.set()
+            raise RetryLater(0.2)
+        order.append(name)
+
+    def task(name):
+        order.append(name)
+
+    first = dispatcher.submit('a', throttled, 'a1')
+    second = dispatcher.submit('a', task, 'a2')
+    other = dispatcher.submit('b', task, 'b1')
+    # 唯一的工作线程不等待重试, 其他键的任务先完成
+    other.result(1)
+    assert order == ['b1']
+    first.result(1)
+    second.result(1)
+    assert order == ['b1', 'a1', 'a2']
+    assert dispatcher.get_stats()['retried'] == 1
+
+
+def new_message(group_id: int, sent: list):
+    target = Group.__new__(Group)
+    target.id = group_id
+    return types.SimpleNamespace(target=target, send_api=lambda message: sent.append(message) or len(sent))
+
+
+def test_throttled_group_does_not_block_other_groups():
+    outbox = Outbox(workers=1, global_rate=100, global_burst=100, group_rate=2, group_burst=1)
+    sent = []
+    start = time.perf_counter()
+    throttled = [outbox.submit(new_message(1, sent)) for _ in range(3)]
+    other = outbox.submit(new_message(2, sent))
+    other.result(1)
+    # 群1的第二条消息需等待令牌, 群2的消息不排在其后
+    assert time.perf_counter() - start < 0.3
+    assert [future.result(3) for future in throttled] == sorted(future.result() for future in throttled)
+    assert time.perf_counter() - start >= 0.9
+    assert outbox.get_stats()['throttle']['count'] >= 2
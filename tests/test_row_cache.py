@@ -0,0 +1,54 @@
+import pytest
+
+from abstract.apis.table import GROUP_OPTION_TABLE, RowCache, RowProvisioner
+
+
+def new_cache() -> tuple[RowCache, list[tuple]]:
+    cache = RowCache(GROUP_OPTION_TABLE).reload()
+    changes = []
+    cache.subscribe(lambda id, column, value: changes.append((id, column, value)))
+    return cache, changes
+
+
+def test_missing_row_is_cached_until_provisioned():
+    cache, changes = new_cache()
+    provisioner = RowProvisioner(GROUP_OPTION_TABLE).warm()
+    provisioner.on_provision(cache.invalidate)
+    fetched = []
+    fetch = cache._fetch
+    cache._fetch = lambda *args, **kwargs: fetched.append(args) or fetch(*args, **kwargs)
+
+    assert cache.get(920001, 'r18') is None
+    assert cache.get(920001, 'r18', 0) == 0
+    assert len(fetched) == 1
+    # 插入默认行后不再使用缓存的未命中
+    provisioner.ensure(920001)
+    assert cache.get(920001, 'r18') == 0
+    assert len(fetched) == 2
+
+
+def test_new_row_notifies_all_columns():
+    cache, changes = new_cache()
+    GROUP_OPTION_TABLE.insert(id=920002)
+    cache.set(920002, 'city', '北京')
+    assert (920002, 'city', '北京') in changes
+    assert (920002, 'id', 920002) in changes
+    changes.clear()
+    cache.set(920002, 'city', '上海')
+    assert changes == [(920002, 'city', '上海')]
+
+
+def test_reload_notifies_rows_added_elsewhere():
+    cache, changes = new_cache()
+    GROUP_OPTION_TABLE.insert(id=920003, city='广州')
+    cache.reload()
+    assert (920003, 'city', '广州') in changes
+    assert cache.get_stats()['missing'] == 0
+
+
+def test_set_rejects_unknown_column():
+    cache, changes = new_cache()
+    GROUP_OPTION_TABLE.insert(id=920004)
+    with pytest.raises(KeyError):
+        cache.set(920004, 'city` = 1, `r18', 2)
+    assert cache.get(920004, 'r18') == 0
@@ -0,0 +1,37 @@
+import datetime
+
+from abstract.apis.table import STOCK_TABLE
+from abstract.bases.config import CONFIG
+from abstract.order_book import ORDER_BOOK
+from abstract.target import User, settle_stocks
+
+
+def new_user(user_id: int, points: int = 0, stocks: int = 0) -> User:
+    user = User({'user_id': user_id, 'nickname': f'user{user_id}'})
+    user.add_points(points)
+    user.add_stocks(stocks)
+    return user
+
+
+def test_settle_stocks_on_default_config():
+    # 测试配置由config_default.json生成, 机器人id取自bot_config.id
+    assert 'robot_id' not in CONFIG.data
+    robot_id = CONFIG.data['bot_config']['id']
+    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+    seller, trader = new_user(820001, stocks=10), new_user(820002, points=100)
+    assert seller.place_commission('sell', 5, 10) == []
+    STOCK_TABLE.where(id=seller.id).update(commission_time=yesterday)
+    STOCK_TABLE.where(id=trader.id).update(points_sold=30, stocks_bought=4, trade_time=yesterday)
+
+    assert settle_stocks() == {'expired': 1, 'stored': 1, 'settled': 1}
+    assert seller.get_commission()['type'] == 'none'
+    assert seller.get_stocks() == 10
+    assert seller.id not in ORDER_BOOK.orders
+    assert trader.get_points() == 130
+    assert trader.get_stocks() == 4
+    assert trader.get_points_sold() == 0 and trader.get_stocks_bought() == 0
+    assert robot_id not in ORDER_BOOK.orders
+
+    # 结算过的行不再满足条件, 重复执行不产生变化
+    assert settle_stocks() == {'expired': 0, 'stored': 0, 'settled': 0}
+    assert 'robot_id' not in CONFIG.data
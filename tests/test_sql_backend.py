@@ -0,0 +1,153 @@
+"""
+两个后端执行同一组MySQL方言的语句. MySQL只在设置了环境变量QQBOT_TEST_MYSQL时测试,
+其值为pymysql.connect参数的JSON, 数据库需已导入init.sql; 测试在事务中执行并在结束时回滚.
+"""
+import json
+import os
+import pathlib
+import sqlite3
+
+import pytest
+
+from abstract.apis.sql_backend import MySQLBackend, SQLiteBackend, translate_sql
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+TEST_ID = 990000000001
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def backend(request, tmp_path):
+    match request.param:
+        case 'sqlite':
+            return SQLiteBackend(str(tmp_path / 'test.db'), str(REPO / 'init_sqlite.sql'), timeout=0.2)
+        case 'mysql':
+            if not (config := os.environ.get('QQBOT_TEST_MYSQL')):
+                pytest.skip('MySQL server not configured, set QQBOT_TEST_MYSQL')
+            return MySQLBackend(**json.loads(config))
+
+
+@pytest.fixture
+def cursor(backend):
+    connection = backend.connect()
+    cursor = backend.get_cursor(connection)
+    yield cursor
+    connection.rollback()
+    cursor.close()
+    connection.close()
+
+
+def scalar(cursor, sql: str, params: tuple = None):
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+@pytest.mark.parametrize(
+    ('sql', 'bind', 'expected'),
+    [
+        ('select * from t where id = %s', True, ('select * from t where id = ?', False)),
+        ("select * from t where name like 'a%%' and id = %s", True, ("select * from t where name like 'a%' and id = ?", False)),
+        ("select * from t where name like 'a%'", False, ("select * from t where name like 'a%'", False)),
+        ('INSERT IGNORE INTO t (id) VALUES (%s)', True, ('INSERT OR IGNORE INTO t (id) VALUES (?)', False)),
+        ('  insert ignore into t values (1)', False, ('  INSERT OR IGNORE into t values (1)', False)),
+        ('select id from t where id = %s for update', True, ('select id from t where id = ?', True)),
+        ('select id from t where id = %s\nFOR  UPDATE ', True, ('select id from t where id = ?', True)),
+        ("select 'for update' from t", False, ("select 'for update' from t", False)),
+    ]
+)
+def test_translate_sql(sql, bind, expected):
+    assert translate_sql(sql, bind) == expected
+
+
+def test_placeholders(cursor):
+    assert cursor.execute('INSERT INTO qq_users (id, points) VALUES (%s, %s)', (TEST_ID, 5)) == 1
+    assert scalar(cursor, 'SELECT points FROM qq_users WHERE id = %s', (TEST_ID, )) == 5
+    assert scalar(cursor, "SELECT count(*) FROM qq_users WHERE id = %s AND '50%%' LIKE '5%%'", (TEST_ID, )) == 1
+    assert scalar(cursor, "SELECT '100%'") == '100%'
+
+
+def test_insert_ignore(cursor):
+    cursor.execute('INSERT INTO qq_users (id, points) VALUES (%s, %s)', (TEST_ID, 5))
+    assert cursor.execute('INSERT IGNORE INTO qq_users (id, points) VALUES (%s, %s)', (TEST_ID, 7)) == 0
+    assert scalar(cursor, 'SELECT points FROM qq_users WHERE id = %s', (TEST_ID, )) == 5
+
+
+def test_select_for_update(cursor):
+    cursor.execute('INSERT INTO qq_users (id, points) VALUES (%s, %s)', (TEST_ID, 5))
+    assert cursor.execute('SELECT points FROM qq_users WHERE id = %s FOR UPDATE', (TEST_ID, )) == 1
+    assert cursor.fetchall() == ((5, ), )
+
+
+@pytest.mark.parametrize(
+    ('sql', 'params', 'expected'),
+    [
+        ('SELECT json_contains(%s, %s)', ('[1, 2, [3]]', '[3]'), 1),
+        ('SELECT json_contains(%s, %s)', ('{"a": {"b": 1}}', '{"b": 1}'), 0),
+        ('SELECT json_contains(%s, %s, %s)', ('{"a": {"b": 1}}', '1', '$.a.b'), 1),
+        ('SELECT json_contains(%s, %s)', ('[true]', '1'), 0),
+        ('SELECT json_contains_path(%s, %s, %s, %s)', ('{"a": 1}', 'one', '$.a', '$.b'), 1),
+        ('SELECT json_contains_path(%s, %s, %s, %s)', ('{"a": 1}', 'all', '$.a', '$.b'), 0),
+        ('SELECT json_unquote(%s)', ('"abc"', ), 'abc'),
+        ('SELECT json_unquote(json_search(%s, %s, %s))', ('["x", "yz"]', 'one', 'y%'), '$[1]'),
+        ('SELECT json_search(%s, %s, %s)', ('["x"]', 'one', 'z'), None),
+    ]
+)
+def test_json_functions(cursor, sql, params, expected):
+    assert scalar(cursor, sql, params) == expected
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected'),
+    [
+        (('[1]', '$', 2), [1, 2]),
+        (('{"a": [1]}', '$.a', 2), {'a': [1, 2]}),
+        (('{"a": 1}', '$.a', 2), {'a': [1, 2]}),
+        (('{"a": 1}', '$.b', 2), {'a': 1}),
+    ]
+)
+def test_json_array_append(cursor, params, expected):
+    assert json.loads(scalar(cursor, 'SELECT json_array_append(%s, %s, %s)', params)) == expected
+
+
+def test_arcade_names_generated_column(cursor):
+    cursor.execute(
+        'INSERT INTO arcades (group_id, name, subnames) VALUES (%s, %s, %s)', (TEST_ID % 10 ** 10, '机厅', '["别名"]')
+    )
+    assert json.loads(scalar(cursor, 'SELECT names FROM arcades WHERE group_id = %s', (TEST_ID % 10 ** 10, ))) \
+        == ['别名', '机厅']
+    assert scalar(
+        cursor, 'SELECT count(*) FROM arcades WHERE group_id = %s AND json_contains(names, json_quote(%s))',
+        (TEST_ID % 10 ** 10, '别名')
+    ) == 1
+
+
+def test_sqlite_for_update_begins_immediate(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'), str(REPO / 'init_sqlite.sql'), timeout=0.1)
+    first, second = backend.connect(), backend.connect()
+    try:
+        cursor = backend.get_cursor(first)
+        assert not first.in_transaction
+        cursor.execute('SELECT id FROM qq_users WHERE id = %s FOR UPDATE', (TEST_ID, ))
+        # 加锁读取即开始写事务, 其他连接的写入需等待
+        assert first.in_transaction
+        with pytest.raises(sqlite3.OperationalError) as error:
+            backend.get_cursor(second).execute('INSERT INTO qq_users (id) VALUES (%s)', (TEST_ID, ))
+        assert backend.is_retryable(error.value)
+        first.commit()
+        backend.get_cursor(second).execute('INSERT INTO qq_users (id) VALUES (%s)', (TEST_ID, ))
+        second.commit()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_plain_select_does_not_lock(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'), str(REPO / 'init_sqlite.sql'), timeout=0.1)
+    first, second = backend.connect(), backend.connect()
+    try:
+        backend.get_cursor(first).execute('SELECT id FROM qq_users WHERE id = %s', (TEST_ID, ))
+        assert not first.in_transaction
+        backend.get_cursor(second).execute('INSERT INTO qq_users (id) VALUES (%s)', (TEST_ID, ))
+        second.commit()
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,43 @@
+import pytest
+
+from abstract.apis.frame_server import FRAME_SERVER
+from abstract.order_book import ORDER_BOOK
+from abstract.target import User
+
+
+def new_user(user_id: int, points: int = 0, stocks: int = 0) -> User:
+    user = User({'user_id': user_id, 'nickname': f'user{user_id}'})
+    user.add_points(points)
+    user.add_stocks(stocks)
+    return user
+
+
+@pytest.fixture
+def no_frame_server(monkeypatch):
+    def get_stranger_info(id):
+        raise AssertionError(f'Frame server requested for {id} during settlement.')
+
+    monkeypatch.setattr(FRAME_SERVER, 'get_stranger_info', get_stranger_info)
+
+
+def test_place_commission_settles_against_book(no_frame_server):
+    first_seller, second_seller = new_user(810003, stocks=10), new_user(810001, stocks=10)
+    buyer = new_user(810002, points=1000)
+    assert first_seller.place_commission('sell', 5, 10) == []
+    assert second_seller.place_commission('sell', 6, 10) == []
+    assert ORDER_BOOK.orders[810003].num == 10
+
+    # 对手方的行以id加锁, 不构造User, 也就不请求框架服务器
+    User.IDENTITY_MAP.discard(810001)
+    User.IDENTITY_MAP.discard(810003)
+    assert buyer.place_commission('buy', 6, 15) == [(5, 10), (6, 5)]
+
+    assert first_seller.get_commission()['type'] == 'none'
+    assert first_seller.get_points_sold() == 50
+    assert second_seller.get_commission()['num'] == 5
+    assert second_seller.get_points_sold() == 30
+    assert buyer.get_stocks_bought() == 15
+    assert buyer.get_commission()['type'] == 'none'
+    assert buyer.get_points() + buyer.get_points_sold() == 1000 - 80
+    assert 810003 not in ORDER_BOOK.orders
+    assert ORDER_BOOK.orders[810001].num == 5
@@ -1,7 +1,6 @@
 from abstract.bases.exceptions import CommandCancel
-from abstract.bases.importer import local_time, datetime
 from abstract.message import *
-from abstract.session import Session
+from abstract.session import Deadline, Session
 from abstract.bot import BOT
 
 def get_group_message_text(message: MESSAGE) -> str:
@@ -18,8 +17,18 @@ def get_group_message_text(message: MESSAGE) -> str:
         return ''
     return text[0].text
 
-def get_arcade_num_condition(message: MESSAGE) -> bool:
-    text = get_group_message_text(message)
+def get_raw_group_message_text(data: dict) -> str:
+    """
+    获取原始群消息事件的文本内容, 与get_group_message_text一致, 用于触发器预筛选
+
+    :param data: OneBot消息事件
+    :return: 文本内容，若不满足条件则返回空字符串
+    """
+    if data['message_type'] != 'group':
+        return ''
+    return BOT.get_raw_text(data)
+
+def is_arcade_num_query(text: str) -> bool:
     if not text:
         return False
     SUFFIEXES = ('几', 'j')
@@ -28,7 +37,13 @@ def get_arcade_num_condition(message: MESSAGE) -> bool:
             return True
     return False
 
-@BOT.register_trigger(get_arcade_num_condition)
+def get_arcade_num_condition(message: MESSAGE) -> bool:
+    return is_arcade_num_query(get_group_message_text(message))
+
+@BOT.register_trigger(
+    get_arcade_num_condition,
+    lambda data: is_arcade_num_query(get_raw_group_message_text(data))
+)
 def get_arcade_num(message: MESSAGE, session: Session):
     SUFFIEXES = ('几', 'j')
     text = message.get_parts_by_type(TextMessage)[0].text
@@ -48,8 +63,7 @@ def get_arcade_num(message: MESSAGE, session: Session):
 
     message.reply_text(f'\n{text}{result[0]}\n{result[1].strftime("%H点%M分 UTC%z")}数据')
 
-def update_arcade_num_condition(message: MESSAGE) -> bool:
-    text = get_group_message_text(message)
+def is_arcade_num_update(text: str) -> bool:
     digits = ''
     for letter in text[::-1]:
         if letter.isdigit():
@@ -60,7 +74,13 @@ def update_arcade_num_condition(message: MESSAGE) -> bool:
         return False
     return bool(digits)
 
-@BOT.register_trigger(update_arcade_num_condition)
+def update_arcade_num_condition(message: MESSAGE) -> bool:
+    return is_arcade_num_update(get_group_message_text(message))
+
+@BOT.register_trigger(
+    update_arcade_num_condition,
+    lambda data: is_arcade_num_update(get_raw_group_message_text(data))
+)
 def update_arcade_num(message: MESSAGE, session: Session):
     text = message.get_parts_by_type(TextMessage)[0].text
     
@@ -83,14 +103,10 @@ def update_arcade_num(message: MESSAGE, session: Session):
         message.target.update_arcade_num(arcade, num)
         timeout = 10
         message.reply_text(f'{arcade}人数已记录为{num}. {timeout}秒内发送undo来取消记录, 发送push马上提交记录.')
-        get_time = local_time()
-        target_time = get_time + datetime.timedelta(seconds=timeout)
+        deadline = Deadline(timeout)
         try:
-            while local_time() < target_time:
-                message_get = session.pipe_get(
-                    message, False,
-                    (target_time - local_time()).total_seconds()
-                ).get_parts_by_type(TextMessage)
+            while not deadline.expired:
+                message_get = session.pipe_get(message, False, deadline).get_parts_by_type(TextMessage)
                 if not message_get:
                     continue
                 text = message_get[0].text
@@ -3,6 +3,8 @@ import tornado.web
 from abstract.bases.importer import json, threading, pathlib
 
 from abstract.bases.log import *
+from abstract.bases.metrics import METRICS
+from abstract.apis.frame_server import FRAME_SERVER, OneBotWebSocketServer
 from abstract.bot import BOT
 
 
@@ -12,14 +14,30 @@ class OneBotHttpClient:
             self.redirect('/status')
         
         def post(self):
-            data = json.loads(self.request.body)
-            threading.Thread(
-                target=BOT.router,
-                args=(data,),
-                daemon=True
-            ).start()
+            if not BOT.dispatch(json.loads(self.request.body)):
+                self.set_status(503)
             self.write(json.dumps({}))
 
+    class OneBotWebSocketHandler(tornado.websocket.WebSocketHandler):
+        def prepare(self):
+            if not isinstance(FRAME_SERVER, OneBotWebSocketServer) or FRAME_SERVER.mode != 'reverse':
+                raise tornado.web.HTTPError(404)
+            if not FRAME_SERVER.authorize(self.request.headers.get('Authorization')):
+                raise tornado.web.HTTPError(401)
+
+        def open(self):
+            FRAME_SERVER.attach(self, tornado.ioloop.IOLoop.current())
+
+        def on_message(self, message):
+            try:
+                FRAME_SERVER.feed(message)
+            except Exception as error:
+                # 单帧出错只丢弃该帧, 不关闭连接
+                LOG.WAR(f'Frame server websocket frame dropped: {error!r}')
+
+        def on_close(self):
+            FRAME_SERVER.detach(self)
+
     class WebHandler(tornado.web.RequestHandler):
         def get(self):
             self.write(pathlib.Path('web/index.html').read_text(encoding='utf-8'))
@@ -34,6 +52,10 @@ class OneBotHttpClient:
                 )
             )
 
+    class MetricsHandler(tornado.web.RequestHandler):
+        def get(self):
+            self.write(json.dumps(METRICS.snapshot()))
+
     class WebSocketHandler(tornado.websocket.WebSocketHandler):
         clients: set[tornado.websocket.WebSocketHandler] = set()
 
@@ -57,15 +79,20 @@ class OneBotHttpClient:
                 ('/', self.RootHandler),
                 ('/status', self.WebHandler),
                 ('/websocket', self.WebSocketHandler),
-                ('/api/services_status', self.ServiceStatusHandler)
+                ('/onebot', self.OneBotWebSocketHandler),
+                ('/api/services_status', self.ServiceStatusHandler),
+                ('/api/metrics', self.MetricsHandler)
             ],
-            static_path=pathlib.Path('web/static')
+            static_path=pathlib.Path('web/static'),
+            websocket_max_message_size=OneBotWebSocketServer.MAX_MESSAGE_SIZE
         )
+        FRAME_SERVER.set_event_handler(BOT.dispatch)
         threading.Thread(
             target=self.auto_post_logs
         ).start()
         self.app.listen(8000)
         self.loop = tornado.ioloop.IOLoop.current()
+        BOT.attach_loop(self.loop.asyncio_loop)
 
     def auto_post_logs(self):
         while True:
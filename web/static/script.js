@@ -189,6 +189,36 @@ setInterval(function() {
         .catch(error => console.error('Error fetching service status:', error));
 }, 1000);
 
+function formatMetric(value) {
+    if (value !== null && typeof value === 'object') {
+        return Object.entries(value).map(([key, item]) => `${key}=${item}`).join(', ');
+    }
+    return `${value}`;
+}
+
+setInterval(function() {
+    const metricsDiv = document.getElementById('metrics');
+    fetch('/api/metrics')
+        .then(response => response.json())
+        .then(data => {
+            const fragment = document.createDocumentFragment();
+            for (const groupName in data) {
+                if (data.hasOwnProperty(groupName)) {
+                    const h3 = document.createElement('h3');
+                    h3.textContent = groupName;
+                    fragment.appendChild(h3);
+                    for (const [name, value] of Object.entries(data[groupName])) {
+                        const p = document.createElement('p');
+                        p.textContent = `${name}: ${formatMetric(value)}`;
+                        fragment.appendChild(p);
+                    }
+                }
+            }
+            metricsDiv.replaceChildren(fragment);
+        })
+        .catch(error => console.error('Error fetching metrics:', error));
+}, 1000);
+
 // 检查是否有本地存储的模式设置
 const currentMode = localStorage.getItem('mode');
 if (currentMode === 'dark') {